@@ -1,477 +1,1485 @@
+import contextvars
 import os
-import requests
+import sys
+import threading
 import time
-from dotenv import load_dotenv
-from auth_code_flow import AuthCodeFlow
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from exporter import TrackExporter
+from library_index import LibraryIndex, normalize
+from models import (
+    MODELS,
+    PLAYLIST_TRACKS_FIELDS,
+    Album,
+    PlaybackState,
+    Playlist,
+    Queue,
+    Track,
+)
+from pager import iter_pages
+from playback_cache import PlaybackCache
+from playlist_sync import PlaylistSync
+from search_cache import SearchCache
+
+# The API clients (and the heavy modules they import) are built by init() on the
+# first API call, so importing this module is cheap and never touches the network
+
+# Base URL for the Spotify API
+BASE_URL = None
+
+# Records latency, status, bytes and retries of every request, token calls included
+instrumentation = None
+
+# Pooled client shared by every API call, so connections are reused between actions
+http_client = None
+
+authenticator = None
+
+# Keeps the token valid for the whole session: refreshes it before it expires
+# and retries once with a fresh token when the API answers 401
+token_manager = None
+
+# Tokens of other users' accounts served by this process (see get_token_pool)
+token_pool = None
+
+# Client for the actions that send many requests at once
+spotify = None
+
+# Metadata and search results kept on disk between runs
+metadata_cache = None
+
+# Merges the lookups of single tracks, albums and artists into multi-ID requests
+batch_loader = None
+
+# Saved tracks, playlists and followed artists, searchable offline (see sync_library),
+# by pool user (None for the app's own user)
+library_indexes = {}
+
+# Playlists mirrored into others, on top of the snapshots kept in the library
+# index (see sync_playlists), by pool user
+playlist_syncs = {}
+
+# Minimum score for a library match to be used instead of searching the API
+LIBRARY_MIN_SCORE = 0.8
+
+# Candidates fetched by each search request, and how many confirm_item shows at once
+SEARCH_LIMIT = 10
+CANDIDATES_SHOWN = 5
+
+# Weights of the signals used to rank search candidates
+RANKING_WEIGHTS = {
+    "exact_title": 3,
+    "title_in_query": 1.5,
+    "artist_in_query": 2,
+    "in_library": 1,
+    "popularity": 1,
+    "api_order": 0.5,
+}
+
+init_lock = threading.Lock()
+
+
+class NoResults(Exception):
+    """
+    Raised when a search finds nothing, as opposed to a search request that failed.
+    """
+
+
+config_loaded = False
+
+re_auth = False
+
+# Recent search results, so repeated lookups don't go back to /search; the keys
+# include the pool user, since library matches and rankings depend on it
+search_cache = SearchCache(maxsize=256, ttl=600)
+
+# Ranked candidate pages of search_candidates, apart from the search_item results:
+# they are much larger, and a search_item miss that fetches a page counts once
+candidates_cache = SearchCache(maxsize=64, ttl=600)
+
+# Short-lived snapshots of /me/player by pool user, invalidated by our own player commands
+playback_caches = {}
+
+
+def current_user_id():
+    """
+    Return the pool user selected for the current requests (see token_pool), or None for the app's own user.
+    """
+
+    # No user can be selected before http_client is imported, and importing it
+    # here would pull requests into the app's startup
+    module = sys.modules.get("http_client")
+
+    return module.current_user.get() if module else None
+
+
+def user_file(path, user_id):
+    """
+    Return the file of a pool user next to the given one, e.g. .spotify_library.alice.json. The app's own user keeps the given path.
+    """
+
+    if user_id is None:
+        return path
+
+    root, extension = os.path.splitext(path)
+
+    return f"{root}.{quote(str(user_id), safe='')}{extension}"
+
+
+def get_playback_cache():
+    """
+    Return the playback cache of the current user.
+    """
+
+    user_id = current_user_id()
+
+    with init_lock:
+        if user_id not in playback_caches:
+            playback_caches[user_id] = PlaybackCache(fetch_current_playback, ttl=5)
+
+        return playback_caches[user_id]
+
+
+def load_config():
+    """
+    Load the .env file into the environment. Runs once.
+    """
+
+    global config_loaded
+
+    if not config_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        config_loaded = True
+
+
+def get_library_index():
+    """
+    Return the local library index of the current user. Its file is only read on the first search.
+    """
+
+    user_id = current_user_id()
+    library_index = library_indexes.get(user_id)
+
+    if library_index is not None:
+        return library_index
+
+    with init_lock:
+        if user_id not in library_indexes:
+            load_config()
+            library_indexes[user_id] = LibraryIndex(
+                user_file(
+                    os.getenv("SPOTIFY_LIBRARY_FILE", ".spotify_library.json"), user_id
+                )
+            )
+
+        return library_indexes[user_id]
+
+
+def get_playlist_sync():
+    """
+    Return the playlist sync of the current user. Needs the API clients, so it is built after init().
+    """
+
+    init()
+
+    user_id = current_user_id()
+    playlist_sync = playlist_syncs.get(user_id)
+
+    if playlist_sync is not None:
+        return playlist_sync
+
+    library = get_library_index()
+
+    with init_lock:
+        if user_id not in playlist_syncs:
+            playlist_syncs[user_id] = PlaylistSync(
+                http_client,
+                library,
+                user_file(
+                    os.getenv("SPOTIFY_MIRRORS_FILE", ".spotify_mirrors.json"), user_id
+                ),
+            )
+
+        return playlist_syncs[user_id]
+
+
+def get_token_pool():
+    """
+    Return the token pool, built on first use, that lets the app act for other users' accounts.
+
+    Actions run inside `with get_token_pool().user(user_id):` use that user's token, playback state, library and cached searches, through the same clients; the rest keep using the app's own user. Users are added with add_user or start_authorization/finish_authorization, and their tokens are saved in SPOTIFY_USERS_DIR.
+    """
+
+    global token_pool
+
+    init()
+
+    if token_pool is not None:
+        return token_pool
+
+    from token_pool import TokenPool
+    from token_store import DirectoryUserTokenStores
+
+    with init_lock:
+        if token_pool is None:
+            pool = TokenPool(
+                os.getenv("SPOTIFY_CLIENT_ID"),
+                os.getenv("SPOTIFY_CLIENT_SECRET"),
+                os.getenv("REDIRECT_URI"),
+                http_client,
+                stores=DirectoryUserTokenStores(
+                    os.getenv("SPOTIFY_USERS_DIR", ".spotify_users")
+                ),
+                token_url=authenticator.token_url,
+                fallback=token_manager,
+            )
+            pool.start()
+
+            http_client.token_provider = pool
+            token_pool = pool
+
+    return token_pool
+
+
+def init():
+    """
+    Load the configuration and tokens and build the API clients. Runs once, on the first API call; asks for authorization if there is no access token.
+    """
+
+    global BASE_URL, instrumentation, http_client, authenticator, token_manager
+    global spotify, metadata_cache, batch_loader
+
+    if http_client is not None:
+        return
+
+    with init_lock:
+        if http_client is not None:
+            return
+
+        from async_client import AsyncSpotifyClient, SyncSpotifyClient
+        from auth_code_flow import AuthCodeFlow
+        from batch_loader import BatchLoader
+        from http_client import HttpClient
+        from instrumentation import Instrumentation, log_request
+        from metadata_cache import MetadataCache
+        from token_manager import TokenManager
+        from token_store import FileTokenStore
+
+        load_config()
+
+        BASE_URL = os.getenv("BASE_URL")
+
+        # Client credentials
+        client_id = os.getenv("SPOTIFY_CLIENT_ID")
+        client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
+
+        # URI to redirect after authorization
+        redirect_uri = os.getenv("REDIRECT_URI")
+
+        # File where the tokens are saved between runs
+        token_store = FileTokenStore(
+            os.getenv("SPOTIFY_TOKEN_FILE", ".spotify_tokens.json")
+        )
+        tokens = token_store.load()
+
+        # The SPOTIFY_* values in .env are only read until the tokens are saved the first time
+
+        # Token that allows access to the Spotify API
+        access_token = tokens.get("access_token", os.getenv("SPOTIFY_ACCESS_TOKEN"))
+
+        # Token to refresh the access token without the need for user authorization
+        refresh_token = tokens.get("refresh_token", os.getenv("SPOTIFY_REFRESH_TOKEN"))
+
+        # Last time the access token was refreshed
+        last_refresh = tokens.get("last_refresh", os.getenv("SPOTIFY_LAST_REFRESH"))
+
+        instrumentation = Instrumentation()
+        instrumentation.add_post_hook(log_request)
+
+        client = HttpClient(BASE_URL, instrumentation=instrumentation)
+
+        authenticator = AuthCodeFlow(
+            client_id,
+            client_secret,
+            redirect_uri,
+            access_token,
+            refresh_token,
+            last_refresh,
+            http_client=client,
+            token_store=token_store,
+            expires_in=tokens.get("expires_in"),
+        )
+
+        if access_token in (None, "None") or re_auth:
+            print("No hay token de acceso")
+            authenticator.authenticate(re_auth)
+
+        token_manager = TokenManager(authenticator)
+        token_manager.start()
+
+        client.token_provider = token_manager
+
+        spotify = SyncSpotifyClient(
+            AsyncSpotifyClient(client, authenticator, max_concurrency=8)
+        )
+
+        metadata_cache = MetadataCache(
+            os.getenv("SPOTIFY_CACHE_FILE", ".spotify_cache.sqlite3")
+        )
+
+        batch_loader = BatchLoader(client)
+
+        # Set last: the check at the top skips the lock once this is not None
+        http_client = client
+
+
+# response = requests.post(
+#     "https://accounts.spotify.com/api/token",
+#     headers={"Content-Type": "application/x-www-form-urlencoded"},
+#     data={
+#         "grant_type": "client_credentials",
+#         "client_id": CLIENT_ID,
+#         "client_secret": CLIENT_SECRET,
+#     },
+# )
+
+# if response.status_code != 200:
+#     print(response.json())
+#     raise Exception("Failed to get token")
+# else:
+#     token = response.json()["access_token"]
+
+#     print(f"El token es: {token}")
+
+
+def search_key(item_type, item_name, market=None):
+    """
+    Build the cache key of a search for the current user.
+    """
+
+    key = SearchCache.key(item_type, item_name, market)
+    user_id = current_user_id()
+
+    return key if user_id is None else key + (str(user_id),)
+
+
+def search_item(item_type, item_name, market=None, bypass_cache=False):
+    """
+    Search for an item on Spotify and return the result.
+
+    Results are served from the search cache or, for items in the user's library, from the local library index when possible. Use bypass_cache to force a new search.
+    """
+
+    cache_key = search_key(item_type, item_name, market)
+
+    if not bypass_cache:
+        cached = search_cache.get(cache_key)
+
+        if cached is not None:
+            return cached
+
+        # The library doesn't know in which markets its items are available
+        if market is None:
+            matches = get_library_index().search(item_type, item_name, limit=1)
+
+            if matches and matches[0]["score"] >= LIBRARY_MIN_SCORE:
+                match = matches[0]
+                result = (
+                    item_description(item_type, match["name"], match["artists"]),
+                    match["uri"],
+                )
+                search_cache.set(cache_key, result)
+
+                return result
+
+    init()
+
+    if not bypass_cache:
+        cached = metadata_cache.get("search", "|".join(cache_key))
+
+        if cached is not None:
+            search_cache.set(cache_key, tuple(cached))
+            return tuple(cached)
+
+    candidates = search_candidates(
+        item_type, item_name, market=market, bypass_cache=bypass_cache
+    )["candidates"]
+
+    if not candidates:
+        raise NoResults(f"No {item_type} found for {item_name!r}")
+
+    item = candidates[0]
+    metadata_cache.set(item_type, item["id"], item["metadata"])
+
+    item_info = item["info"]
+    item_uri = item["uri"]
+
+    search_cache.set(cache_key, (item_info, item_uri))
+    metadata_cache.set("search", "|".join(cache_key), [item_info, item_uri])
+
+    return item_info, item_uri
+
+
+def search_candidates(
+    item_type, item_name, offset=0, limit=SEARCH_LIMIT, market=None, bypass_cache=False
+):
+    """
+    Search for an item on Spotify and return a page of candidates, best first, with the offset of the next page (None if there are no more).
+
+    The candidates come from a single request and are ranked locally against the query (see rank_candidates).
+    """
+
+    cache_key = search_key(item_type, item_name, market) + (offset, limit)
+
+    if not bypass_cache:
+        cached = candidates_cache.get(cache_key)
+
+        if cached is not None:
+            return cached
+
+    init()
+
+    params = {
+        "q": item_name,
+        "type": item_type,
+        "limit": limit,
+        "offset": offset,
+    }
+
+    if market:
+        params["market"] = market
+
+    search_response = http_client.get("/search", params=params)
+
+    if search_response.status_code != 200:
+        print(search_response.json())
+        raise Exception("Failed to search")
+
+    search_response = search_response.json()[f"{item_type}s"]
+
+    candidates = []
+
+    # Search results may contain null items (e.g. removed playlists)
+    for position, data in enumerate(filter(None, search_response["items"])):
+        item = MODELS[item_type].from_json(data)
+        metadata = entity_metadata(item)
+
+        candidates.append(
+            {
+                "id": item.id,
+                "uri": item.uri,
+                "info": item_description(
+                    item_type, item.name, metadata.get("artists", [])
+                ),
+                "popularity": getattr(item, "popularity", 0) or 0,
+                "position": offset + position,
+                "metadata": metadata,
+            }
+        )
+
+    result = {
+        "candidates": rank_candidates(item_name, candidates),
+        "next_offset": offset + limit if search_response.get("next") else None,
+    }
+
+    candidates_cache.set(cache_key, result)
+
+    return result
+
+
+def rank_candidates(query, candidates):
+    """
+    Score the candidates of a search against the query and sort them, best first.
+
+    The signals are an exact title match, the title or an artist appearing in the query, being in the user's library, popularity and the order of the API results.
+    """
+
+    query = normalize(query)
+    padded_query = f" {query} "
+    library = get_library_index()
+
+    for candidate in candidates:
+        title = normalize(candidate["metadata"]["name"])
+        artists = [
+            normalize(artist) for artist in candidate["metadata"].get("artists", [])
+        ]
+
+        signals = {
+            "exact_title": title == query,
+            "title_in_query": bool(title) and f" {title} " in padded_query,
+            "artist_in_query": any(
+                artist and f" {artist} " in padded_query for artist in artists
+            ),
+            "in_library": candidate["uri"] in library,
+            "popularity": candidate["popularity"] / 100,
+            "api_order": 1 / (1 + candidate["position"]),
+        }
+
+        candidate["score"] = round(
+            sum(RANKING_WEIGHTS[name] * value for name, value in signals.items()), 3
+        )
+
+    return sorted(candidates, key=lambda candidate: -candidate["score"])
+
+
+def item_description(item_type, item_name, artist_names):
+    """
+    Describe an item for the user: just the name for artists and playlists, the name and artists for albums and tracks.
+    """
+
+    # If the item is an artist, or playlist, return its name
+    if item_type == "artist" or item_type == "playlist":
+        return item_name
+
+    # If the item is an album, or track, return the item info (artists, item name)
+    return f"{item_name} - {', '.join(artist_names)}"
+
+
+def sync_library():
+    """
+    Download the user's saved tracks, playlists and followed artists into the local library index. Unchanged playlists are skipped.
+    """
+
+    init()
+
+    return get_library_index().sync(http_client)
+
+
+def entity_metadata(item):
+    """
+    Keep only the fields of a track, album, artist or playlist that the app uses.
+    """
+
+    metadata = {
+        "name": item.name,
+        "uri": item.uri,
+    }
+
+    if isinstance(item, (Track, Album)):
+        metadata["artists"] = item.artist_names()
+
+    if isinstance(item, Track):
+        metadata["duration_ms"] = item.duration_ms
+
+    return metadata
+
+
+def lookup_items(item_type, item_ids):
+    """
+    Return the metadata of tracks, albums or artists by ID, URI or URL, in the same order (None for unknown IDs).
+
+    Cached items aren't requested again; the rest are fetched through the batch loader, so they (and any lookups made meanwhile by other threads) share the multi-ID requests.
+    """
+
+    init()
+
+    from async_client import to_id
+
+    item_ids = [to_id(item_id) for item_id in item_ids]
+    found = {}
+
+    for item_id in item_ids:
+        if item_id not in found:
+            found[item_id] = metadata_cache.get(item_type, item_id)
+
+    missing = [item_id for item_id, metadata in found.items() if metadata is None]
+
+    for item_id, item in zip(missing, batch_loader.get_many(item_type, missing)):
+        if item is not None:
+            found[item_id] = entity_metadata(item)
+            metadata_cache.set(item_type, item_id, found[item_id])
+
+    return [found[item_id] for item_id in item_ids]
+
+
+def play_song():
+    """
+    Search for a song on Spotify, ask the user if it is the correct song, and play it. Otherwise, repeat the process.
+    """
+
+    print("----- REPRODUCIR CANCIÓN -----")
+
+    song_uri = confirm_item("track")
+
+    play = play_uris([song_uri])
+
+    input("\nPresione Enter para continuar...")
+
+
+def play_uris(uris):
+    """
+    Play a list of track URIs from the beginning.
+    """
+
+    return send_player_command(
+        "PUT",
+        "/me/player/play",
+        json={
+            "uris": uris,
+            "position_ms": 0,
+        },
+    )
+
+
+def play_context(context_uri, from_start=True):
+    """
+    Play an album, playlist or artist. Albums and playlists start from their first track; artists don't accept an offset.
+    """
+
+    body = {
+        "context_uri": context_uri,
+    }
+
+    if from_start:
+        body["offset"] = {
+            "position": 0,
+        }
+        body["position_ms"] = 0
+
+    return send_player_command("PUT", "/me/player/play", json=body)
+
+
+def play_album():
+    """
+    Search for an album on Spotify, ask the user if it is the correct album, and play it. Otherwise, repeat the process.
+    """
+
+    print("----- REPRODUCIR ÁLBUM -----")
+
+    album_uri = confirm_item("album")
+
+    play = play_context(album_uri)
+
+    input("\nPresione Enter para continuar...")
+
+
+def play_playlist():
+    """
+    Search for a playlist on Spotify, ask the user if it is the correct playlist, and play it. Otherwise, repeat the process.
+    """
+
+    print("----- REPRODUCIR PLAYLIST -----")
+
+    choice = input("\n¿Desea reproducir una playlist propia? (s/n) ")
+
+    if choice == "s":
+        playlists = get_own_playlists()
+
+        for i, playlist in enumerate(playlists.keys()):
+            print(f"{i+1}. {playlist}")
+
+        input_playlist = int(
+            input("\nDigite el número de la playlist que desea reproducir: ")
+        )
+
+        playlist_uri = playlists[list(enumerate(playlists))[input_playlist - 1][1]]
+
+    else:
+        playlist_uri = confirm_item("playlist")
+
+    play = play_context(playlist_uri)
+
+    input("\nPresione Enter para continuar...")
+
+
+def play_artist():
+    """
+    Search for an artist on Spotify, ask the user if it is the correct artist, and play it. Otherwise, repeat the process.
+    """
+
+    print("----- REPRODUCIR ARTISTA -----")
+
+    artist_uri = confirm_item("artist")
+
+    play = play_context(artist_uri, from_start=False)
+
+    input("\nPresione Enter para continuar...")
+
+
+def play_likes():
+    """
+    Play the user's liked songs.
+    """
+
+    print("----- REPRODUCIR TUS ME GUSTA -----")
+
+    play = play_liked_songs()
+
+    try:
+        print(play.json())
+    except:
+        pass
+
+    input("\nPresione Enter para continuar...")
+
+
+def play_liked_songs():
+    """
+    Play the user's liked songs collection.
+    """
+
+    init()
+
+    user_id = http_client.get("/me")
+
+    user_id = user_id.json()["id"]
+
+    return play_context(f"spotify:user:{user_id}:collection", from_start=False)
+
+
+def add_song_to_queue():
+    """
+    Add a song to the queue.
+    """
+
+    print("----- AGREGAR CANCIÓN A LA COLA -----")
+
+    song_uri = confirm_item("track")
+
+    add = queue_uri(song_uri)
+
+    input("\nPresione Enter para continuar...")
+
+
+def queue_uri(uri):
+    """
+    Add a track URI to the end of the queue.
+    """
+
+    return send_player_command(
+        "POST",
+        "/me/player/queue",
+        params={
+            "uri": uri,
+        },
+    )
+
+
+def queue_songs(song_names, max_workers=8):
+    """
+    Add many songs to the queue. The names are resolved with concurrent searches, then the songs are queued one by one in the original order, since the queue depends on it.
+
+    Returns a report with the queued songs, the names the search found nothing for (unresolved), the ones whose search or queueing failed, with the error or status, and the timings.
+    """
+
+    start = time.perf_counter()
+    song_names = [name.strip() for name in song_names if name.strip()]
+
+    def resolve(song_name):
+        try:
+            return search_item("track", song_name)
+
+        except NoResults:
+            return None
+
+        # Failed searches are reported apart from the ones that found nothing
+        except Exception as e:
+            return e
+
+    # Each search runs in a copy of the caller's context, so the selected pool user carries over
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(contextvars.copy_context().run, resolve, song_name)
+            for song_name in song_names
+        ]
+        results = [future.result() for future in futures]
+
+    resolved_at = time.perf_counter()
+
+    queued = []
+    unresolved = []
+    failed = []
+
+    for song_name, result in zip(song_names, results):
+        if result is None:
+            unresolved.append(song_name)
+            continue
+
+        if isinstance(result, Exception):
+            failed.append({"name": song_name, "uri": None, "error": str(result)})
+            continue
+
+        song_info, song_uri = result
+        add = queue_uri(song_uri)
+
+        if 200 <= add.status_code < 300:
+            queued.append({"name": song_name, "song": song_info, "uri": song_uri})
+
+        else:
+            failed.append(
+                {"name": song_name, "uri": song_uri, "status": add.status_code}
+            )
+
+    end = time.perf_counter()
+
+    return {
+        "queued": queued,
+        "unresolved": unresolved,
+        "failed": failed,
+        "timings": {
+            "resolve_s": round(resolved_at - start, 3),
+            "queue_s": round(end - resolved_at, 3),
+            "total_s": round(end - start, 3),
+        },
+    }
+
+
+def read_song_names(path):
+    """
+    Read song names from a file, one per line. Blank lines and lines starting with # are skipped.
+    """
+
+    with open(path, encoding="utf-8") as file:
+        return [
+            line.strip()
+            for line in file
+            if line.strip() and not line.strip().startswith("#")
+        ]
+
+
+def add_songs_to_queue_from_file():
+    """
+    Add every song listed in a file to the queue.
+    """
+
+    print("----- AGREGAR CANCIONES A LA COLA DESDE ARCHIVO -----")
+
+    path = input("\nDigite la ruta del archivo (una canción por línea): ")
+    report = queue_songs(read_song_names(path))
+
+    print(f"\nCanciones agregadas: {len(report['queued'])}")
+
+    for song_name in report["unresolved"]:
+        print(f"- No encontrada: {song_name}")
+
+    for item in report["failed"]:
+        print(
+            f"- No se pudo agregar: {item['name']} ({item.get('error') or item['status']})"
+        )
+
+    print(f"\nTiempo total: {report['timings']['total_s']} s")
+
+    input("\nPresione Enter para continuar...")
+
+
+def confirm_item(item_type):
+    """
+    Search for an item on Spotify, show the best candidates and return the URI of the one the user picks.
+
+    The candidates of a search are fetched and ranked at once; more are only requested when the user has seen them all.
+    """
+
+    while True:
+        item_name = input(f"\nDigite el nombre del {item_type}: ")
+        item_uri = pick_candidate(item_type, item_name)
+
+        if item_uri is not None:
+            return item_uri
+
+
+def pick_candidate(item_type, item_name):
+    """
+    Show the candidates for a search, CANDIDATES_SHOWN at a time, and return the URI of the chosen one, or None to search again.
+    """
+
+    page = search_candidates(item_type, item_name)
+    candidates = list(page["candidates"])
+    next_offset = page["next_offset"]
+    start = 0
+
+    while True:
+        # Fetch the next page only once the user has seen every candidate
+        if start + CANDIDATES_SHOWN > len(candidates) and next_offset is not None:
+            page = search_candidates(item_type, item_name, offset=next_offset)
+            candidates += page["candidates"]
+            next_offset = page["next_offset"]
+
+        shown = candidates[start : start + CANDIDATES_SHOWN]
+
+        if not shown:
+            print(f"\nNo hay más resultados para '{item_name}'")
+            return None
+
+        print()
+
+        for number, candidate in enumerate(shown, start + 1):
+            print(f"{number}. {candidate['info']}")
+
+        choice = input(
+            f"\nDigite el número del {item_type} que desea "
+            "(m: ver más, Enter: buscar otro nombre): "
+        ).strip()
+
+        if choice == "m":
+            start += CANDIDATES_SHOWN
+
+        elif choice.isdigit() and 1 <= int(choice) <= len(candidates):
+            return candidates[int(choice) - 1]["uri"]
+
+        else:
+            return None
+
+
+def like_song():
+    """
+    Like a song.
+    """
+
+    print("----- DAR LIKE A UNA CANCIÓN -----")
+
+    like = like_current_song()
+
+    input("\nPresione Enter para continuar...")
+
+
+def like_current_song():
+    """
+    Like the song that is playing. Returns the ID of the song and the response.
+    """
+
+    init()
+
+    current_song_id = get_current_item().id
+
+    like = http_client.put(
+        "/me/tracks",
+        json={
+            "ids": [current_song_id],
+        },
+    )
+
+    return current_song_id, like
+
+
+def like_songs(track_ids):
+    """
+    Like many songs at once. Takes IDs, URIs or URLs and returns the result of each request.
+    """
+
+    init()
+
+    return spotify.save_tracks(list(track_ids))
+
+
+def unlike_songs(track_ids):
+    """
+    Remove many songs from the user's liked songs at once.
+    """
+
+    init()
+
+    return spotify.remove_saved_tracks(list(track_ids))
+
+
+def get_current_playback(max_age=None):
+    """
+    Get the current playback. A snapshot younger than max_age seconds (the cache TTL by default) is reused.
+    """
+
+    return get_playback_cache().get(max_age)
+
+
+def get_current_item():
+    """
+    Get the song (or episode) that is playing. Raises an error if nothing is.
+    """
+
+    playback = get_current_playback()
+
+    if playback is None or playback.item is None:
+        raise Exception("Nothing is playing")
+
+    return playback.item
+
+
+def fetch_current_playback():
+    """
+    Fetch the current playback from the API, or None if nothing is playing.
+    """
+
+    init()
+
+    playback_state = http_client.get("/me/player")
+
+    if playback_state.status_code == 204:
+        return None
+
+    # current_song_uri = playback_state.json()["item"]["uri"]
+    # current_song_id = playback_state.json()["item"]["id"]
+
+    return PlaybackState.from_json(playback_state.json())
+
+
+def send_player_command(method, path, **kwargs):
+    """
+    Send a request that changes the playback or the queue, and drop the cached playback state.
+    """
+
+    init()
+
+    response = http_client.request(method, path, **kwargs)
+    get_playback_cache().invalidate()
+
+    return response
+
+
+def follow_artist():
+    """
+    Follows the current artist.
+    """
+
+    print("----- SEGUIR ARTISTA -----")
+
+    artist_id, follow_response = follow_current_artist()
+
+    try:
+        print(follow_response.json())
+    except:
+        pass
 
-load_dotenv()
+    input("\nPresione Enter para continuar...")
 
-# Base URL for the Spotify API
-BASE_URL = os.getenv("BASE_URL")
 
-# Client credentials
-CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
-CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
+def follow_current_artist():
+    """
+    Follow the main artist of the song that is playing. Returns the ID of the artist and the response.
+    """
 
-# URI to redirect after authorization
-REDIRECT_URI = os.getenv("REDIRECT_URI")
+    init()
 
-# Token that allows access to the Spotify API
-access_token = os.getenv("SPOTIFY_ACCESS_TOKEN")
+    current_item = get_current_item()
 
-# Token to refresh the access token without the need for user authorization
-refresh_token = os.getenv("SPOTIFY_REFRESH_TOKEN")
+    if not current_item.artists:
+        raise Exception("The current song has no artist")
 
-# Last time the access token was refreshed
-last_refresh = os.getenv("SPOTIFY_LAST_REFRESH")
+    artist_id = current_item.artists[0].id
 
-authenticator = AuthCodeFlow(
-    CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, access_token, refresh_token, last_refresh
-)
+    follow_response = http_client.put(
+        "/me/following",
+        params={
+            "type": "artist",
+            "ids": artist_id,
+        },
+    )
 
-re_auth = False
+    return artist_id, follow_response
 
 
-def is_expired_token():
+def follow_artists(artist_ids):
     """
-    Check if the access token has expired.
+    Follow many artists at once. Takes IDs, URIs or URLs and returns the result of each request.
     """
 
-    # print(f"Diferencia: {time.time() - float(last_refresh)}")
-    return time.time() - float(last_refresh) >= 3600
+    init()
 
+    return spotify.follow_artists(list(artist_ids))
 
-if access_token == "None" or re_auth:
-    print("No hay token de acceso")
-    access_token = authenticator.authenticate(re_auth)
 
-elif is_expired_token():
-    access_token = authenticator.refresh_token()
+def get_current_song_info():
+    """
+    Get the current song info: name, artists, and duration (mm:ss).
+    """
 
-# response = requests.post(
-#     "https://accounts.spotify.com/api/token",
-#     headers={"Content-Type": "application/x-www-form-urlencoded"},
-#     data={
-#         "grant_type": "client_credentials",
-#         "client_id": CLIENT_ID,
-#         "client_secret": CLIENT_SECRET,
-#     },
-# )
+    print("----- INFORMACIÓN DE LA CANCIÓN ACTUAL -----")
 
-# if response.status_code != 200:
-#     print(response.json())
-#     raise Exception("Failed to get token")
-# else:
-#     token = response.json()["access_token"]
+    current_song = current_song_info()
 
-#     print(f"El token es: {token}")
+    seconds = current_song["duration_ms"] // 1000
+    minutes = seconds // 60
+    seconds = seconds % 60
 
+    print(f"Nombre: {current_song['name']}")
+    print(f"Artista(s): {', '.join(current_song['artists'])}")
+    print(f"Duración: {minutes}:{seconds:02d}")
 
-def search_item(item_type, item_name):
-    """
-    Search for an item on Spotify and return the result.
-    """
+    if current_song["progress_ms"] is not None:
+        progress_seconds = current_song["progress_ms"] // 1000
+        print(f"Posición: {progress_seconds // 60}:{progress_seconds % 60:02d}")
 
-    search_response = requests.get(
-        f"{BASE_URL}/search?q={item_name}&type={item_type}&limit=1",
-        headers={
-            "Authorization": f"Bearer {access_token}",
-        },
-    )
+    input("\nPresione Enter para continuar...")
 
-    if search_response.status_code != 200:
-        print(search_response.json())
-        raise Exception("Failed to search")
 
-    search_response = search_response.json()
+def current_song_info():
+    """
+    Return the name, URI, artists, duration and estimated position of the song that is playing.
+    """
 
-    # print(search_response)
+    init()
 
-    item_name = search_response[f"{item_type}s"]["items"][0]["name"]
-    item_uri = search_response[f"{item_type}s"]["items"][0]["uri"]
+    current_item = get_current_item()
 
-    # If the item is an artist, or playlist, return its name and URI
-    if item_type == "artist" or item_type == "playlist":
-        return item_name, item_uri
+    # Local files have no ID, so their metadata can't be cached
+    if not current_item.id:
+        current_song = entity_metadata(current_item)
+
+    else:
+        # The playback only tells which track is playing; its metadata is read through the cache
+        current_song = metadata_cache.get("track", current_item.id)
 
-    # If the item is an album, or track, return the item info (artists, item name) and URI
-    artists = search_response[f"{item_type}s"]["items"][0]["artists"]
-    artist_names = ", ".join([artist["name"] for artist in artists])
-    item_info = f"{item_name} - {artist_names}"
+        if current_song is None:
+            current_song = entity_metadata(current_item)
+            metadata_cache.set("track", current_item.id, current_song)
 
-    return item_info, item_uri
+    return {
+        **current_song,
+        "progress_ms": get_playback_cache().estimated_progress_ms(),
+    }
 
 
-def play_song():
+def get_current_queue():
     """
-    Search for a song on Spotify, ask the user if it is the correct song, and play it. Otherwise, repeat the process.
+    Get the current queue.
     """
 
-    print("----- REPRODUCIR CANCIÓN -----")
+    print("----- COLA ACTUAL -----")
 
-    song_uri = confirm_item("track")
+    queue = current_queue()
 
-    play = requests.put(
-        f"{BASE_URL}/me/player/play",
-        headers={
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json",
-        },
-        json={
-            "uris": [song_uri],
-            "position_ms": 0,
-        },
-    )
+    queue_names = ""
+
+    for item in queue:
+        song_name = item["name"]
+        song_artists = ", ".join(item["artists"])
+
+        queue_names += f"- {song_name} - {song_artists}\n"
+
+    print(f"\n{queue_names}")
 
     input("\nPresione Enter para continuar...")
 
 
-def play_album():
+def current_queue():
     """
-    Search for an album on Spotify, ask the user if it is the correct album, and play it. Otherwise, repeat the process.
+    Return the songs in the queue (name, URI, artists, duration).
     """
 
-    print("----- REPRODUCIR ÁLBUM -----")
+    init()
 
-    album_uri = confirm_item("album")
+    queue_response = http_client.get("/me/player/queue")
 
-    play = requests.put(
-        f"{BASE_URL}/me/player/play",
-        headers={
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json",
-        },
-        json={
-            "context_uri": album_uri,
-            "offset": {
-                "position": 0,
-            },
-            "position_ms": 0,
-        },
-    )
+    if queue_response.status_code != 200:
+        print(queue_response.json())
+        raise Exception("Failed to get queue")
 
-    input("\nPresione Enter para continuar...")
+    queue_response = queue_response.json()
 
+    return [entity_metadata(item) for item in Queue.from_json(queue_response).items]
 
-def play_playlist():
+
+def set_volume():
     """
-    Search for a playlist on Spotify, ask the user if it is the correct playlist, and play it. Otherwise, repeat the process.
+    Set the volume of the player.
     """
 
-    print("----- REPRODUCIR PLAYLIST -----")
+    print("----- AJUSTAR VOLUMEN -----")
 
-    choice = input("\n¿Desea reproducir una playlist propia? (s/n) ")
+    volume_level = input("\nDigite el nivel de volumen (0-100): ")
 
-    if choice == "s":
-        playlists = get_own_playlists()
+    set_volume_response = set_volume_level(volume_level)
 
-        for i, playlist in enumerate(playlists.keys()):
-            print(f"{i+1}. {playlist}")
+    input("\nPresione Enter para continuar...")
 
-        input_playlist = int(
-            input("\nDigite el número de la playlist que desea reproducir: ")
-        )
 
-        playlist_uri = playlists[list(enumerate(playlists))[input_playlist - 1][1]]
+def set_volume_level(volume_level):
+    """
+    Set the volume of the player. Levels outside 0-100 are clamped to the nearest end, as in the async client.
+    """
 
-    else:
-        playlist_uri = confirm_item("playlist")
+    from async_client import clamp_volume
 
-    play = requests.put(
-        f"{BASE_URL}/me/player/play",
-        headers={
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json",
-        },
-        json={
-            "context_uri": playlist_uri,
-            "offset": {
-                "position": 0,
-            },
-            "position_ms": 0,
+    return send_player_command(
+        "PUT",
+        "/me/player/volume",
+        params={
+            "volume_percent": clamp_volume(volume_level),
         },
     )
 
-    input("\nPresione Enter para continuar...")
 
+def own_playlists_key():
+    # Metadata cache key of the current user's playlist names
+    user_id = current_user_id()
 
-def play_artist():
+    return "me" if user_id is None else f"user:{user_id}"
+
+
+def get_own_playlists():
     """
-    Search for an artist on Spotify, ask the user if it is the correct artist, and play it. Otherwise, repeat the process.
+    Get the user's playlists (all pages).
     """
 
-    print("----- REPRODUCIR ARTISTA -----")
+    init()
 
-    artist_uri = confirm_item("artist")
+    cached = metadata_cache.get("playlists", own_playlists_key())
 
-    play = requests.put(
-        f"{BASE_URL}/me/player/play",
-        headers={
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json",
-        },
-        json={
-            "context_uri": artist_uri,
-        },
-    )
+    if cached is not None:
+        return cached
 
-    input("\nPresione Enter para continuar...")
+    playlists = {
+        playlist.name: playlist.uri
+        for playlist in map(Playlist.from_json, iter_own_playlists())
+    }
 
+    metadata_cache.set("playlists", own_playlists_key(), playlists)
 
-def play_likes():
+    return playlists
+
+
+def iter_own_playlists(max_items=None):
     """
-    Play the user's liked songs.
+    Yield the user's playlists, fetching the pages as they are needed.
     """
 
-    print("----- REPRODUCIR TUS ME GUSTA -----")
+    init()
 
-    user_id = requests.get(
-        f"{BASE_URL}/me",
-        headers={
-            "Authorization": f"Bearer {access_token}",
-        },
+    return iter_pages(
+        http_client,
+        "/me/playlists",
+        max_items=max_items,
+        error="Failed to get playlists",
     )
 
-    user_id = user_id.json()["id"]
 
-    play = requests.put(
-        f"{BASE_URL}/me/player/play",
-        headers={
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json",
-        },
-        json={
-            "context_uri": f"spotify:user:{user_id}:collection",
-        },
-    )
+def iter_saved_tracks(max_items=None):
+    """
+    Yield the user's liked songs ({"added_at", "track"} items).
+    """
 
-    try:
-        print(play.json())
-    except:
-        pass
+    init()
 
-    input("\nPresione Enter para continuar...")
+    return iter_pages(
+        http_client,
+        "/me/tracks",
+        max_items=max_items,
+        error="Failed to get saved tracks",
+    )
 
 
-def add_song_to_queue():
+def iter_followed_artists(max_items=None):
     """
-    Add a song to the queue.
+    Yield the artists the user follows.
     """
 
-    print("----- AGREGAR CANCIÓN A LA COLA -----")
-
-    song_uri = confirm_item("track")
+    init()
 
-    add = requests.post(
-        f"{BASE_URL}/me/player/queue?uri={song_uri.replace(':', '%3A')}",
-        headers={
-            "Authorization": f"Bearer {access_token}",
-        },
+    return iter_pages(
+        http_client,
+        "/me/following",
+        params={"type": "artist"},
+        max_items=max_items,
+        container_key="artists",
+        error="Failed to get followed artists",
     )
 
-    input("\nPresione Enter para continuar...")
-
 
-def confirm_item(item_type):
+def iter_playlist_tracks(playlist_id, max_items=None):
     """
-    Search for an item on Spotify, ask the user if it is the correct item, and return the URI when it is.
+    Yield the tracks of a playlist ({"added_at", "track"} items).
     """
 
-    while True:
-        item_name = input(f"\nDigite el nombre del {item_type}: ")
-        item_info, item_uri = search_item(item_type, item_name)
+    init()
 
-        print(f"\n{item_type.capitalize()}: {item_info}")
-        print(f"¿Es este el {item_type} que desea reproducir? (s/n)")
-        confirm = input()
-
-        if confirm == "s":
-            return item_uri
+    return iter_pages(
+        http_client,
+        f"/playlists/{playlist_id}/tracks",
+        params={"fields": PLAYLIST_TRACKS_FIELDS},
+        limit=100,
+        max_items=max_items,
+        error="Failed to get playlist tracks",
+    )
 
 
-def like_song():
+def sync_library_menu():
     """
-    Like a song.
+    Sync the local library index.
     """
 
-    print("----- DAR LIKE A UNA CANCIÓN -----")
+    print("----- SINCRONIZAR BIBLIOTECA -----")
 
-    current_song_id = get_current_playback()["item"]["id"]
+    result = sync_library()
 
-    like = requests.put(
-        f"{BASE_URL}/me/tracks?ids={current_song_id}",
-        headers={
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json",
-        },
-        json={
-            "ids": current_song_id,
-        },
-    )
+    print(f"\nPlaylists descargadas: {result['playlists_fetched']}")
+    print(f"Playlists sin cambios: {result['playlists_skipped']}")
+    print(f"Elementos en la biblioteca: {result['entries']}")
 
     input("\nPresione Enter para continuar...")
 
 
-def get_current_playback():
+def sync_playlists():
     """
-    Get the current playback.
+    Sync the local copy of the user's playlists, fetching only the tracks of playlists whose snapshot changed, and copy the mirrored playlists into their targets. Returns what changed.
     """
 
-    playback_state = requests.get(
-        f"{BASE_URL}/me/player",
-        headers={
-            "Authorization": f"Bearer {access_token}",
+    result = get_playlist_sync().sync()
+
+    # The listing was just fetched, so it also refreshes the cached playlist names
+    metadata_cache.set(
+        "playlists",
+        own_playlists_key(),
+        {
+            entry["name"]: entry["uri"]
+            for entry in get_library_index().playlists().values()
         },
     )
 
-    # current_song_uri = playback_state.json()["item"]["uri"]
-    # current_song_id = playback_state.json()["item"]["id"]
-
-    return playback_state.json()
+    return result
 
 
-def follow_artist():
+def mirror_playlist(source, target):
     """
-    Follows the current artist.
+    Make every playlist sync copy the set of tracks (not their order) of one playlist into another, given as IDs, URIs, URLs or names of own playlists, and sync now.
     """
 
-    print("----- SEGUIR ARTISTA -----")
-
-    artist_id = get_current_playback()["item"]["artists"][0]["id"]
+    own_playlists = get_own_playlists()
 
-    follow_response = requests.put(
-        f"{BASE_URL}/me/following",
-        headers={
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json",
-        },
-        params={
-            "type": "artist",
-            "ids": artist_id,
-        },
+    get_playlist_sync().add_mirror(
+        own_playlists.get(source, source), own_playlists.get(target, target)
     )
 
-    try:
-        print(follow_response.json())
-    except:
-        pass
-
-    input("\nPresione Enter para continuar...")
+    return sync_playlists()
 
 
-def get_current_song_info():
+def sync_playlists_menu():
     """
-    Get the current song info: name, artists, and duration (mm:ss).
+    Sync the user's playlists, optionally mirroring one into another first.
     """
 
-    print("----- INFORMACIÓN DE LA CANCIÓN ACTUAL -----")
-
-    current_playback_info = get_current_playback()
+    print("----- SINCRONIZAR PLAYLISTS -----")
 
-    current_song_name = current_playback_info["item"]["name"]
-    current_song_artists = ", ".join(
-        [artist["name"] for artist in current_playback_info["item"]["artists"]]
+    source = input(
+        "\nDigite la playlist a copiar (o presione Enter para solo sincronizar): "
     )
 
-    current_song_duration_ms = current_playback_info["item"]["duration_ms"]
-    seconds = current_song_duration_ms // 1000
-    minutes = seconds // 60
-    seconds = seconds % 60
+    if source:
+        target = input("Digite la playlist de destino: ")
+        result = mirror_playlist(source, target)
 
-    print(f"Nombre: {current_song_name}")
-    print(f"Artista(s): {current_song_artists}")
-    print(f"Duración: {minutes}:{seconds:02d}")
+    else:
+        result = sync_playlists()
+
+    print(f"\nPlaylists descargadas: {result['fetched']}")
+    print(f"Playlists sin cambios: {result['skipped']}")
+
+    for change in result["changes"]:
+        if change["added"] or change["removed"]:
+            print(
+                f"- {change['name']}: +{len(change['added'])} -{len(change['removed'])}"
+            )
+
+    for mirror in result["mirrored"]:
+        print(
+            f"Copia {mirror['source']} -> {mirror['target']}: "
+            f"+{mirror['added']} -{mirror['removed']}"
+        )
 
     input("\nPresione Enter para continuar...")
 
 
-def get_current_queue():
+def export_tracks(source, output, format="ndjson", resume=True):
     """
-    Get the current queue.
+    Stream the tracks of a playlist (ID, URI, URL or the name of an own playlist), or of the liked songs with source "likes", to an NDJSON or CSV file.
+
+    An interrupted export of the same source to the same file resumes where it stopped, unless resume is False.
     """
 
-    print("----- COLA ACTUAL -----")
+    init()
 
-    queue_response = requests.get(
-        f"{BASE_URL}/me/player/queue",
-        headers={
-            "Authorization": f"Bearer {access_token}",
-        },
-    )
+    if source == "likes":
+        path, limit, params = "/me/tracks", 50, None
 
-    if queue_response.status_code != 200:
-        print(queue_response.json())
-        raise Exception("Failed to get queue")
+    else:
+        from async_client import to_id
 
-    queue_response = queue_response.json()
+        playlist_uri = get_own_playlists().get(source, source)
+        path, limit = f"/playlists/{to_id(playlist_uri)}/tracks", 100
+        params = {"fields": PLAYLIST_TRACKS_FIELDS}
 
-    queue = queue_response["queue"]
+    return TrackExporter(http_client, path, output, format, limit, params=params).run(
+        resume
+    )
 
-    print(queue)
 
-    queue_names = ""
+def export_tracks_menu():
+    """
+    Export the tracks of a playlist or the liked songs to a file.
+    """
 
-    for item in queue:
-        song_name = item["name"]
-        song_artists = ", ".join([artist["name"] for artist in item["artists"]])
+    print("----- EXPORTAR CANCIONES -----")
 
-        queue_names += f"- {song_name} - {song_artists}\n"
+    source = input(
+        "\nDigite el nombre, ID o URI de la playlist (o 'likes' para tus Me Gusta): "
+    )
+    output = input("Digite la ruta del archivo (.ndjson o .csv): ")
+    format = "csv" if output.lower().endswith(".csv") else "ndjson"
 
-    print(f"\n{queue_names}")
+    result = export_tracks(source, output, format)
+
+    if result["resumed_from"]:
+        print(f"\nExportación reanudada desde la posición {result['resumed_from']}")
+
+    print(f"\nCanciones exportadas: {result['exported']} ({result['output']})")
 
     input("\nPresione Enter para continuar...")
 
 
-def set_volume():
+def show_metrics():
     """
-    Set the volume of the player.
+    Show the latency, status and size metrics of the requests sent so far, and the queue depth and waits of the request scheduler.
     """
 
-    print("----- AJUSTAR VOLUMEN -----")
+    print("----- MÉTRICAS DE LAS PETICIONES -----")
 
-    volume_level = input("\nDigite el nivel de volumen (0-100): ")
+    if http_client is None:
+        print("\nTodavía no se ha enviado ninguna petición")
+        input("\nPresione Enter para continuar...")
+        return
 
-    set_volume_response = requests.put(
-        f"{BASE_URL}/me/player/volume?volume_percent={volume_level if int(volume_level) >= 0 and int(volume_level) <= 100 else 100}",
-        headers={
-            "Authorization": f"Bearer {access_token}",
-        },
-    )
+    for endpoint in instrumentation.to_dict():
+        latency = endpoint["latency_ms"]
+        print(
+            f"{endpoint['method']} {endpoint['endpoint']}: {endpoint['count']} peticiones, "
+            f"media {latency['mean']} ms, p95 <= {latency['p95']} ms, "
+            f"estados {endpoint['statuses']}, reintentos {endpoint['retries']}"
+        )
 
-    input("\nPresione Enter para continuar...")
+    print(f"\nConexiones: {http_client.stats()}")
+    print(f"Búsquedas por lotes: {batch_loader.stats()}")
 
+    # Queue depth and waits of each endpoint class, to tune the pacing limits
+    print("\nPlanificador de peticiones:")
 
-def get_own_playlists():
-    """
-    Get the user's playlists.
-    """
+    for name, stats in http_client.scheduler.stats().items():
+        print(
+            f"{name}: {stats['requests']} peticiones, cola {stats['queue_depth']} "
+            f"(máx. {stats['max_queue_depth']}), esperas {stats['waited']} "
+            f"(total {stats['wait_s_total']} s, máx. {stats['wait_s_max']} s), "
+            f"reintentos {stats['retries']}, 429 {stats['throttled']}"
+        )
 
-    playlists_response = requests.get(
-        f"{BASE_URL}/me/playlists?limit=50",
-        headers={
-            "Authorization": f"Bearer {access_token}",
-        },
-    )
+    input("\nPresione Enter para continuar...")
 
-    if playlists_response.status_code != 200:
-        print(playlists_response.json())
-        raise Exception("Failed to get playlists")
 
-    playlists_response = playlists_response.json()
-    playlists_names = [playlist["name"] for playlist in playlists_response["items"]]
-    playlists_uris = [playlist["uri"] for playlist in playlists_response["items"]]
+def clear_screen():
+    os.system("cls" if os.name == "nt" else "clear")
 
-    playlists = dict(zip(playlists_names, playlists_uris))
 
-    return playlists
+def show_menu():
+    """
+    Show the main menu until the user chooses to leave.
+    """
 
+    while show_menu_once():
+        pass
 
-def show_menu():
+
+def show_menu_once():
     """
-    Show the main menu.
+    Show the main menu and run one action. Returns False when the user chooses to leave.
     """
 
-    os.system("cls")
+    clear_screen()
 
     print("Digite la acción que desea realizar:")
     print("1. Buscar canción")
@@ -486,11 +1494,16 @@ def show_menu():
     print("10. Obtener información canción actual")
     print("11. Obtener cola actual")
     print("12. Establecer volumen")
+    print("13. Agregar canciones a la cola desde archivo")
+    print("14. Ver métricas de las peticiones")
+    print("15. Sincronizar biblioteca local")
+    print("16. Exportar canciones de una playlist o de tus Me Gusta")
+    print("17. Sincronizar playlists")
     print("0. Salir")
 
     action = input()
 
-    os.system("cls")
+    clear_screen()
 
     if action == "1":
         song_info, song_uri = search_item(
@@ -533,11 +1546,44 @@ def show_menu():
     elif action == "12":
         set_volume()
 
+    elif action == "13":
+        add_songs_to_queue_from_file()
+
+    elif action == "14":
+        show_metrics()
+
+    elif action == "15":
+        sync_library_menu()
+
+    elif action == "16":
+        export_tracks_menu()
+
+    elif action == "17":
+        sync_playlists_menu()
+
     elif action == "0":
         print("¡Adiós! :-)")
-        return
+        return False
+
+    return True
+
+
+def main(argv=None):
+    """
+    Run a command given as arguments (see cli.py), or show the menu when there are none.
+    """
+
+    argv = sys.argv[1:] if argv is None else argv
+
+    if argv:
+        import cli
+
+        return cli.main(argv)
 
     show_menu()
 
+    return 0
+
 
-show_menu()
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,338 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Most IDs accepted per request by /me/tracks and /me/following
+MAX_IDS_PER_REQUEST = 50
+
+
+def to_id(value):
+    """
+    Return the Spotify ID of an ID, URI (spotify:track:ID) or open.spotify.com URL.
+    """
+
+    value = value.strip()
+
+    if value.startswith("spotify:"):
+        return value.split(":")[-1]
+
+    if "open.spotify.com/" in value:
+        return value.split("?")[0].rstrip("/").split("/")[-1]
+
+    return value
+
+
+def clamp_volume(level):
+    """
+    Return a volume level as the API expects it: an integer clamped to 0-100.
+    """
+
+    return max(0, min(int(level), 100))
+
+
+def chunked(items, size):
+    """
+    Split a list into lists of at most `size` items.
+    """
+
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+class AsyncSpotifyClient:
+    """
+    Class to call the Spotify API from asyncio code.
+
+    It covers the same operations as app.py. Requests run on the pooled HttpClient in a thread pool, and a semaphore bounds how many of them are in flight, so independent calls can be awaited together. Pacing and retries are left to the HttpClient's request scheduler.
+    """
+
+    def __init__(self, http_client, authenticator=None, max_concurrency=8):
+        self.http_client = http_client
+        self.authenticator = authenticator
+        self.max_concurrency = max_concurrency
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="spotify-async"
+        )
+
+        self._semaphore = None
+        self._semaphore_loop = None
+
+    def _get_semaphore(self):
+        """
+        Returns the semaphore for the running loop, creating it on first use.
+        """
+
+        loop = asyncio.get_running_loop()
+
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+
+        return self._semaphore
+
+    def _auth_headers(self, headers=None):
+        """
+        Adds the authenticator's current token to the request headers, unless the HTTP client already gets it from a token provider.
+        """
+
+        headers = dict(headers or {})
+
+        if self.http_client.token_provider is not None:
+            return headers
+
+        if self.authenticator is not None and self.authenticator.access_token:
+            headers.setdefault(
+                "Authorization", f"Bearer {self.authenticator.access_token}"
+            )
+
+        return headers
+
+    async def request(self, method, path, **kwargs):
+        """
+        Sends a request without blocking the event loop and returns the response.
+        """
+
+        kwargs["headers"] = self._auth_headers(kwargs.get("headers"))
+        # The executor threads don't inherit contextvars (e.g. the TokenPool user)
+        call = functools.partial(
+            contextvars.copy_context().run,
+            self.http_client.request,
+            method,
+            path,
+            **kwargs,
+        )
+
+        async with self._get_semaphore():
+            return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+
+    async def _get_json(self, path, error, **kwargs):
+        """
+        Sends a GET request and returns the decoded body, raising an exception if it failed.
+        """
+
+        response = await self.request("GET", path, **kwargs)
+
+        if response.status_code != 200:
+            print(response.json())
+            raise Exception(error)
+
+        return response.json()
+
+    async def search(self, item_type, item_name, limit=1, offset=0):
+        """
+        Searches for an item and returns the raw search response.
+        """
+
+        return await self._get_json(
+            "/search",
+            "Failed to search",
+            params={
+                "q": item_name,
+                "type": item_type,
+                "limit": limit,
+                "offset": offset,
+            },
+        )
+
+    async def search_uri(self, item_type, item_name):
+        """
+        Searches for an item and returns the URI of the first result, or None if there is none.
+        """
+
+        search_response = await self.search(item_type, item_name)
+        items = search_response[f"{item_type}s"]["items"]
+
+        return items[0]["uri"] if items else None
+
+    async def get_me(self):
+        return await self._get_json("/me", "Failed to get user")
+
+    async def get_playback(self):
+        """
+        Returns the current playback state, or None if nothing is playing.
+        """
+
+        response = await self.request("GET", "/me/player")
+
+        if response.status_code == 204:
+            return None
+
+        return response.json()
+
+    async def get_queue(self):
+        return await self._get_json("/me/player/queue", "Failed to get queue")
+
+    async def get_playlists(self, limit=50, offset=0):
+        return await self._get_json(
+            "/me/playlists",
+            "Failed to get playlists",
+            params={
+                "limit": limit,
+                "offset": offset,
+            },
+        )
+
+    async def play(self, uris=None, context_uri=None, position=None):
+        """
+        Starts playing a list of track URIs or a context (album, artist, playlist).
+        """
+
+        body = {}
+
+        if uris is not None:
+            body["uris"] = uris
+            body["position_ms"] = 0
+
+        if context_uri is not None:
+            body["context_uri"] = context_uri
+
+        if position is not None:
+            body["offset"] = {"position": position}
+            body["position_ms"] = 0
+
+        return await self.request("PUT", "/me/player/play", json=body)
+
+    async def add_to_queue(self, uri):
+        return await self.request("POST", "/me/player/queue", params={"uri": uri})
+
+    async def like(self, track_ids):
+        return await self.request("PUT", "/me/tracks", json={"ids": list(track_ids)})
+
+    async def follow(self, artist_ids):
+        return await self.request(
+            "PUT",
+            "/me/following",
+            params={
+                "type": "artist",
+                "ids": ",".join(artist_ids),
+            },
+        )
+
+    async def set_volume(self, volume_percent):
+        return await self.request(
+            "PUT",
+            "/me/player/volume",
+            params={"volume_percent": clamp_volume(volume_percent)},
+        )
+
+    async def _send_chunks(self, method, path, ids, make_kwargs):
+        """
+        Sends the IDs in chunks of at most MAX_IDS_PER_REQUEST concurrently and reports the result of each chunk.
+        """
+
+        ids = [to_id(value) for value in ids]
+
+        async def send(chunk):
+            try:
+                response = await self.request(method, path, **make_kwargs(chunk))
+
+            except Exception as e:
+                return {"ids": chunk, "status": None, "ok": False, "error": str(e)}
+
+            return {
+                "ids": chunk,
+                "status": response.status_code,
+                "ok": 200 <= response.status_code < 300,
+            }
+
+        return await asyncio.gather(
+            *(send(chunk) for chunk in chunked(ids, MAX_IDS_PER_REQUEST))
+        )
+
+    async def save_tracks(self, track_ids):
+        """
+        Likes any number of tracks (IDs, URIs or URLs), 50 per request.
+        """
+
+        return await self._send_chunks(
+            "PUT", "/me/tracks", track_ids, lambda chunk: {"json": {"ids": chunk}}
+        )
+
+    async def remove_saved_tracks(self, track_ids):
+        """
+        Removes any number of tracks from the user's liked songs, 50 per request.
+        """
+
+        return await self._send_chunks(
+            "DELETE", "/me/tracks", track_ids, lambda chunk: {"json": {"ids": chunk}}
+        )
+
+    async def follow_artists(self, artist_ids):
+        """
+        Follows any number of artists (IDs, URIs or URLs), 50 per request.
+        """
+
+        return await self._send_chunks(
+            "PUT",
+            "/me/following",
+            artist_ids,
+            lambda chunk: {"params": {"type": "artist", "ids": ",".join(chunk)}},
+        )
+
+    async def search_many(self, item_type, item_names):
+        """
+        Searches for several items at once and returns their URIs in the same order (None for no result).
+        """
+
+        return await asyncio.gather(
+            *(self.search_uri(item_type, item_name) for item_name in item_names)
+        )
+
+    async def get_playback_and_queue(self):
+        """
+        Reads the playback state and the queue concurrently.
+        """
+
+        return await asyncio.gather(self.get_playback(), self.get_queue())
+
+
+class SyncSpotifyClient:
+    """
+    Class to use an AsyncSpotifyClient from blocking code, such as the menu.
+
+    It runs one event loop on a background thread and blocks until each call finishes.
+    """
+
+    def __init__(self, async_client):
+        self.async_client = async_client
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name="spotify-loop", daemon=True
+        )
+        self.thread.start()
+
+    def run(self, coroutine):
+        """
+        Runs a coroutine on the background loop and returns its result.
+        """
+
+        # Scheduled from a copy of the caller's context, so the task sees its contextvars
+        return (
+            contextvars.copy_context()
+            .run(asyncio.run_coroutine_threadsafe, coroutine, self.loop)
+            .result()
+        )
+
+    def __getattr__(self, name):
+        attribute = getattr(self.async_client, name)
+
+        if not asyncio.iscoroutinefunction(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        def wrapper(*args, **kwargs):
+            return self.run(attribute(*args, **kwargs))
+
+        return wrapper
+
+    def close(self):
+        """
+        Stops the background loop.
+        """
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
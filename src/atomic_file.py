@@ -0,0 +1,27 @@
+import json
+import os
+import tempfile
+
+
+def write_json(path, data, prefix=".tmp-", **dump_options):
+    """
+    Writes data as JSON to a file, replacing the old one atomically.
+
+    The data goes to a temporary file in the same directory, which is flushed to disk before it replaces the old file, so a crash at any point leaves either the old contents or the new ones, never a mix or an empty file.
+    """
+
+    descriptor, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)), prefix=prefix, suffix=".tmp"
+    )
+
+    try:
+        with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+            json.dump(data, file, **dump_options)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temp_path, path)
+
+    except BaseException:
+        os.unlink(temp_path)
+        raise
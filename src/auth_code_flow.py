@@ -1,11 +1,36 @@
-import requests
 import webbrowser
-import threading
 import base64
+import hashlib
+import secrets
 import time
-import dotenv
-from callback_handler import CallbackHandler
-from http.server import HTTPServer
+from urllib.parse import urlencode
+from callback_handler import CallbackServer
+from http_client import HttpClient
+from token_store import MemoryTokenStore
+
+# Spotify Accounts endpoint used to trade codes and refresh tokens
+TOKEN_URL = "https://accounts.spotify.com/api/token"
+
+# Lifetime of an access token when the token endpoint does not send expires_in
+DEFAULT_EXPIRES_IN = 3600
+
+# Spotify Accounts page where the user grants access
+AUTHORIZE_URL = "https://accounts.spotify.com/authorize"
+
+SCOPES = [
+    "user-read-private",
+    "user-read-email",
+    "user-read-playback-state",
+    "user-read-currently-playing",
+    "user-modify-playback-state",
+    "user-library-modify",
+    "user-library-read",
+    "playlist-read-private",
+    "user-follow-modify",
+]
+
+# Seconds to wait for the user to complete the authorization in the browser
+AUTHORIZATION_TIMEOUT = 300
 
 
 class AuthCodeFlow:
@@ -23,6 +48,10 @@ class AuthCodeFlow:
         access_token=None,
         refresh_token=None,
         last_refresh=None,
+        http_client=None,
+        token_store=None,
+        expires_in=None,
+        token_url=TOKEN_URL,
     ):
         self.client_id = client_id
         self.client_secret = client_secret
@@ -30,9 +59,19 @@ class AuthCodeFlow:
         self.access_token = access_token
         self.refresh_token_var = refresh_token
         self.last_refresh = last_refresh
+        self.expires_in = expires_in or DEFAULT_EXPIRES_IN
+        self.token_url = token_url
+
+        # Shares the pooled connections with the rest of the app when a client is given
+        self.http_client = http_client or HttpClient()
+
+        # Where the tokens are saved after each exchange or refresh
+        self.token_store = token_store or MemoryTokenStore()
 
         self.authorization_code = None
-        self.access_token_event = threading.Event()
+
+        # PKCE secret of the last completed authorization, sent with its code
+        self.code_verifier = None
 
     def authenticate(self, re_auth=False):
         """
@@ -41,7 +80,7 @@ class AuthCodeFlow:
 
         print("Autenticando...")
 
-        if self.access_token != "None" and not re_auth:
+        if self.access_token not in (None, "None") and not re_auth:
             print("Token de acceso ya existe")
             return self.access_token
 
@@ -50,56 +89,76 @@ class AuthCodeFlow:
 
         return self.access_token
 
-    def get_authorization_code(self):
+    def get_authorization_code(self, timeout=AUTHORIZATION_TIMEOUT):
         """
         Opens a web browser to get the authorization code.
         """
 
-        server_thread = threading.Thread(target=self.run_server)
-        server_thread.start()
+        auth_url, pending = self.start_authorization()
 
-        scopes = [
-            "user-read-private",
-            "user-read-email",
-            "user-read-playback-state",
-            "user-read-currently-playing",
-            "user-modify-playback-state",
-            "user-library-modify",
-            "user-library-read",
-            "playlist-read-private",
-            "user-follow-modify",
-        ]
+        webbrowser.open(auth_url)
 
-        auth_url = f"https://accounts.spotify.com/authorize?response_type=code&client_id={self.client_id}&redirect_uri={self.redirect_uri}&scope={' '.join(scope for scope in scopes)}&state=123"
+        return self.finish_authorization(pending, timeout)
 
-        webbrowser.open(auth_url)
+    def start_authorization(self):
+        """
+        Registers a new authorization with the shared callback server and returns the URL the user must open, and the request to wait on.
 
-        self.access_token_event.wait()
+        Every call uses a random state, so many flows (one per account) can be in progress at the same time.
+        """
 
-        server_thread.join()
-        print("\n\n¡Servidor detenido!\n\n")
+        state = secrets.token_urlsafe(16)
+        code_verifier = secrets.token_urlsafe(64)
+        code_challenge = (
+            base64.urlsafe_b64encode(hashlib.sha256(code_verifier.encode()).digest())
+            .decode()
+            .rstrip("=")
+        )
 
-        code = self.authorization_code
+        pending = CallbackServer.for_redirect_uri(self.redirect_uri).expect(
+            state, code_verifier
+        )
 
-        return code
+        auth_url = (
+            AUTHORIZE_URL
+            + "?"
+            + urlencode(
+                {
+                    "response_type": "code",
+                    "client_id": self.client_id,
+                    "redirect_uri": self.redirect_uri,
+                    "scope": " ".join(SCOPES),
+                    "state": state,
+                    "code_challenge_method": "S256",
+                    "code_challenge": code_challenge,
+                }
+            )
+        )
+
+        return auth_url, pending
 
-    def run_server(self):
+    def finish_authorization(self, pending, timeout=AUTHORIZATION_TIMEOUT):
         """
-        Runs a server to handle the callback from the Spotify API.
+        Waits for the callback of an authorization and returns its code.
         """
 
-        httpd = HTTPServer(("localhost", 8888), CallbackHandler)
-        httpd.authenticator = self
-        httpd.serve_forever()
-        httpd.server_close()
+        try:
+            self.authorization_code = pending.wait(timeout)
+            self.code_verifier = pending.code_verifier
+
+        finally:
+            # Forget the state if the callback never came
+            CallbackServer.for_redirect_uri(self.redirect_uri).pop(pending.state)
+
+        return self.authorization_code
 
     def get_access_token(self):
         """
         Trades the authorization code for an access token.
         """
 
-        response = requests.post(
-            "https://accounts.spotify.com/api/token",
+        response = self.http_client.post(
+            self.token_url,
             headers={
                 "Authorization": f"Basic {self.encode_base64(self.client_id + ':' + self.client_secret)}",
                 "Content-Type": "application/x-www-form-urlencoded",
@@ -108,24 +167,17 @@ class AuthCodeFlow:
                 "grant_type": "authorization_code",
                 "code": self.authorization_code,
                 "redirect_uri": self.redirect_uri,
+                "code_verifier": self.code_verifier,
             },
         )
 
         if response.status_code == 200:
             self.access_token = response.json().get("access_token")
             self.refresh_token_var = response.json().get("refresh_token")
+            self.expires_in = response.json().get("expires_in", DEFAULT_EXPIRES_IN)
             self.last_refresh = time.time()
 
-            # Updates the .env file with the new tokens
-            dotenv.set_key(
-                dotenv.find_dotenv(), "SPOTIFY_ACCESS_TOKEN", self.access_token
-            )
-            dotenv.set_key(
-                dotenv.find_dotenv(), "SPOTIFY_REFRESH_TOKEN", self.refresh_token_var
-            )
-            dotenv.set_key(
-                dotenv.find_dotenv(), "SPOTIFY_LAST_REFRESH", str(self.last_refresh)
-            )
+            self.save_tokens()
 
             return self.access_token
 
@@ -138,8 +190,8 @@ class AuthCodeFlow:
         Refreshes the access token using the refresh token.
         """
 
-        response = requests.post(
-            "https://accounts.spotify.com/api/token",
+        response = self.http_client.post(
+            self.token_url,
             headers={
                 "Authorization": f"Basic {self.encode_base64(self.client_id + ':' + self.client_secret)}",
                 "Content-Type": "application/x-www-form-urlencoded",
@@ -152,15 +204,14 @@ class AuthCodeFlow:
 
         if response.status_code == 200:
             self.access_token = response.json().get("access_token")
-            last_refresh = time.time()
+            self.expires_in = response.json().get("expires_in", DEFAULT_EXPIRES_IN)
+            self.last_refresh = time.time()
 
-            # Updates the .env file with the new access token
-            dotenv.set_key(
-                dotenv.find_dotenv(), "SPOTIFY_ACCESS_TOKEN", self.access_token
-            )
-            dotenv.set_key(
-                dotenv.find_dotenv(), "SPOTIFY_LAST_REFRESH", str(last_refresh)
-            )
+            # Spotify may rotate the refresh token too
+            if response.json().get("refresh_token"):
+                self.refresh_token_var = response.json().get("refresh_token")
+
+            self.save_tokens()
 
             return self.access_token
 
@@ -168,6 +219,30 @@ class AuthCodeFlow:
             print("Error al renovar el token de acceso")
             return None
 
+    def save_tokens(self):
+        """
+        Saves every token field to the token store in a single write.
+        """
+
+        self.token_store.save(
+            {
+                "access_token": self.access_token,
+                "refresh_token": self.refresh_token_var,
+                "last_refresh": self.last_refresh,
+                "expires_in": self.expires_in,
+            }
+        )
+
+    def expires_at(self):
+        """
+        Returns the time at which the current access token expires, or 0 if it was never refreshed.
+        """
+
+        if self.last_refresh in (None, "None", ""):
+            return 0
+
+        return float(self.last_refresh) + self.expires_in
+
     def encode_base64(self, string):
         """
         Encodes a string in base64.
@@ -0,0 +1,152 @@
+import contextvars
+import threading
+from concurrent.futures import Future
+from async_client import to_id
+from http_client import current_user
+from models import Album, Artist, Track
+
+# Endpoint, response key, model and most IDs per request of each item type
+BATCH_ENDPOINTS = {
+    "track": ("/tracks", "tracks", Track, 50),
+    "artist": ("/artists", "artists", Artist, 50),
+    "album": ("/albums", "albums", Album, 20),
+}
+
+
+class _Batch:
+    """
+    IDs requested within one window, with the future each caller waits on.
+    """
+
+    __slots__ = ("context", "futures")
+
+    def __init__(self, context):
+        # Context of the first caller, so the batch is sent with its user's token
+        self.context = context
+        self.futures = {}
+
+
+class BatchLoader:
+    """
+    Class to merge single-item lookups into the API's multi-ID endpoints (/tracks?ids=, /artists?ids=, /albums?ids=).
+
+    A lookup joins the batch of its item type that is open, or opens one that is sent `window` seconds later, or as soon as it reaches the endpoint's maximum of IDs. Repeated IDs in a batch share one future, and every caller gets the parsed model (or None for an unknown ID). Batches are kept apart per pool user (see token_pool), so they never mix tokens.
+    """
+
+    def __init__(self, http_client, window=0.005, params=None):
+        self.http_client = http_client
+        self.window = window
+
+        # Extra query parameters for every request, e.g. market
+        self.params = params or {}
+
+        self.lock = threading.Lock()
+        self.batches = {}
+
+        self.loads = 0
+        self.deduplicated = 0
+        self.requests = 0
+
+    def load(self, item_type, item_id):
+        """
+        Returns a future with the item of the given type and ID (or URI or URL).
+        """
+
+        item_id = to_id(item_id)
+        max_ids = BATCH_ENDPOINTS[item_type][3]
+        key = (item_type, current_user.get())
+
+        with self.lock:
+            self.loads += 1
+            batch = self.batches.get(key)
+
+            if batch is None:
+                batch = self.batches[key] = _Batch(contextvars.copy_context())
+
+                timer = threading.Timer(self.window, self._flush, args=(key, batch))
+                timer.daemon = True
+                timer.start()
+
+            future = batch.futures.get(item_id)
+
+            if future is None:
+                future = batch.futures[item_id] = Future()
+
+            else:
+                self.deduplicated += 1
+
+            # A full batch is sent right away by the caller that filled it
+            full = len(batch.futures) >= max_ids
+
+            if full:
+                del self.batches[key]
+
+        if full:
+            self._send(item_type, batch)
+
+        return future
+
+    def get(self, item_type, item_id, timeout=None):
+        """
+        Returns the item of the given type and ID, or None if it doesn't exist.
+        """
+
+        return self.load(item_type, item_id).result(timeout)
+
+    def get_many(self, item_type, item_ids, timeout=None):
+        """
+        Returns the items of the given IDs, in the same order. All of them are requested before waiting, so they share batches.
+        """
+
+        futures = [self.load(item_type, item_id) for item_id in item_ids]
+
+        return [future.result(timeout) for future in futures]
+
+    def _flush(self, key, batch):
+        with self.lock:
+            # Already sent because it got full
+            if self.batches.get(key) is not batch:
+                return
+
+            del self.batches[key]
+
+        self._send(key[0], batch)
+
+    def _send(self, item_type, batch):
+        path, response_key, model, _ = BATCH_ENDPOINTS[item_type]
+        ids = list(batch.futures)
+
+        with self.lock:
+            self.requests += 1
+
+        try:
+            response = batch.context.run(
+                self.http_client.get,
+                path,
+                params={**self.params, "ids": ",".join(ids)},
+            )
+
+            if response.status_code != 200:
+                print(response.json())
+                raise Exception(f"Failed to get {response_key}")
+
+            items = response.json()[response_key]
+
+        except Exception as e:
+            for future in batch.futures.values():
+                future.set_exception(e)
+
+            return
+
+        for position, item_id in enumerate(ids):
+            item = items[position] if position < len(items) else None
+            batch.futures[item_id].set_result(model.from_json(item) if item else None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "loads": self.loads,
+                "deduplicated": self.deduplicated,
+                "requests": self.requests,
+                "open_batches": len(self.batches),
+            }
@@ -0,0 +1,484 @@
+import argparse
+import json
+import os
+import gc
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from async_client import AsyncSpotifyClient, SyncSpotifyClient
+from auth_code_flow import AuthCodeFlow
+from http_client import HttpClient, loads
+from instrumentation import Instrumentation
+from mock_server import MockSpotifyServer, make_playlist, make_track
+from models import PLAYLIST_TRACKS_FIELDS, Playlist, Queue, Track
+from pager import iter_pages
+from request_scheduler import RequestScheduler
+from token_manager import TokenManager
+
+# Limits high enough that the scheduler never paces the benchmark (unless --paced)
+UNPACED_LIMITS = {
+    name: (100000, 100000)
+    for name in ("auth", "search", "player", "library", "default")
+}
+
+# Modules that the app should only import on the first API call
+HEAVY_MODULES = ("requests", "urllib3", "asyncio", "sqlite3", "dotenv")
+
+# Run in a fresh interpreter: times the import and lists the heavy modules it pulled in
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "import_ms": elapsed * 1000,
+    "heavy_modules": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def percentile(sorted_values, p):
+    """
+    Return the p-th percentile (nearest rank) of an already sorted list.
+    """
+
+    if not sorted_values:
+        return 0
+
+    rank = max(int(round(p / 100 * len(sorted_values))) - 1, 0)
+
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def run_operation(name, operation, iterations, concurrency):
+    """
+    Call operation(i) `iterations` times from `concurrency` threads and return its latency percentiles and throughput.
+    """
+
+    latencies = []
+    errors = 0
+
+    def call(i):
+        start = time.perf_counter()
+
+        try:
+            operation(i)
+            failed = False
+
+        except Exception:
+            failed = True
+
+        return time.perf_counter() - start, failed
+
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for latency, failed in executor.map(call, range(iterations)):
+            latencies.append(latency)
+            errors += failed
+
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    return {
+        "operation": name,
+        "iterations": iterations,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "throughput_rps": round(iterations / elapsed, 1),
+    }
+
+
+def build_operations(server, paced=False):
+    """
+    Build the same clients the app uses, pointed at the mock server, and return one callable per app.py operation.
+    """
+
+    scheduler = RequestScheduler() if paced else RequestScheduler(UNPACED_LIMITS)
+    http_client = HttpClient(
+        server.url, scheduler=scheduler, instrumentation=Instrumentation()
+    )
+
+    authenticator = AuthCodeFlow(
+        "mock-client",
+        "mock-secret",
+        "http://localhost:8888/callback",
+        "mock-access",
+        "mock-refresh",
+        time.time(),
+        http_client=http_client,
+        token_url=server.token_url,
+    )
+    http_client.token_provider = TokenManager(authenticator)
+
+    spotify = SyncSpotifyClient(AsyncSpotifyClient(http_client, authenticator))
+
+    operations = {
+        "search": lambda i: spotify.search("track", f"song {i % 100}"),
+        "play": lambda i: spotify.play(uris=["spotify:track:track1"]),
+        "queue": lambda i: spotify.add_to_queue("spotify:track:track1"),
+        "like": lambda i: spotify.save_tracks(["track1"]),
+        "follow": lambda i: spotify.follow_artists(["artist1"]),
+        "playback": lambda i: spotify.get_playback(),
+        "queue_read": lambda i: spotify.get_queue(),
+        "volume": lambda i: spotify.set_volume(50),
+        "playlists": lambda i: list(iter_pages(http_client, "/me/playlists")),
+        "token_refresh": lambda i: authenticator.refresh_token(),
+    }
+
+    return operations, http_client, scheduler
+
+
+def measure_startup(module="app", runs=10):
+    """
+    Import `module` in `runs` fresh interpreters and return the import time percentiles and the heavy modules it loaded.
+
+    The imports run without tokens or a reachable API, so any network or auth work at import time shows up as an error or a timeout.
+    """
+
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if not key.startswith("SPOTIFY_")
+    }
+    env["BASE_URL"] = "http://127.0.0.1:9"
+
+    script = STARTUP_SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+    times = []
+    heavy_modules = set()
+
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=env,
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+            timeout=30,
+            check=True,
+        )
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+
+        times.append(result["import_ms"])
+        heavy_modules.update(result["heavy_modules"])
+
+    times.sort()
+
+    return {
+        "module": module,
+        "runs": runs,
+        "p50_ms": round(percentile(times, 50), 2),
+        "max_ms": round(times[-1], 2),
+        "heavy_modules": sorted(heavy_modules),
+    }
+
+
+def measure_parsing(name, payload, parse, repeat=5):
+    """
+    Decode a JSON payload and parse it with `parse`, returning the time it takes and the memory still held by its result once the raw payload is gone.
+    """
+
+    times = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(json.loads(payload))
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+
+    result = parse(json.loads(payload))
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+
+    tracemalloc.stop()
+    del result
+
+    times.sort()
+
+    return {
+        "operation": name,
+        "payload_kb": round(len(payload) / 1024, 1),
+        "parse_ms": round(percentile(times, 50) * 1000, 2),
+        "retained_kb": round(retained / 1024, 1),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def compare_models(items=1000, repeat=5):
+    """
+    Compare keeping raw dicts against parsing into the __slots__ models, for a large queue, playlist tracks page and playlist listing.
+    """
+
+    queue = json.dumps(
+        {
+            "currently_playing": make_track(0),
+            "queue": [make_track(i) for i in range(items)],
+        }
+    )
+    playlist_tracks = json.dumps(
+        {"items": [{"track": make_track(i)} for i in range(items)]}
+    )
+    playlists = json.dumps({"items": [make_playlist(i) for i in range(items)]})
+
+    cases = [
+        ("queue", queue, lambda data: data["queue"], Queue.from_json),
+        (
+            "playlist_tracks",
+            playlist_tracks,
+            lambda data: [item["track"] for item in data["items"]],
+            lambda data: [Track.from_json(item["track"]) for item in data["items"]],
+        ),
+        (
+            "playlists",
+            playlists,
+            lambda data: data["items"],
+            lambda data: [Playlist.from_json(item) for item in data["items"]],
+        ),
+    ]
+    results = []
+
+    for name, payload, as_dicts, as_models in cases:
+        results.append(measure_parsing(f"{name} (dict)", payload, as_dicts, repeat))
+        results.append(measure_parsing(f"{name} (models)", payload, as_models, repeat))
+
+    return results
+
+
+def compare_transfers(tracks=1000, runs=5, latency=0.005):
+    """
+    Compare the bytes and time of reading a large playlist with and without the `fields` projection and compression, and the time of decoding one page with requests and with the lean decoder.
+    """
+
+    server = MockSpotifyServer(latency=latency, playlist_tracks_total=tracks).start()
+    path = "/playlists/playlist0/tracks"
+    results = []
+
+    for projection in (None, PLAYLIST_TRACKS_FIELDS):
+        # None keeps the Accept-Encoding requests sends by default (gzip, deflate, ...)
+        for encoding in ("identity", None):
+            headers = {"Authorization": "Bearer mock-access"}
+
+            if encoding:
+                headers["Accept-Encoding"] = encoding
+
+            http_client = HttpClient(
+                server.url,
+                headers=headers,
+                scheduler=RequestScheduler(UNPACED_LIMITS),
+            )
+            encoding = http_client.session.headers["Accept-Encoding"]
+            params = {"fields": projection} if projection else None
+            bytes_before = server.bytes_sent
+            times = []
+
+            for _ in range(runs):
+                start = time.perf_counter()
+                items = list(iter_pages(http_client, path, params=params, limit=100))
+                times.append(time.perf_counter() - start)
+
+            http_client.close()
+            times.sort()
+
+            results.append(
+                {
+                    "operation": f"{'fields' if projection else 'full'}, {encoding}",
+                    "items": len(items),
+                    "kb_per_run": round(
+                        (server.bytes_sent - bytes_before) / runs / 1024, 1
+                    ),
+                    "p50_ms": round(percentile(times, 50) * 1000, 2),
+                }
+            )
+
+    # Decoding alone, on one full page
+    page = HttpClient(
+        server.url,
+        headers={"Authorization": "Bearer mock-access"},
+        scheduler=RequestScheduler(UNPACED_LIMITS),
+    ).get(path, params={"limit": 100})
+    server.stop()
+
+    decoders = [
+        ("decode, requests", lambda: type(page).json(page)),
+        ("decode, lean", lambda: loads(page.content)),
+    ]
+
+    for name, decode in decoders:
+        times = []
+
+        for _ in range(runs * 4):
+            start = time.perf_counter()
+            decode()
+            times.append(time.perf_counter() - start)
+
+        times.sort()
+
+        results.append(
+            {
+                "operation": name,
+                "items": 100,
+                "kb_per_run": round(len(page.content) / 1024, 1),
+                "p50_ms": round(percentile(times, 50) * 1000, 2),
+            }
+        )
+
+    return results
+
+
+def print_table(results):
+    columns = list(results[0])
+    widths = {
+        column: max(14, *(len(str(result[column])) for result in results))
+        for column in columns
+    }
+
+    print("  ".join(f"{column:>{widths[column]}}" for column in columns))
+
+    for result in results:
+        print(
+            "  ".join(f"{str(result[column]):>{widths[column]}}" for column in columns)
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the app's API operations against the local mock server"
+    )
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--jitter", type=float, default=0.002)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--paced", action="store_true", help="use the default rate limits"
+    )
+    parser.add_argument("--operations", nargs="*", help="only run these operations")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument(
+        "--startup",
+        action="store_true",
+        help="only measure the cold import time of app.py and cli.py",
+    )
+    parser.add_argument("--startup-runs", type=int, default=10)
+    parser.add_argument(
+        "--models",
+        action="store_true",
+        help="only compare the memory and time of dict and model parsing",
+    )
+    parser.add_argument("--model-items", type=int, default=1000)
+    parser.add_argument(
+        "--transfers",
+        action="store_true",
+        help="only compare the bytes and time of playlist reads with fields and compression",
+    )
+    parser.add_argument("--transfer-tracks", type=int, default=1000)
+    parser.add_argument(
+        "--startup-budget-ms",
+        type=float,
+        default=100,
+        help="fail if the median import time is above this",
+    )
+    args = parser.parse_args()
+
+    if args.startup:
+        return check_startup(args)
+
+    if args.models or args.transfers:
+        if args.models:
+            results = compare_models(args.model_items)
+
+        else:
+            results = compare_transfers(args.transfer_tracks, latency=args.latency)
+
+        if args.json:
+            print(json.dumps({"results": results}, indent=2))
+
+        else:
+            print_table(results)
+
+        return 0
+
+    server = MockSpotifyServer(
+        latency=args.latency,
+        jitter=args.jitter,
+        throttle_rate=args.throttle_rate,
+        retry_after=0,
+        seed=1,
+    ).start()
+
+    operations, http_client, scheduler = build_operations(server, args.paced)
+    results = []
+
+    for name, operation in operations.items():
+        if args.operations and name not in args.operations:
+            continue
+
+        results.append(
+            run_operation(name, operation, args.iterations, args.concurrency)
+        )
+
+    server.stop()
+
+    if args.json:
+        print(
+            json.dumps(
+                {
+                    "results": results,
+                    "connections": http_client.stats(),
+                    "scheduler": scheduler.stats(),
+                    "endpoints": http_client.instrumentation.to_dict(),
+                },
+                indent=2,
+            )
+        )
+
+    else:
+        print_table(results)
+        print(f"\nConexiones: {http_client.stats()}")
+
+
+def check_startup(args):
+    """
+    Measure the startup of the app's entry points and fail if one is over budget or imports the API clients.
+    """
+
+    results = [measure_startup(module, args.startup_runs) for module in ("app", "cli")]
+    over_budget = [
+        result
+        for result in results
+        if result["p50_ms"] > args.startup_budget_ms or result["heavy_modules"]
+    ]
+
+    if args.json:
+        print(
+            json.dumps(
+                {"results": results, "budget_ms": args.startup_budget_ms}, indent=2
+            )
+        )
+
+    else:
+        for result in results:
+            print(
+                f"import {result['module']}: p50 {result['p50_ms']} ms, "
+                f"max {result['max_ms']} ms, "
+                f"módulos pesados {result['heavy_modules'] or 'ninguno'}"
+            )
+
+        print(
+            f"\nPresupuesto: {args.startup_budget_ms} ms -> "
+            f"{'EXCEDIDO' if over_budget else 'OK'}"
+        )
+
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
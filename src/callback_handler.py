@@ -1,31 +1,145 @@
 import threading
-from http.server import BaseHTTPRequestHandler
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Long-lived callback servers, one per (host, port), shared by every flow
+_servers = {}
+_servers_lock = threading.Lock()
 
 
 class CallbackHandler(BaseHTTPRequestHandler):
     """
     Class to handle the callback from the Spotify API.
 
-    It is used to get the authorization code.
+    It hands the authorization code (or the error) to the flow that is waiting for the state sent back with it.
     """
 
     def do_GET(self):
-        if self.path.startswith("/callback"):
-            try:
-                code = self.path.split("=")[1].replace("&state", "")
-                print(f"\nAUTHORIZATION CODE: {code}")
+        url = urlparse(self.path)
+
+        if url.path != self.server.callback.path:
+            self.respond(404, b"Not found.")
+            return
+
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        pending = self.server.callback.pop(query.get("state"))
+
+        if pending is None:
+            self.respond(400, b"Unknown or expired authorization request.")
+            return
+
+        if "code" in query:
+            pending.complete(code=query["code"])
+            self.respond(200, b"Authorization complete. You can close this window now.")
+
+        else:
+            pending.complete(error=query.get("error", "missing_code"))
+            self.respond(400, b"Authorization failed. You can close this window now.")
+
+    def respond(self, status, message):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(message)))
+        self.end_headers()
+        self.wfile.write(message)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PendingAuthorization:
+    """
+    Class to wait for the callback of one authorization request.
+    """
+
+    def __init__(self, state, code_verifier=None):
+        self.state = state
+
+        # PKCE secret of this request, sent again with the code
+        self.code_verifier = code_verifier
+        self.code = None
+        self.error = None
+        self.done = threading.Event()
+
+    def complete(self, code=None, error=None):
+        self.code = code
+        self.error = error
+        self.done.set()
+
+    def wait(self, timeout=None):
+        """
+        Waits for the callback and returns the authorization code. Raises if it times out or the user denied access.
+        """
+
+        if not self.done.wait(timeout):
+            raise Exception("Authorization timed out")
+
+        if self.error is not None:
+            raise Exception(f"Authorization failed: {self.error}")
+
+        return self.code
+
+
+class CallbackServer:
+    """
+    Class to run a threaded server that receives the authorization callbacks of many flows at once.
+
+    Each flow registers the random state it sent to Spotify, and the callback carrying that state is delivered to it. The server keeps running between authorizations.
+    """
+
+    def __init__(self, host="localhost", port=8888, path="/callback"):
+        self.path = path
+        self.pending = {}
+        self.lock = threading.Lock()
+
+        self.httpd = ThreadingHTTPServer((host, port), CallbackHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.callback = self
+        self.thread = None
+
+    @classmethod
+    def for_redirect_uri(cls, redirect_uri):
+        """
+        Returns the running server for a redirect URI, starting it on the first call.
+        """
+
+        url = urlparse(redirect_uri)
+        key = (url.hostname or "localhost", url.port or 80)
+
+        with _servers_lock:
+            server = _servers.get(key)
+
+            if server is None:
+                server = _servers[key] = cls(*key, url.path or "/").start()
+
+            return server
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def expect(self, state, code_verifier=None):
+        """
+        Registers an authorization request and returns the PendingAuthorization to wait on.
+        """
 
-                self.server.authenticator.authorization_code = code
+        pending = PendingAuthorization(state, code_verifier)
 
-                self.send_response(200)
-                self.end_headers()
-                self.wfile.write(
-                    b"Authorization complete. You can close this window now."
-                )
+        with self.lock:
+            self.pending[state] = pending
 
-                self.server.authenticator.access_token_event.set()
+        return pending
 
-            except Exception as e:
-                print(f"Error: {e}")
+    def pop(self, state):
+        """
+        Removes and returns the request waiting for a state, or None if there is none.
+        """
 
-            threading.Thread(target=self.server.shutdown).start()
+        with self.lock:
+            return self.pending.pop(state, None)
@@ -0,0 +1,378 @@
+import argparse
+import contextlib
+import json
+import shlex
+import sys
+import time
+import app
+
+USAGE_EXAMPLES = """
+examples:
+  python cli.py search track "bohemian rhapsody"
+  python cli.py play album "abbey road"
+  python cli.py play playlist --own "Favoritas"
+  python cli.py play likes
+  python cli.py queue "song one" "song two"
+  python cli.py queue -f list.txt
+  python cli.py volume 40
+  python cli.py sync         (then searches in your library work offline)
+  python cli.py export likes -o likes.csv
+  python cli.py sync-playlists --mirror "Favoritas" "Copia de Favoritas"
+  python cli.py -            (one command per line from stdin)
+"""
+
+
+class CommandError(Exception):
+    """
+    Raised when a command can't be parsed or run.
+    """
+
+
+class CommandHelp(Exception):
+    """
+    Raised when a command asks for its help (-h), carrying the help text.
+    """
+
+
+class CommandParser(argparse.ArgumentParser):
+    """
+    ArgumentParser that raises instead of exiting, so one bad line doesn't end a batch.
+    """
+
+    def error(self, message):
+        raise CommandError(message)
+
+    def print_help(self, file=None):
+        # The help becomes the command's result instead of text on stdout
+        raise CommandHelp(self.format_help())
+
+    def exit(self, status=0, message=None):
+        raise CommandError((message or "").strip() or f"{self.prog} exited")
+
+
+def build_parser():
+    parser = CommandParser(
+        prog="cli.py",
+        description="Run the app's actions without prompts. Each command prints one JSON line.",
+        epilog=USAGE_EXAMPLES,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    commands = parser.add_subparsers(dest="command", parser_class=CommandParser)
+
+    search = commands.add_parser("search", help="search for an item")
+    search.add_argument("type", choices=["track", "album", "artist", "playlist"])
+    search.add_argument("name", nargs="+")
+    search.add_argument(
+        "--candidates",
+        type=int,
+        metavar="N",
+        help="return the N best ranked candidates instead of the top match",
+    )
+
+    play = commands.add_parser(
+        "play", help="play a track, album, artist, playlist or your likes"
+    )
+    play.add_argument("type", choices=["track", "album", "artist", "playlist", "likes"])
+    play.add_argument("name", nargs="*")
+    play.add_argument(
+        "--own", action="store_true", help="pick the playlist from your own playlists"
+    )
+
+    queue = commands.add_parser("queue", help="add songs to the queue, in order")
+    queue.add_argument("names", nargs="*")
+    queue.add_argument("-f", "--file", help="file with one song name per line")
+
+    like = commands.add_parser(
+        "like", help="like the current song, or the given IDs/URIs"
+    )
+    like.add_argument("ids", nargs="*")
+
+    unlike = commands.add_parser(
+        "unlike", help="remove the given IDs/URIs from your likes"
+    )
+    unlike.add_argument("ids", nargs="+")
+
+    follow = commands.add_parser(
+        "follow", help="follow the current artist, or the given IDs/URIs"
+    )
+    follow.add_argument("ids", nargs="*")
+
+    volume = commands.add_parser("volume", help="set the volume (0-100)")
+    volume.add_argument("level", type=int)
+
+    commands.add_parser("current", help="show the current song")
+    commands.add_parser("show-queue", help="show the current queue")
+    commands.add_parser("playlists", help="list your playlists")
+
+    lookup = commands.add_parser(
+        "lookup", help="show tracks, albums or artists by ID, fetched in batches"
+    )
+    lookup.add_argument("type", choices=["track", "album", "artist"])
+    lookup.add_argument("ids", nargs="+", help="IDs, URIs or URLs")
+    commands.add_parser("metrics", help="show the request and scheduler metrics")
+    commands.add_parser(
+        "sync", help="download your library into the local index for offline search"
+    )
+
+    sync_playlists = commands.add_parser(
+        "sync-playlists",
+        help="fetch the playlists that changed since the last sync and update mirrors",
+    )
+    sync_playlists.add_argument(
+        "--mirror",
+        nargs=2,
+        metavar=("SOURCE", "TARGET"),
+        help="from now on, copy the set of tracks of SOURCE into TARGET on every sync (order isn't copied)",
+    )
+
+    export = commands.add_parser(
+        "export", help="stream the tracks of a playlist or your likes to a file"
+    )
+    export.add_argument("source", help="playlist ID, URI or own name, or 'likes'")
+    export.add_argument("-o", "--output", required=True)
+    export.add_argument("--format", choices=["ndjson", "csv"])
+    export.add_argument(
+        "--restart", action="store_true", help="ignore the checkpoint of a previous run"
+    )
+
+    return parser
+
+
+def check_response(response):
+    """
+    Raise a CommandError if a player or library request failed.
+    """
+
+    if not 200 <= response.status_code < 300:
+        raise CommandError(f"Spotify answered {response.status_code}")
+
+    return response.status_code
+
+
+def run_play(args):
+    args.name = " ".join(args.name)
+
+    if args.type == "likes":
+        return {"status": check_response(app.play_liked_songs())}
+
+    if not args.name:
+        raise CommandError(f"play {args.type} needs a name")
+
+    if args.type == "playlist" and args.own:
+        playlists = app.get_own_playlists()
+        matches = [name for name in playlists if name.lower() == args.name.lower()]
+
+        if not matches:
+            raise CommandError(f"no own playlist named {args.name!r}")
+
+        item_info, item_uri = matches[0], playlists[matches[0]]
+
+    else:
+        item_info, item_uri = app.search_item(args.type, args.name)
+
+    if args.type == "track":
+        response = app.play_uris([item_uri])
+
+    else:
+        response = app.play_context(item_uri, from_start=args.type != "artist")
+
+    return {"item": item_info, "uri": item_uri, "status": check_response(response)}
+
+
+def run_queue(args):
+    names = list(args.names)
+
+    if args.file:
+        names += app.read_song_names(args.file)
+
+    if not names:
+        raise CommandError("queue needs song names or -f FILE")
+
+    return app.queue_songs(names)
+
+
+def run_like(args):
+    if args.ids:
+        return {"chunks": app.like_songs(args.ids)}
+
+    song_id, response = app.like_current_song()
+
+    return {"id": song_id, "status": check_response(response)}
+
+
+def run_follow(args):
+    if args.ids:
+        return {"chunks": app.follow_artists(args.ids)}
+
+    artist_id, response = app.follow_current_artist()
+
+    return {"id": artist_id, "status": check_response(response)}
+
+
+def run_search(args):
+    if args.candidates:
+        page = app.search_candidates(
+            args.type, " ".join(args.name), limit=args.candidates
+        )
+
+        return {
+            "candidates": [
+                {key: candidate[key] for key in ("info", "uri", "score")}
+                for candidate in page["candidates"]
+            ]
+        }
+
+    item_info, item_uri = app.search_item(args.type, " ".join(args.name))
+
+    return {"item": item_info, "uri": item_uri}
+
+
+def run_sync_playlists(args):
+    if args.mirror:
+        result = app.mirror_playlist(*args.mirror)
+
+    else:
+        result = app.sync_playlists()
+
+    return {
+        **result,
+        "changes": [
+            {
+                "id": change["id"],
+                "name": change["name"],
+                "added": len(change["added"]),
+                "removed": len(change["removed"]),
+            }
+            for change in result["changes"]
+        ],
+    }
+
+
+COMMANDS = {
+    "search": run_search,
+    "play": run_play,
+    "queue": run_queue,
+    "like": run_like,
+    "unlike": lambda args: {"chunks": app.unlike_songs(args.ids)},
+    "follow": run_follow,
+    "volume": lambda args: {"status": check_response(app.set_volume_level(args.level))},
+    "current": lambda args: app.current_song_info(),
+    "show-queue": lambda args: {"queue": app.current_queue()},
+    "playlists": lambda args: {"playlists": app.get_own_playlists()},
+    "lookup": lambda args: {"items": app.lookup_items(args.type, args.ids)},
+    "sync": lambda args: app.sync_library(),
+    "sync-playlists": run_sync_playlists,
+    "export": lambda args: app.export_tracks(
+        args.source,
+        args.output,
+        args.format or ("csv" if args.output.lower().endswith(".csv") else "ndjson"),
+        resume=not args.restart,
+    ),
+    "metrics": lambda args: {
+        "endpoints": app.instrumentation.to_dict() if app.instrumentation else [],
+        "connections": app.http_client.stats() if app.http_client else {},
+        "batches": app.batch_loader.stats() if app.batch_loader else {},
+        "scheduler": app.http_client.scheduler.stats() if app.http_client else {},
+    },
+}
+
+
+def run_command(parser, argv):
+    """
+    Run one command and return its machine-readable result.
+    """
+
+    start = time.perf_counter()
+    result = {"command": " ".join(argv)}
+
+    # stdout only carries the JSON lines; what the app prints on the way (error
+    # bodies, authorization prompts) goes to stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        execute(parser, argv, result)
+
+    result["elapsed_s"] = round(time.perf_counter() - start, 3)
+
+    return result
+
+
+def execute(parser, argv, result):
+    """
+    Parse and run one command, storing its result or error in `result`.
+    """
+
+    try:
+        args, extra = parser.parse_known_args(argv)
+
+        # argparse won't fill a positional list that comes after a flag
+        # ("play playlist --own Name"), so those words are added back here
+        if extra and isinstance(getattr(args, "name", None), list):
+            if any(word.startswith("-") for word in extra):
+                raise CommandError(f"unrecognized arguments: {' '.join(extra)}")
+
+            args.name += extra
+
+        elif extra:
+            raise CommandError(f"unrecognized arguments: {' '.join(extra)}")
+
+        if args.command is None:
+            raise CommandError("missing command")
+
+        result["result"] = COMMANDS[args.command](args)
+        result["ok"] = True
+
+    except CommandHelp as e:
+        result["ok"] = True
+        result["result"] = {"help": str(e)}
+
+    except Exception as e:
+        result["ok"] = False
+        result["error"] = str(e) or type(e).__name__
+
+
+def run_stream(parser, lines):
+    """
+    Run one command per line (blank lines and # comments are skipped), printing a JSON line for each.
+    """
+
+    all_ok = True
+
+    for line in lines:
+        line = line.strip()
+
+        if not line or line.startswith("#"):
+            continue
+
+        try:
+            argv = shlex.split(line)
+
+        except ValueError as e:
+            result = {"command": line, "ok": False, "error": str(e)}
+
+        else:
+            result = run_command(parser, argv)
+
+        print(json.dumps(result, ensure_ascii=False), flush=True)
+        all_ok = all_ok and result["ok"]
+
+    return all_ok
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+
+    if argv in ([], ["-h"], ["--help"]):
+        sys.stdout.write(parser.format_help())
+        return 0
+
+    if argv == ["-"]:
+        return 0 if run_stream(parser, sys.stdin) else 1
+
+    result = run_command(parser, argv)
+    print(json.dumps(result, ensure_ascii=False))
+
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import csv
+import json
+import os
+import queue
+import threading
+from atomic_file import write_json
+from models import Track
+from pager import iter_pages
+
+# Columns of the exported rows, in CSV order
+EXPORT_FIELDS = [
+    "position",
+    "added_at",
+    "id",
+    "uri",
+    "name",
+    "artists",
+    "album",
+    "duration_ms",
+    "popularity",
+]
+
+# Rows waiting for the writer; bounds memory when the disk is slower than the network
+QUEUE_SIZE = 1000
+
+# Marks the end of the rows for the writer thread
+_DONE = object()
+
+
+def track_row(position, item):
+    """
+    Build the export row of a playlist or saved track item ({"added_at", "track"}), or None for removed tracks.
+    """
+
+    if not item.get("track"):
+        return None
+
+    track = Track.from_json(item["track"])
+
+    return {
+        "position": position,
+        "added_at": item.get("added_at"),
+        "id": track.id,
+        "uri": track.uri,
+        "name": track.name,
+        "artists": track.artist_names(),
+        "album": track.album.name if track.album else None,
+        "duration_ms": track.duration_ms,
+        "popularity": track.popularity,
+    }
+
+
+class TrackExporter:
+    """
+    Class to stream the tracks of a paged endpoint (a playlist or the saved tracks) to an NDJSON or CSV file.
+
+    Pages are fetched ahead while a writer thread writes the rows, so memory stays bounded by a few pages no matter how many tracks there are. After every page the writer saves a checkpoint with the offset reached and the size of the file; an interrupted export resumes from there.
+    """
+
+    def __init__(
+        self,
+        http_client,
+        path,
+        output,
+        format="ndjson",
+        limit=100,
+        checkpoint_path=None,
+        params=None,
+    ):
+        if format not in ("ndjson", "csv"):
+            raise ValueError(f"Unknown export format: {format}")
+
+        self.http_client = http_client
+        self.path = path
+        self.output = output
+        self.format = format
+        self.limit = limit
+        self.checkpoint_path = checkpoint_path or f"{output}.checkpoint"
+
+        # Extra query parameters for every page, e.g. market
+        self.params = params or {}
+
+        self.rows = queue.Queue(maxsize=QUEUE_SIZE)
+        self.error = None
+        self.written = 0
+
+    def load_checkpoint(self):
+        """
+        Returns the saved checkpoint if it belongs to this export and its file still exists.
+        """
+
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as file:
+                checkpoint = json.load(file)
+
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if (
+            checkpoint.get("path") != self.path
+            or checkpoint.get("format") != self.format
+            or not os.path.exists(self.output)
+        ):
+            return None
+
+        return checkpoint
+
+    def save_checkpoint(self, offset, size):
+        write_json(
+            self.checkpoint_path,
+            {
+                "path": self.path,
+                "format": self.format,
+                "offset": offset,
+                "bytes": size,
+            },
+            prefix=".export-",
+        )
+
+    def _checkpoint(self, file, offset):
+        # The rows reach the disk before the checkpoint that counts them does
+        file.flush()
+        os.fsync(file.fileno())
+        self.save_checkpoint(offset, file.tell())
+
+    def run(self, resume=True):
+        """
+        Exports every track and returns how many rows were written and from which offset the export started.
+        """
+
+        checkpoint = self.load_checkpoint() if resume else None
+        start = checkpoint["offset"] if checkpoint else 0
+        self.written = 0
+
+        if checkpoint:
+            file = open(self.output, "r+", encoding="utf-8", newline="")
+
+            # Drop whatever was written after the last checkpoint
+            file.seek(checkpoint["bytes"])
+            file.truncate()
+
+        else:
+            file = open(self.output, "w", encoding="utf-8", newline="")
+
+        writer = threading.Thread(
+            target=self._write, args=(file, start), name="export-writer"
+        )
+        writer.start()
+
+        try:
+            items = iter_pages(
+                self.http_client,
+                self.path,
+                params={**self.params, "offset": start},
+                limit=self.limit,
+                error="Failed to get tracks",
+            )
+
+            for position, item in enumerate(items, start):
+                if self.error is not None:
+                    break
+
+                self.rows.put((position, item))
+
+        finally:
+            self.rows.put(_DONE)
+            writer.join()
+            file.close()
+
+        if self.error is not None:
+            raise self.error
+
+        os.unlink(self.checkpoint_path)
+
+        return {
+            "output": self.output,
+            "format": self.format,
+            "resumed_from": start,
+            "exported": self.written,
+        }
+
+    def _write(self, file, start):
+        """
+        Writer thread: writes the queued rows and saves a checkpoint at every page boundary.
+        """
+
+        offset = start
+        csv_writer = None
+
+        if self.format == "csv":
+            csv_writer = csv.DictWriter(file, fieldnames=EXPORT_FIELDS)
+
+            if start == 0:
+                csv_writer.writeheader()
+
+        try:
+            while True:
+                entry = self.rows.get()
+
+                if entry is _DONE:
+                    break
+
+                position, item = entry
+                row = track_row(position, item)
+
+                if row is not None:
+                    if csv_writer is not None:
+                        csv_writer.writerow(
+                            {**row, "artists": "; ".join(row["artists"])}
+                        )
+
+                    else:
+                        file.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+                    self.written += 1
+
+                offset = position + 1
+
+                if offset % self.limit == 0:
+                    self._checkpoint(file, offset)
+
+            self._checkpoint(file, offset)
+
+        except Exception as e:
+            self.error = e
+
+            # Keep draining so the producer never blocks on a full queue
+            while self.rows.get() is not _DONE:
+                pass
@@ -0,0 +1,298 @@
+import contextvars
+import threading
+from concurrent.futures import Future
+import requests
+from requests.adapters import HTTPAdapter
+from instrumentation import TimedHTTPAdapter, reset_phases
+from request_scheduler import default_scheduler
+
+try:
+    # Optional, faster decoder; the standard library one is used without it
+    from orjson import loads
+except ImportError:
+    from json import loads
+
+# User whose token is sent with the requests made in the current context (see token_pool)
+current_user = contextvars.ContextVar("spotify_user", default=None)
+
+
+def _lean_json(response):
+    """
+    Makes response.json() decode the body bytes directly (with orjson when installed), skipping the text decoding and charset detection of requests.
+
+    The body is decoded once and every call returns the same data, so the callers sharing a response don't decode it again; it must be treated as read-only.
+    """
+
+    decode = response.json
+    decoded = []
+    lock = threading.Lock()
+
+    def lean_json(**kwargs):
+        if kwargs:
+            return decode(**kwargs)
+
+        with lock:
+            if not decoded:
+                try:
+                    decoded.append(loads(response.content))
+
+                except ValueError:
+                    # Empty or invalid body: requests raises its usual error
+                    return decode()
+
+        return decoded[0]
+
+    response.json = lean_json
+
+
+class HttpClient:
+    """
+    Class to send every HTTP request of the app through one pooled session.
+
+    Connections are kept alive and reused between calls, so only the first request to a host pays the TCP+TLS handshake.
+
+    Identical GETs in flight at the same time (same URL, params, headers and user) are sent once: the first caller sends the request and the others wait for its response, decoded once for all of them. A GET never joins one that was sent before a write (POST, PUT, DELETE) finished, so reads that follow a write see its effect. The asyncio client runs its requests here too, so they are deduplicated the same way.
+    """
+
+    def __init__(
+        self,
+        base_url=None,
+        pool_connections=4,
+        pool_maxsize=10,
+        headers=None,
+        timeout=10,
+        token_provider=None,
+        scheduler=None,
+        instrumentation=None,
+        single_flight=True,
+    ):
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.timeout = timeout
+
+        # Object with get_token() and handle_unauthorized(token), such as a TokenManager
+        self.token_provider = token_provider
+
+        # Paces and retries the requests; shared by the whole process by default
+        self.scheduler = scheduler or default_scheduler
+
+        # Records every request when given; its adapter also times new connections
+        self.instrumentation = instrumentation
+
+        self.session = requests.Session()
+        # requests already asks for compressed bodies (Accept-Encoding) and
+        # urllib3 decompresses them transparently
+        self.session.headers.update({"Connection": "keep-alive"})
+
+        if headers:
+            self.session.headers.update(headers)
+
+        # pool_connections: number of hosts to keep pools for
+        # pool_maxsize: number of open connections kept per host
+        adapter_class = TimedHTTPAdapter if instrumentation else HTTPAdapter
+        self.adapter = adapter_class(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+        self.request_count = 0
+        self.lock = threading.Lock()
+
+        # GETs in flight by key, with the future their duplicates wait on
+        self.single_flight = single_flight
+        self.flights = {}
+        self.flights_sent = 0
+        self.flights_shared = 0
+
+        # Writes finished so far, part of the flight key
+        self.writes = 0
+
+    def set_token(self, access_token):
+        """
+        Sets the bearer token sent by default in every request.
+        """
+
+        self.session.headers["Authorization"] = f"Bearer {access_token}"
+
+    def url(self, path):
+        """
+        Builds the full URL for a path relative to the base URL. Absolute URLs are returned as they are.
+        """
+
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+
+        return f"{self.base_url}{path}"
+
+    def request(self, method, path, **kwargs):
+        """
+        Sends a request through the pooled session and returns the response.
+
+        If a token provider is set and the request has no Authorization header of its own, the provider's token is sent, and a 401 response triggers one refresh and one retry.
+        """
+
+        if method == "GET":
+            # Streamed bodies can only be read once, so they are never shared
+            if self.single_flight and not kwargs.get("stream"):
+                return self._shared_get(path, kwargs)
+
+            return self._request(method, path, **kwargs)
+
+        # Once the write is done, later GETs no longer join the ones sent before it
+        try:
+            return self._request(method, path, **kwargs)
+
+        finally:
+            with self.lock:
+                self.writes += 1
+
+    def _flight_key(self, path, kwargs):
+        params = kwargs.get("params") or {}
+
+        if isinstance(params, dict):
+            params = sorted(params.items())
+
+        headers = sorted((kwargs.get("headers") or {}).items())
+
+        return (
+            self.url(path),
+            repr(params),
+            repr(headers),
+            current_user.get(),
+            self.writes,
+        )
+
+    def _shared_get(self, path, kwargs):
+        """
+        Sends a GET, or waits for the identical one already in flight and returns its response.
+        """
+
+        key = self._flight_key(path, kwargs)
+
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+
+            if leader:
+                flight = self.flights[key] = Future()
+                self.flights_sent += 1
+
+            else:
+                self.flights_shared += 1
+
+        if not leader:
+            return flight.result()
+
+        try:
+            response = self._request("GET", path, **kwargs)
+            flight.set_result(response)
+
+            return response
+
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+
+        finally:
+            with self.lock:
+                del self.flights[key]
+
+    def _request(self, method, path, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        headers = kwargs.get("headers") or {}
+
+        if self.token_provider is None or "Authorization" in headers:
+            return self._send(method, path, **kwargs)
+
+        token = self.token_provider.get_token()
+        kwargs["headers"] = {**headers, "Authorization": f"Bearer {token}"}
+        response = self._send(method, path, **kwargs)
+
+        if response.status_code == 401:
+            new_token = self.token_provider.handle_unauthorized(token)
+
+            if new_token and new_token != token:
+                kwargs["headers"]["Authorization"] = f"Bearer {new_token}"
+                response = self._send(method, path, **kwargs)
+
+        return response
+
+    def _send(self, method, path, **kwargs):
+        url = self.url(path)
+        attempts = 0
+
+        def send():
+            nonlocal attempts
+            attempts += 1
+
+            with self.lock:
+                self.request_count += 1
+
+            if self.instrumentation is not None:
+                reset_phases()
+
+            response = self.session.request(method, url, **kwargs)
+            _lean_json(response)
+
+            return response
+
+        if self.instrumentation is None:
+            return self.scheduler.send(method, url, send)
+
+        record = self.instrumentation.before(method, url)
+
+        try:
+            response = self.scheduler.send(method, url, send)
+
+        except Exception as e:
+            self.instrumentation.after(record, None, max(attempts - 1, 0), error=e)
+            raise
+
+        self.instrumentation.after(
+            record, response, attempts - 1, streamed=kwargs.get("stream", False)
+        )
+
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def stats(self):
+        """
+        Returns how many requests were sent, how many of them reused an open connection, and how many GETs were answered by an identical one in flight.
+        """
+
+        pools = self.adapter.poolmanager.pools
+        connections = 0
+
+        for key in pools.keys():
+            try:
+                connections += pools[key].num_connections
+            except KeyError:
+                # The pool was evicted between keys() and the lookup
+                pass
+
+        return {
+            "requests": self.request_count,
+            "connections_opened": connections,
+            "connections_reused": max(self.request_count - connections, 0),
+            "pools": len(pools),
+            "single_flight_sent": self.flights_sent,
+            "single_flight_shared": self.flights_shared,
+        }
+
+    def close(self):
+        """
+        Closes every pooled connection.
+        """
+
+        self.session.close()
@@ -0,0 +1,453 @@
+import json
+import logging
+import socket
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NameResolutionError
+from urllib3.util.connection import allowed_gai_family
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Path segments followed by an ID, e.g. /playlists/{id}/tracks
+ID_COLLECTIONS = ("albums", "artists", "playlists", "tracks", "users", "shows")
+
+# Connection phases of the current request, filled in by the timed connections
+_phases = threading.local()
+
+logger = logging.getLogger("spotify_api.http")
+
+
+def endpoint_template(url):
+    """
+    Return the path of a URL with its IDs replaced by {id}, so requests to the same endpoint are grouped together.
+    """
+
+    segments = urlparse(url).path.strip("/").split("/")
+
+    for i in range(1, len(segments)):
+        after_me = i >= 2 and segments[i - 2] == "me"
+
+        if segments[i - 1] in ID_COLLECTIONS and not after_me:
+            segments[i] = "{id}"
+
+    return "/" + "/".join(segments)
+
+
+def reset_phases():
+    _phases.timings = {}
+
+
+def current_phases():
+    return dict(getattr(_phases, "timings", {}))
+
+
+class TimedConnectionMixin:
+    """
+    Mixin for urllib3 connections that records the DNS, TCP connect and TLS times of new connections.
+
+    The host is resolved here, timed, and the connection is made to the resolved addresses, so the lookup being measured is the only one.
+    """
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        dns_host = self._dns_host
+
+        try:
+            addresses = socket.getaddrinfo(
+                dns_host.strip("[]"),
+                self.port,
+                allowed_gai_family(),
+                socket.SOCK_STREAM,
+            )
+
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+
+        resolved = time.perf_counter()
+
+        # urllib3 connects to _dns_host; pointing it at each resolved address in
+        # turn makes its own lookup a no-op. `host` (used for TLS) derives from
+        # it, so it is put back before connect() goes on.
+        sock = None
+        error = None
+
+        try:
+            for address in dict.fromkeys(sockaddr[0] for *_, sockaddr in addresses):
+                self._dns_host = address
+
+                try:
+                    sock = super()._new_conn()
+                    break
+
+                # Also raised for refused connections (NewConnectionError)
+                except ConnectTimeoutError as e:
+                    error = e
+
+        finally:
+            self._dns_host = dns_host
+
+        if sock is None:
+            raise error
+
+        connected = time.perf_counter()
+
+        timings = getattr(_phases, "timings", None)
+
+        if timings is not None:
+            timings["dns_ms"] = (resolved - start) * 1000
+            timings["connect_ms"] = (connected - resolved) * 1000
+
+        return sock
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        timings = getattr(_phases, "timings", None)
+
+        if timings is not None and isinstance(self, HTTPSConnection):
+            timings["tls_ms"] = max(
+                elapsed_ms - timings.get("dns_ms", 0) - timings.get("connect_ms", 0),
+                0,
+            )
+
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose pools open timed connections.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+class Histogram:
+    """
+    Class to count observations into fixed buckets, like a Prometheus histogram.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+        else:
+            self.counts[-1] += 1
+
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Returns the upper bound of the bucket that holds the q-th quantile.
+        """
+
+        if not self.count:
+            return 0
+
+        target = q * self.count
+        seen = 0
+
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+
+            if seen >= target:
+                return bound
+
+        return float("inf")
+
+    def cumulative(self):
+        """
+        Returns (upper bound, count of observations <= bound) pairs, ending with +Inf.
+        """
+
+        total = 0
+        result = []
+
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+
+        return result
+
+
+class EndpointStats:
+    """
+    Class to hold the metrics of one (method, endpoint) pair.
+    """
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.statuses = {}
+        self.errors = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.phase_totals = {}
+
+
+class Instrumentation:
+    """
+    Class to record every outbound request: endpoint, status, bytes, connection phase timings and retries.
+
+    It keeps per-endpoint latency histograms that can be dumped as JSON or Prometheus text, and runs pre/post request hooks.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.pre_hooks = []
+        self.post_hooks = []
+
+    def add_pre_hook(self, hook):
+        """
+        Registers a function called with {method, url, endpoint} before each request.
+        """
+
+        self.pre_hooks.append(hook)
+
+    def add_post_hook(self, hook):
+        """
+        Registers a function called with the full record of each request after it finishes.
+        """
+
+        self.post_hooks.append(hook)
+
+    def before(self, method, url):
+        """
+        Starts recording a request and runs the pre hooks. Returns the record to pass to after().
+        """
+
+        record = {
+            "method": method,
+            "url": url,
+            "endpoint": endpoint_template(url),
+            "started_at": time.perf_counter(),
+        }
+
+        for hook in self.pre_hooks:
+            hook(dict(record))
+
+        return record
+
+    def after(self, record, response, retries, error=None, streamed=False):
+        """
+        Finishes recording a request, updates the metrics and runs the post hooks.
+
+        The body of a streamed response isn't read here: without a Content-Length, its bytes received count as 0.
+        """
+
+        total = time.perf_counter() - record.pop("started_at")
+        timings = current_phases()
+        timings["total_ms"] = total * 1000
+
+        record["retries"] = retries
+        record["status"] = None
+        record["bytes_sent"] = 0
+        record["bytes_received"] = 0
+
+        if response is not None:
+            headers_ms = response.elapsed.total_seconds() * 1000
+            connection_ms = sum(
+                timings.get(phase, 0) for phase in ("dns_ms", "connect_ms", "tls_ms")
+            )
+
+            timings["server_ms"] = max(headers_ms - connection_ms, 0)
+            timings["transfer_ms"] = max(timings["total_ms"] - headers_ms, 0)
+
+            body = response.request.body or b""
+            record["status"] = response.status_code
+            record["bytes_sent"] = len(body)
+            length = response.headers.get("Content-Length")
+
+            if length is not None:
+                record["bytes_received"] = int(length)
+
+            elif not streamed:
+                record["bytes_received"] = len(response.content)
+
+        if error is not None:
+            record["error"] = type(error).__name__
+
+        record["timings"] = {key: round(value, 3) for key, value in timings.items()}
+
+        with self.lock:
+            key = (record["method"], record["endpoint"])
+            stats = self.endpoints.get(key)
+
+            if stats is None:
+                stats = self.endpoints[key] = EndpointStats()
+
+            stats.latency.observe(total)
+            stats.retries += retries
+            stats.bytes_sent += record["bytes_sent"]
+            stats.bytes_received += record["bytes_received"]
+
+            if error is not None:
+                stats.errors += 1
+
+            else:
+                stats.statuses[record["status"]] = (
+                    stats.statuses.get(record["status"], 0) + 1
+                )
+
+            for phase, value in timings.items():
+                stats.phase_totals[phase] = stats.phase_totals.get(phase, 0) + value
+
+        for hook in self.post_hooks:
+            hook(record)
+
+        return record
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+
+    def to_dict(self):
+        """
+        Returns the metrics of every endpoint.
+        """
+
+        with self.lock:
+            result = []
+
+            for (method, endpoint), stats in sorted(self.endpoints.items()):
+                count = stats.latency.count
+
+                result.append(
+                    {
+                        "method": method,
+                        "endpoint": endpoint,
+                        "count": count,
+                        "statuses": {
+                            str(status): n for status, n in stats.statuses.items()
+                        },
+                        "errors": stats.errors,
+                        "retries": stats.retries,
+                        "bytes_sent": stats.bytes_sent,
+                        "bytes_received": stats.bytes_received,
+                        "latency_ms": {
+                            "mean": round(stats.latency.sum / count * 1000, 3),
+                            "p50": stats.latency.quantile(0.5) * 1000,
+                            "p95": stats.latency.quantile(0.95) * 1000,
+                            "p99": stats.latency.quantile(0.99) * 1000,
+                        },
+                        "phases_mean_ms": {
+                            phase: round(total / count, 3)
+                            for phase, total in stats.phase_totals.items()
+                        },
+                    }
+                )
+
+            return result
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+
+        lines = [
+            "# HELP spotify_http_request_duration_seconds Latency of requests to the Spotify API.",
+            "# TYPE spotify_http_request_duration_seconds histogram",
+        ]
+        counters = {
+            "requests": [],
+            "retries": [],
+            "response_bytes": [],
+        }
+
+        with self.lock:
+            for (method, endpoint), stats in sorted(self.endpoints.items()):
+                labels = f'method="{method}",endpoint="{endpoint}"'
+
+                for bound, count in stats.latency.cumulative():
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(
+                        f'spotify_http_request_duration_seconds_bucket{{{labels},le="{le}"}} {count}'
+                    )
+
+                lines.append(
+                    f"spotify_http_request_duration_seconds_sum{{{labels}}} {stats.latency.sum}"
+                )
+                lines.append(
+                    f"spotify_http_request_duration_seconds_count{{{labels}}} {stats.latency.count}"
+                )
+
+                for status, count in sorted(stats.statuses.items()):
+                    counters["requests"].append(
+                        f'spotify_http_requests_total{{{labels},status="{status}"}} {count}'
+                    )
+
+                if stats.errors:
+                    counters["requests"].append(
+                        f'spotify_http_requests_total{{{labels},status="error"}} {stats.errors}'
+                    )
+
+                counters["retries"].append(
+                    f"spotify_http_retries_total{{{labels}}} {stats.retries}"
+                )
+                counters["response_bytes"].append(
+                    f"spotify_http_response_bytes_total{{{labels}}} {stats.bytes_received}"
+                )
+
+        lines.append("# TYPE spotify_http_requests_total counter")
+        lines.extend(counters["requests"])
+        lines.append("# TYPE spotify_http_retries_total counter")
+        lines.extend(counters["retries"])
+        lines.append("# TYPE spotify_http_response_bytes_total counter")
+        lines.extend(counters["response_bytes"])
+
+        return "\n".join(lines) + "\n"
+
+
+def log_request(record):
+    """
+    Post hook that logs every request at debug level.
+    """
+
+    logger.debug(
+        "%s %s -> %s (%.1f ms, %d bytes, %d retries)",
+        record["method"],
+        record["endpoint"],
+        record["status"] or record.get("error"),
+        record["timings"]["total_ms"],
+        record["bytes_received"],
+        record["retries"],
+    )
@@ -0,0 +1,522 @@
+import bisect
+import contextvars
+import difflib
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from atomic_file import write_json
+from models import PLAYLIST_TRACKS_FIELDS
+from pager import iter_pages
+
+# Bump when the file layout changes; older files are ignored and rebuilt by the next sync
+INDEX_VERSION = 2
+
+# Tokens shorter than this only match exactly, so "a" doesn't match half the library
+MIN_PREFIX_LENGTH = 3
+
+# Minimum similarity for a fuzzy token match (typos, missing letters)
+FUZZY_CUTOFF = 0.8
+
+
+def normalize(text):
+    """
+    Lowercase a text and drop its accents and punctuation, so "Canción #1" and "cancion 1" compare equal.
+    """
+
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+
+    return " ".join(re.sub(r"[\W_]+", " ", text.lower()).split())
+
+
+def tokenize(text):
+    return normalize(text).split()
+
+
+def diff_tracks(old, new):
+    """
+    Return the URIs to add to `old` and to remove from it so it holds the tracks of `new`.
+
+    Additions keep the order of `new` and respect duplicates. Removals are unique, since the API removes every occurrence of a URI.
+    """
+
+    missing = Counter(new) - Counter(old)
+    added = []
+
+    for uri in new:
+        if missing[uri]:
+            added.append(uri)
+            missing[uri] -= 1
+
+    wanted = set(new)
+    removed = list(dict.fromkeys(uri for uri in old if uri not in wanted))
+
+    return added, removed
+
+
+class LibraryIndex:
+    """
+    Class to keep the user's library (saved tracks, playlists with their tracks, followed artists) in a local file and search it offline.
+
+    Entries are indexed by token. A query matches entries containing each of its tokens exactly, as a prefix or, failing both, as a close fuzzy match, and the matches are ranked by how similar their name is to the query.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.lock = threading.Lock()
+
+        # The file is read on the first search or sync, not when the app starts
+        self.loaded = False
+        self.data = self._empty()
+
+        self.postings = {}
+        self.vocabulary = []
+        self.names = {}
+
+    @staticmethod
+    def _empty():
+        return {
+            "version": INDEX_VERSION,
+            # uri -> [kind, name, artist names, popularity, album uri]
+            "entries": {},
+            "saved_tracks": {"total": None, "latest": None, "uris": []},
+            # playlist id -> {"name", "snapshot_id", "uri", "tracks"}; also the
+            # snapshot store of playlist_sync
+            "playlists": {},
+            "artists": [],
+        }
+
+    def _ensure_loaded(self):
+        if self.loaded:
+            return
+
+        with self.lock:
+            if self.loaded:
+                return
+
+            try:
+                with open(self.path, encoding="utf-8") as file:
+                    data = json.load(file)
+
+            except (FileNotFoundError, json.JSONDecodeError):
+                data = None
+
+            if isinstance(data, dict) and data.get("version") == INDEX_VERSION:
+                self.data = data
+
+            self._build()
+            self.loaded = True
+
+    def _build(self):
+        """
+        Rebuilds the token index from the entries.
+        """
+
+        postings = {}
+        names = {}
+
+        for uri, (kind, name, artists, popularity, album_uri) in self.data[
+            "entries"
+        ].items():
+            name = normalize(name)
+            full_name = f"{name} {normalize(' '.join(artists))}".strip()
+            names[uri] = (name, full_name)
+
+            for token in set(full_name.split()):
+                postings.setdefault(token, set()).add(uri)
+
+        self.postings = postings
+        self.vocabulary = sorted(postings)
+
+        # Normalized name, and name followed by the artists, of every entry
+        self.names = names
+
+    def __len__(self):
+        self._ensure_loaded()
+
+        return len(self.data["entries"])
+
+    def __contains__(self, uri):
+        self._ensure_loaded()
+
+        return uri in self.data["entries"]
+
+    def _matching(self, token):
+        """
+        Returns the URIs of the entries with a token that is, or starts with, the given one. Falls back to close fuzzy matches.
+        """
+
+        uris = set(self.postings.get(token, ()))
+
+        if len(token) >= MIN_PREFIX_LENGTH:
+            i = bisect.bisect_left(self.vocabulary, token)
+
+            while i < len(self.vocabulary) and self.vocabulary[i].startswith(token):
+                uris |= self.postings[self.vocabulary[i]]
+                i += 1
+
+        if uris:
+            return uris
+
+        # Only tokens with the same first letter are compared, which keeps misses cheap
+        start = bisect.bisect_left(self.vocabulary, token[0])
+        end = bisect.bisect_left(self.vocabulary, chr(ord(token[0]) + 1))
+
+        for close in difflib.get_close_matches(
+            token, self.vocabulary[start:end], n=3, cutoff=FUZZY_CUTOFF
+        ):
+            uris |= self.postings[close]
+
+        return uris
+
+    def search(self, item_type, query, limit=5):
+        """
+        Returns the best entries of a type ("track", "album", "artist", "playlist") for a query, best first.
+
+        Each result is a dict with the kind, name, URI, artists, popularity and a score between 0 and 1.
+        """
+
+        self._ensure_loaded()
+
+        tokens = tokenize(query)
+
+        if not tokens:
+            return []
+
+        with self.lock:
+            entries = self.data["entries"]
+            candidates = None
+
+            for token in tokens:
+                matches = self._matching(token)
+                candidates = matches if candidates is None else candidates & matches
+
+                if not candidates:
+                    return []
+
+            # The score mixes the similarity of the query to the name (alone or
+            # followed by the artists) with the share of query tokens found whole;
+            # tokens matched as a prefix or misspelled count half
+            exact = [self.postings.get(token, ()) for token in tokens]
+            matcher = difflib.SequenceMatcher()
+            matcher.set_seq2(" ".join(tokens))
+            bounded = []
+
+            for uri in candidates:
+                if entries[uri][0] != item_type:
+                    continue
+
+                coverage = sum(1 if uri in uris else 0.5 for uris in exact) / len(
+                    tokens
+                )
+
+                # Upper bound of the similarity, from the lengths alone
+                bound = 0
+
+                for text in self.names[uri]:
+                    matcher.set_seq1(text)
+                    bound = max(bound, matcher.real_quick_ratio())
+
+                bounded.append((0.6 * bound + 0.4 * coverage, coverage, uri))
+
+            # The exact similarity is slow, so it is only computed for the
+            # candidates whose bound can still reach the best `limit` scores
+            bounded.sort(reverse=True)
+            results = []
+            scores = []
+
+            for bound, coverage, uri in bounded:
+                if len(scores) >= limit and bound < scores[limit - 1]:
+                    break
+
+                kind, name, artists, popularity, album_uri = entries[uri]
+                similarity = 0
+
+                for text in self.names[uri]:
+                    matcher.set_seq1(text)
+                    similarity = max(similarity, matcher.ratio())
+
+                score = round(0.6 * similarity + 0.4 * coverage, 3)
+                bisect.insort(scores, score, key=lambda value: -value)
+
+                results.append(
+                    {
+                        "kind": kind,
+                        "name": name,
+                        "uri": uri,
+                        "artists": artists,
+                        "popularity": popularity,
+                        "score": score,
+                    }
+                )
+
+        results.sort(key=lambda result: (-result["score"], -result["popularity"]))
+
+        return results[:limit]
+
+    def sync(self, http_client, concurrency=4):
+        """
+        Downloads the library and saves it. Playlists whose snapshot_id didn't change, and saved tracks whose total and latest addition are the same, are not fetched again.
+
+        Returns how many playlists were fetched and skipped, and the number of entries.
+        """
+
+        self._ensure_loaded()
+
+        with self.lock:
+            data = json.loads(json.dumps(self.data))
+
+        entries = data["entries"]
+
+        # Saved tracks are newest first, so the first one and the total tell whether they changed
+        total, latest = self._saved_tracks_head(http_client)
+        saved = data["saved_tracks"]
+
+        if (total, latest) != (saved["total"], saved["latest"]):
+            uris = []
+
+            for item in iter_pages(
+                http_client, "/me/tracks", error="Failed to get saved tracks"
+            ):
+                uri = self._add_track(entries, item.get("track"))
+
+                if uri:
+                    uris.append(uri)
+
+            data["saved_tracks"] = {"total": total, "latest": latest, "uris": uris}
+
+        data["artists"] = []
+
+        for artist in iter_pages(
+            http_client,
+            "/me/following",
+            params={"type": "artist"},
+            container_key="artists",
+            error="Failed to get followed artists",
+        ):
+            entries[artist["uri"]] = [
+                "artist",
+                artist["name"],
+                [],
+                artist.get("popularity", 0),
+                None,
+            ]
+            data["artists"].append(artist["uri"])
+
+        playlists = self._sync_playlists(http_client, data, concurrency)
+        self._commit(data)
+
+        return {
+            "playlists_fetched": playlists["fetched"],
+            "playlists_skipped": playlists["skipped"],
+            "entries": len(data["entries"]),
+        }
+
+    def sync_playlists(self, http_client, concurrency=4):
+        """
+        Updates only the playlists, fetching the tracks of those whose snapshot_id changed.
+
+        Returns how many playlists were fetched and skipped, the IDs of the deleted ones, and the URIs added to and removed from each fetched one.
+        """
+
+        self._ensure_loaded()
+
+        with self.lock:
+            data = json.loads(json.dumps(self.data))
+
+        result = self._sync_playlists(http_client, data, concurrency)
+        self._commit(data)
+
+        return result
+
+    def _sync_playlists(self, http_client, data, concurrency):
+        entries = data["entries"]
+        known = data["playlists"]
+        playlists = {}
+        changed = []
+
+        for playlist in iter_pages(
+            http_client, "/me/playlists", error="Failed to get playlists"
+        ):
+            entries[playlist["uri"]] = ["playlist", playlist["name"], [], 0, None]
+            old = known.get(playlist["id"])
+
+            if old and old["snapshot_id"] == playlist["snapshot_id"]:
+                playlists[playlist["id"]] = {**old, "name": playlist["name"]}
+
+            else:
+                changed.append(playlist)
+
+        def fetch_tracks(playlist):
+            return [
+                item.get("track")
+                for item in iter_pages(
+                    http_client,
+                    f"/playlists/{playlist['id']}/tracks",
+                    params={"fields": PLAYLIST_TRACKS_FIELDS},
+                    limit=100,
+                    error="Failed to get playlist tracks",
+                )
+            ]
+
+        changes = []
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, fetch_tracks, playlist)
+                for playlist in changed
+            ]
+
+            for playlist, future in zip(changed, futures):
+                tracks = [
+                    uri
+                    for uri in (
+                        self._add_track(entries, track) for track in future.result()
+                    )
+                    if uri
+                ]
+                added, removed = diff_tracks(
+                    (known.get(playlist["id"]) or {}).get("tracks", []), tracks
+                )
+
+                changes.append(
+                    {
+                        "id": playlist["id"],
+                        "name": playlist["name"],
+                        "added": added,
+                        "removed": removed,
+                    }
+                )
+
+                playlists[playlist["id"]] = {
+                    "name": playlist["name"],
+                    "snapshot_id": playlist["snapshot_id"],
+                    "uri": playlist["uri"],
+                    "tracks": tracks,
+                }
+
+        data["playlists"] = playlists
+
+        return {
+            "fetched": len(changed),
+            "skipped": len(playlists) - len(changed),
+            "deleted": [
+                playlist_id for playlist_id in known if playlist_id not in playlists
+            ],
+            "changes": changes,
+        }
+
+    def _commit(self, data):
+        """
+        Drops the entries nothing references any more, swaps in the synced data and saves it.
+        """
+
+        data["entries"] = self._referenced(data)
+
+        with self.lock:
+            self.data = data
+            self._build()
+
+        self.save()
+
+    def playlists(self):
+        """
+        Returns the synced playlists: ID -> {"name", "snapshot_id", "uri", "tracks"}.
+        """
+
+        self._ensure_loaded()
+
+        with self.lock:
+            return dict(self.data["playlists"])
+
+    def set_playlist_tracks(self, playlist_id, snapshot_id, uris):
+        """
+        Records the tracks the app wrote to a playlist and the snapshot_id the API answered with, so the next sync doesn't fetch it again. The tracks must already be entries, e.g. copied from another synced playlist.
+        """
+
+        self._ensure_loaded()
+
+        with self.lock:
+            self.data["playlists"][playlist_id] = {
+                **self.data["playlists"][playlist_id],
+                "snapshot_id": snapshot_id,
+                "tracks": list(uris),
+            }
+
+    @staticmethod
+    def _saved_tracks_head(http_client):
+        """
+        Returns the number of saved tracks and the URI of the latest one.
+        """
+
+        response = http_client.get("/me/tracks", params={"limit": 1})
+
+        if response.status_code != 200:
+            print(response.json())
+            raise Exception("Failed to get saved tracks")
+
+        page = response.json()
+        items = [item for item in page["items"] if item.get("track")]
+
+        return page["total"], items[0]["track"]["uri"] if items else None
+
+    @staticmethod
+    def _add_track(entries, track):
+        """
+        Adds a track and its album to the entries, and returns the track URI. Local files and episodes are skipped.
+        """
+
+        if not track or track.get("type", "track") != "track" or track.get("is_local"):
+            return None
+
+        artists = [artist["name"] for artist in track.get("artists", [])]
+        album = track.get("album")
+        album_uri = album["uri"] if album and album.get("uri") else None
+
+        if album_uri:
+            entries[album_uri] = [
+                "album",
+                album["name"],
+                [artist["name"] for artist in album.get("artists", [])],
+                0,
+                None,
+            ]
+
+        entries[track["uri"]] = [
+            "track",
+            track["name"],
+            artists,
+            track.get("popularity", 0),
+            album_uri,
+        ]
+
+        return track["uri"]
+
+    @staticmethod
+    def _referenced(data):
+        """
+        Returns the entries still referenced by the saved tracks, playlists or followed artists, dropping the rest.
+        """
+
+        entries = data["entries"]
+        uris = set(data["saved_tracks"]["uris"]) | set(data["artists"])
+
+        for playlist in data["playlists"].values():
+            uris.add(playlist["uri"])
+            uris.update(playlist["tracks"])
+
+        albums = {entries[uri][4] for uri in uris if uri in entries and entries[uri][4]}
+
+        return {uri: entries[uri] for uri in uris | albums if uri in entries}
+
+    def save(self):
+        """
+        Writes the index to its file, replacing the old one atomically.
+        """
+
+        with self.lock:
+            write_json(self.path, self.data, prefix=".library-", separators=(",", ":"))
@@ -0,0 +1,196 @@
+import json
+import sqlite3
+import threading
+import time
+
+# Seconds each kind of entry stays valid
+DEFAULT_TTLS = {
+    "track": 7 * 24 * 3600,
+    "album": 7 * 24 * 3600,
+    "artist": 24 * 3600,
+    "playlist": 3600,
+    "playlists": 300,
+    "search": 24 * 3600,
+}
+
+# Writes between two checks of the cache size
+EVICTION_INTERVAL = 100
+
+# Hits only refresh an entry's access time once it is this many seconds old,
+# and the refreshes are written in batches, so reads stay read-only transactions
+TOUCH_INTERVAL = 3600
+TOUCH_BATCH = 100
+
+
+class MetadataCache:
+    """
+    Class to keep entity metadata and search results in a local SQLite file, so they survive restarts.
+
+    Each kind of entry has its own time to live. The database runs in WAL mode so readers don't block each other, and the least recently used entries are evicted when the file grows past max_bytes. Access times are approximate (see TOUCH_INTERVAL), so a cache hit doesn't write to the database.
+    """
+
+    def __init__(self, path, ttls=None, max_bytes=50 * 1024 * 1024):
+        self.path = path
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.max_bytes = max_bytes
+
+        # sqlite3 connections can't be shared between threads, so each thread opens its own
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.writes = 0
+
+        # (kind, key) -> access time waiting to be written
+        self.touches = {}
+
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (kind, key)
+            )
+            """)
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)"
+        )
+        connection.commit()
+
+    def _connection(self):
+        connection = getattr(self.local, "connection", None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+
+        return connection
+
+    def get(self, kind, key):
+        """
+        Returns the cached value, or None if it is missing or expired.
+        """
+
+        connection = self._connection()
+        now = time.time()
+
+        row = connection.execute(
+            "SELECT value, expires_at, accessed_at FROM entries WHERE kind = ? AND key = ?",
+            (kind, key),
+        ).fetchone()
+
+        # Expired entries are deleted by the next eviction or replaced by set()
+        if row is None or now >= row[1]:
+            return None
+
+        value, expires_at, accessed_at = row
+
+        if now - accessed_at >= TOUCH_INTERVAL:
+            with self.lock:
+                self.touches[(kind, key)] = now
+                flush = len(self.touches) >= TOUCH_BATCH
+
+            if flush:
+                self.flush_touches()
+
+        return json.loads(value)
+
+    def flush_touches(self):
+        """
+        Writes the pending access times in one transaction.
+        """
+
+        with self.lock:
+            touches, self.touches = self.touches, {}
+
+        if not touches:
+            return
+
+        connection = self._connection()
+        connection.executemany(
+            "UPDATE entries SET accessed_at = MAX(accessed_at, ?) WHERE kind = ? AND key = ?",
+            [(accessed_at, kind, key) for (kind, key), accessed_at in touches.items()],
+        )
+        connection.commit()
+
+    def set(self, kind, key, value, ttl=None):
+        """
+        Stores a JSON-serializable value with the TTL of its kind, unless another one is given.
+        """
+
+        connection = self._connection()
+        now = time.time()
+        encoded = json.dumps(value, separators=(",", ":"))
+
+        if ttl is None:
+            ttl = self.ttls.get(kind, 3600)
+
+        connection.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+            (kind, key, encoded, len(encoded), now + ttl, now),
+        )
+        connection.commit()
+
+        with self.lock:
+            self.writes += 1
+            check_size = self.writes % EVICTION_INTERVAL == 0
+
+        if check_size:
+            self.evict()
+
+    def delete(self, kind, key):
+        connection = self._connection()
+        connection.execute(
+            "DELETE FROM entries WHERE kind = ? AND key = ?", (kind, key)
+        )
+        connection.commit()
+
+    def evict(self):
+        """
+        Deletes the expired entries, then the least recently used ones until the cache fits in max_bytes.
+        """
+
+        self.flush_touches()
+
+        connection = self._connection()
+        connection.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+
+        total_size = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()[0]
+
+        if total_size > self.max_bytes:
+            excess = total_size - self.max_bytes
+            rows = connection.execute(
+                "SELECT kind, key, size FROM entries ORDER BY accessed_at"
+            )
+
+            to_delete = []
+
+            for kind, key, size in rows:
+                if excess <= 0:
+                    break
+
+                to_delete.append((kind, key))
+                excess -= size
+
+            connection.executemany(
+                "DELETE FROM entries WHERE kind = ? AND key = ?", to_delete
+            )
+
+        connection.commit()
+
+    def stats(self):
+        """
+        Returns the number of entries and their size per kind.
+        """
+
+        rows = self._connection().execute(
+            "SELECT kind, COUNT(*), SUM(size) FROM entries GROUP BY kind"
+        )
+
+        return {kind: {"entries": count, "bytes": size} for kind, count, size in rows}
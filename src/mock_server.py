@@ -0,0 +1,641 @@
+import argparse
+import gzip
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Markets sent with every track and album, so payloads weigh as much as the real ones
+MARKETS = ["AR", "BR", "CA", "CL", "CO", "DE", "ES", "FR", "GB", "MX", "US"] * 16
+
+
+def make_artist(i):
+    return {
+        "id": f"artist{i}",
+        "name": f"Artist {i}",
+        "type": "artist",
+        "uri": f"spotify:artist:artist{i}",
+        "href": f"https://api.spotify.com/v1/artists/artist{i}",
+        "external_urls": {"spotify": f"https://open.spotify.com/artist/artist{i}"},
+    }
+
+
+def make_full_artist(i):
+    # Artists fetched on their own (search, /artists) also carry their popularity,
+    # unlike the ones nested in tracks and albums
+    return {**make_artist(i), "popularity": (i * 37) % 100}
+
+
+def make_album(i):
+    return {
+        "id": f"album{i}",
+        "name": f"Album {i}",
+        "type": "album",
+        "uri": f"spotify:album:album{i}",
+        "album_type": "album",
+        "total_tracks": 12,
+        "release_date": "2020-01-01",
+        "artists": [make_artist(i % 50)],
+        "available_markets": MARKETS,
+        "images": [
+            {"url": f"https://i.scdn.co/image/album{i}-{size}", "height": size}
+            for size in (640, 300, 64)
+        ],
+    }
+
+
+def make_track(i):
+    return {
+        "id": f"track{i}",
+        "name": f"Track {i}",
+        "type": "track",
+        "uri": f"spotify:track:track{i}",
+        "duration_ms": 180000 + (i % 120) * 1000,
+        "popularity": i % 100,
+        "explicit": False,
+        "track_number": i % 12 + 1,
+        "artists": [make_artist(i % 50), make_artist((i + 7) % 50)],
+        "album": make_album(i % 200),
+        "available_markets": MARKETS,
+        "external_ids": {"isrc": f"MOCK{i:08d}"},
+        "external_urls": {"spotify": f"https://open.spotify.com/track/track{i}"},
+    }
+
+
+def make_playlist(i, version=0):
+    return {
+        "id": f"playlist{i}",
+        "name": f"Playlist {i}",
+        "type": "playlist",
+        "uri": f"spotify:playlist:playlist{i}",
+        "snapshot_id": f"snapshot{i}-{version}",
+        "owner": {"id": "mock-user", "display_name": "Mock User"},
+        "tracks": {"total": 0},
+        "images": [{"url": f"https://i.scdn.co/image/playlist{i}", "height": 640}],
+    }
+
+
+def parse_fields(spec):
+    """
+    Parses a `fields` projection such as "items(track(name,uri)),total" into nested dicts. None selects the whole value.
+    """
+
+    fields = {}
+    stack = [fields]
+    name = ""
+
+    for char in spec + ",":
+        if char not in ",()":
+            name += char
+            continue
+
+        name = name.strip()
+
+        if char == "(":
+            stack[-1][name] = {}
+            stack.append(stack[-1][name])
+
+        elif name:
+            stack[-1][name] = None
+
+        if char == ")":
+            stack.pop()
+
+        name = ""
+
+    return fields
+
+
+def project(data, fields):
+    """
+    Keeps only the selected fields of an object, applying the selection to every item of lists.
+    """
+
+    if fields is None:
+        return data
+
+    if isinstance(data, list):
+        return [project(item, fields) for item in data]
+
+    if isinstance(data, dict):
+        return {
+            key: project(data[key], subfields)
+            for key, subfields in fields.items()
+            if key in data
+        }
+
+    return data
+
+
+# Response key, ID prefix and builder of the multi-ID endpoints
+BATCH_MAKERS = {
+    "/tracks": ("tracks", "track", make_track),
+    "/artists": ("artists", "artist", make_full_artist),
+    "/albums": ("albums", "album", make_album),
+}
+
+
+class MockSpotifyHandler(BaseHTTPRequestHandler):
+    """
+    Class to answer the Spotify API requests made by the app with generated data.
+
+    The behaviour (latency, 429s, sizes) comes from the MockSpotifyServer that owns it.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    # Headers and body are written separately; without this, Nagle's algorithm
+    # plus delayed ACKs add ~40 ms to every keep-alive response
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def do_PUT(self):
+        self.handle_request("PUT")
+
+    def do_DELETE(self):
+        self.handle_request("DELETE")
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle_request(self, method):
+        mock = self.server.mock
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        mock.count_request(method, url.path)
+        mock.wait()
+
+        status = mock.next_failure()
+
+        if status is not None:
+            self.send_json(
+                status,
+                {"error": {"status": status, "message": "Injected failure"}},
+                {"Retry-After": str(mock.retry_after)} if status == 429 else None,
+            )
+            return
+
+        if mock.should_throttle():
+            self.send_json(
+                429,
+                {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                {"Retry-After": str(mock.retry_after)},
+            )
+            return
+
+        if url.path == "/api/token":
+            self.send_json(200, mock.token_response(body))
+            return
+
+        authorization = self.headers.get("Authorization", "")
+
+        if not authorization.startswith("Bearer "):
+            self.send_json(
+                401, {"error": {"status": 401, "message": "No token provided"}}
+            )
+            return
+
+        if authorization[len("Bearer ") :] in mock.revoked_tokens:
+            self.send_json(
+                401,
+                {"error": {"status": 401, "message": "The access token expired"}},
+            )
+            return
+
+        route = (method, url.path)
+
+        if route == ("GET", "/search"):
+            self.send_json(200, mock.search(query))
+
+        elif route == ("GET", "/me"):
+            self.send_json(200, {"id": "mock-user", "display_name": "Mock User"})
+
+        elif route == ("GET", "/me/player"):
+            self.send_json(200, mock.playback())
+
+        elif route == ("GET", "/me/player/queue"):
+            self.send_json(200, mock.queue())
+
+        elif route == ("POST", "/me/player/queue"):
+            mock.add_to_queue(query.get("uri"))
+            self.send_empty(204)
+
+        elif method == "PUT" and url.path in ("/me/player/play", "/me/player/volume"):
+            self.send_empty(204)
+
+        elif route == ("GET", "/me/tracks"):
+            self.send_json(
+                200,
+                mock.page(
+                    url.path,
+                    query,
+                    mock.saved_tracks_total,
+                    lambda i: {
+                        "added_at": "2024-01-01T00:00:00Z",
+                        "track": make_track(i),
+                    },
+                ),
+            )
+
+        elif method in ("PUT", "DELETE") and url.path == "/me/tracks":
+            self.send_empty(200)
+
+        elif route == ("GET", "/me/following"):
+            self.send_json(
+                200,
+                {
+                    "artists": mock.cursor_page(
+                        url.path, query, mock.followed_artists_total, make_full_artist
+                    )
+                },
+            )
+
+        elif route == ("PUT", "/me/following"):
+            self.send_empty(204)
+
+        elif method == "GET" and url.path in BATCH_MAKERS:
+            key, prefix, make = BATCH_MAKERS[url.path]
+            ids = query.get("ids", "").split(",")
+            self.send_json(
+                200,
+                {
+                    key: [
+                        (
+                            make(int(item_id[len(prefix) :]))
+                            if item_id.startswith(prefix)
+                            and item_id[len(prefix) :].isdigit()
+                            else None
+                        )
+                        for item_id in ids
+                    ]
+                },
+            )
+
+        elif route == ("GET", "/me/playlists"):
+            self.send_json(
+                200,
+                mock.page(
+                    url.path,
+                    query,
+                    mock.playlists_total,
+                    lambda i: make_playlist(i, mock.playlist_version(i)),
+                ),
+            )
+
+        elif method == "GET" and url.path.startswith("/playlists/"):
+            playlist = mock.playlist(url.path, query)
+
+            if "fields" in query:
+                playlist = project(playlist, parse_fields(query["fields"]))
+
+            self.send_json(200, playlist)
+
+        elif (
+            method in ("POST", "DELETE")
+            and url.path.startswith("/playlists/")
+            and url.path.endswith("/tracks")
+        ):
+            playlist = int(url.path.split("/")[2].replace("playlist", "") or 0)
+            version = mock.touch_playlist(playlist)
+
+            with mock.lock:
+                mock.playlist_edits.append(
+                    (method, f"playlist{playlist}", json.loads(body or b"{}"))
+                )
+
+            self.send_json(
+                201 if method == "POST" else 200,
+                {"snapshot_id": f"snapshot{playlist}-{version}"},
+            )
+
+        else:
+            self.send_json(
+                404, {"error": {"status": 404, "message": "Service not found"}}
+            )
+
+    def send_json(self, status, data, headers=None):
+        mock = self.server.mock
+        body = json.dumps(data).encode()
+        headers = dict(headers or {})
+
+        if mock.compress and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+
+        mock.count_bytes(len(body))
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+
+        for key, value in headers.items():
+            self.send_header(key, value)
+
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_empty(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class MockSpotifyServer:
+    """
+    Class to run a local stand-in for the Spotify API and Accounts service, for benchmarks and offline runs.
+
+    It implements the endpoints used by app.py with configurable latency, jitter, 429 injection and page sizes.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        latency=0.0,
+        jitter=0.0,
+        throttle_rate=0.0,
+        retry_after=1,
+        playlists_total=120,
+        saved_tracks_total=500,
+        followed_artists_total=80,
+        playlist_tracks_total=300,
+        seed=None,
+        compress=True,
+    ):
+        # Seconds added to every response, plus a random amount up to jitter
+        self.latency = latency
+        self.jitter = jitter
+
+        # Fraction of requests answered with 429 and the Retry-After sent with them
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+
+        self.playlists_total = playlists_total
+        self.saved_tracks_total = saved_tracks_total
+        self.followed_artists_total = followed_artists_total
+        self.playlist_tracks_total = playlist_tracks_total
+
+        # Gzip the JSON bodies of the requests that accept it
+        self.compress = compress
+
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.bytes_sent = 0
+        self.queued_uris = []
+
+        # Statuses to answer the next requests with, in order (see fail_next)
+        self.failures = []
+
+        # Access tokens answered with 401, as if they had expired
+        self.revoked_tokens = set()
+
+        # Edits of each playlist; every edit changes its snapshot_id and shifts its tracks
+        self.playlist_versions = {}
+
+        # (method, playlist ID, JSON body) of every track addition and removal
+        self.playlist_edits = []
+
+        self.httpd = ThreadingHTTPServer((host, port), MockSpotifyHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.mock = self
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def token_url(self):
+        return f"{self.url}/api/token"
+
+    def start(self):
+        """
+        Starts serving on a background thread.
+        """
+
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def count_request(self, method, path):
+        with self.lock:
+            key = f"{method} {path}"
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def count_bytes(self, size):
+        with self.lock:
+            self.bytes_sent += size
+
+    def wait(self):
+        with self.lock:
+            delay = self.latency + self.random.uniform(0, self.jitter)
+
+        if delay > 0:
+            time.sleep(delay)
+
+    def should_throttle(self):
+        with self.lock:
+            return self.random.random() < self.throttle_rate
+
+    def fail_next(self, status, times=1):
+        """
+        Answers the next `times` requests with the given status (429s with Retry-After).
+        """
+
+        with self.lock:
+            self.failures.extend([status] * times)
+
+    def next_failure(self):
+        with self.lock:
+            return self.failures.pop(0) if self.failures else None
+
+    def revoke(self, token):
+        with self.lock:
+            self.revoked_tokens.add(token)
+
+    def token_response(self, body):
+        form = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+        response = {
+            "access_token": f"mock-access-{time.time()}",
+            "token_type": "Bearer",
+            "expires_in": 3600,
+            "scope": "",
+        }
+
+        if form.get("grant_type") == "authorization_code":
+            response["refresh_token"] = "mock-refresh"
+
+        return response
+
+    def search(self, query):
+        item_type = query.get("type", "track")
+        limit = int(query.get("limit", 20))
+        offset = int(query.get("offset", 0))
+
+        # The same query always returns the same items
+        base = sum(query.get("q", "").encode()) * 10
+        make = {
+            "track": make_track,
+            "album": make_album,
+            "artist": make_full_artist,
+            "playlist": make_playlist,
+        }[item_type]
+
+        return {
+            f"{item_type}s": {
+                "items": [make(base + offset + i) for i in range(limit)],
+                "limit": limit,
+                "offset": offset,
+                "total": 1000,
+                "next": (
+                    f"{self.url}/search?offset={offset + limit}&limit={limit}"
+                    if offset + limit < 1000
+                    else None
+                ),
+            }
+        }
+
+    def playback(self):
+        return {
+            "is_playing": True,
+            "progress_ms": 42000,
+            "timestamp": int(time.time() * 1000),
+            "device": {"id": "mock-device", "name": "Mock", "volume_percent": 50},
+            "item": make_track(1),
+        }
+
+    def queue(self):
+        with self.lock:
+            queued = [make_track(i) for i in range(len(self.queued_uris))]
+
+        return {
+            "currently_playing": make_track(1),
+            "queue": queued + [make_track(100 + i) for i in range(20)],
+        }
+
+    def add_to_queue(self, uri):
+        with self.lock:
+            self.queued_uris = (self.queued_uris + [uri])[-20:]
+
+    def page(self, path, query, total, make):
+        """
+        Builds an offset-based page of `total` generated items.
+        """
+
+        limit = int(query.get("limit", 20))
+        offset = int(query.get("offset", 0))
+        end = min(offset + limit, total)
+
+        return {
+            "href": f"{self.url}{path}?offset={offset}&limit={limit}",
+            "items": [make(i) for i in range(offset, end)],
+            "limit": limit,
+            "offset": offset,
+            "total": total,
+            "next": (
+                f"{self.url}{path}?offset={end}&limit={limit}" if end < total else None
+            ),
+            "previous": None,
+        }
+
+    def cursor_page(self, path, query, total, make):
+        """
+        Builds a cursor-based page, like the one of /me/following.
+        """
+
+        limit = int(query.get("limit", 20))
+        after = int(query.get("after", 0))
+        end = min(after + limit, total)
+
+        return {
+            "items": [make(i) for i in range(after, end)],
+            "limit": limit,
+            "total": total,
+            "cursors": {"after": str(end) if end < total else None},
+            "next": (
+                f"{self.url}{path}?type=artist&after={end}&limit={limit}"
+                if end < total
+                else None
+            ),
+        }
+
+    def playlist_version(self, playlist):
+        with self.lock:
+            return self.playlist_versions.get(playlist, 0)
+
+    def touch_playlist(self, playlist):
+        """
+        Records an edit of a playlist, as if it was changed from another client. Returns its new version.
+        """
+
+        with self.lock:
+            version = self.playlist_versions.get(playlist, 0) + 1
+            self.playlist_versions[playlist] = version
+
+            return version
+
+    def playlist(self, path, query):
+        parts = path.strip("/").split("/")
+        playlist_id = parts[1]
+        number = int(playlist_id.replace("playlist", "") or 0)
+
+        # Each playlist, and each version of it, starts at a different track
+        first = number + self.playlist_version(number)
+
+        if len(parts) > 2 and parts[2] == "tracks":
+            return self.page(
+                path,
+                query,
+                self.playlist_tracks_total,
+                lambda i: {
+                    "added_at": "2024-01-01T00:00:00Z",
+                    "track": make_track(first + i),
+                },
+            )
+
+        playlist = make_playlist(number, self.playlist_version(number))
+        playlist["tracks"] = self.page(
+            f"{path}/tracks",
+            {"limit": 100},
+            self.playlist_tracks_total,
+            lambda i: {"track": make_track(first + i)},
+        )
+
+        return playlist
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Spotify API")
+    parser.add_argument("--port", type=int, default=8899)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = MockSpotifyServer(
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        throttle_rate=args.throttle_rate,
+    )
+
+    print(f"Servidor de prueba en {server.url} (token: {server.token_url})")
+    server.httpd.serve_forever()
@@ -0,0 +1,168 @@
+# `fields` projections for the endpoints that accept them (/playlists/{id} and its
+# tracks): the API then sends only what the models below read, without markets,
+# images or external IDs
+ARTIST_FIELDS = "id,name,uri"
+ALBUM_FIELDS = f"id,name,uri,artists({ARTIST_FIELDS})"
+TRACK_FIELDS = (
+    "type,id,name,uri,is_local,duration_ms,popularity,"
+    f"artists({ARTIST_FIELDS}),album({ALBUM_FIELDS})"
+)
+PAGE_FIELDS = "next,total,limit,offset"
+
+# Playlist track items as read by Track.from_json and the exporter
+PLAYLIST_TRACKS_FIELDS = f"items(added_at,track({TRACK_FIELDS})),{PAGE_FIELDS}"
+
+
+class Model:
+    """
+    Base class of the API models. Subclasses list their fields in __slots__, so instances have no __dict__ and keep only the parsed fields alive, not the whole JSON payload.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def to_dict(self):
+        """
+        Returns the model as plain JSON-compatible data.
+        """
+
+        return {name: _to_data(getattr(self, name)) for name in self.__slots__}
+
+
+def _to_data(value):
+    if isinstance(value, Model):
+        return value.to_dict()
+
+    if isinstance(value, list):
+        return [_to_data(item) for item in value]
+
+    return value
+
+
+class Artist(Model):
+    __slots__ = ("id", "name", "uri", "popularity")
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        Parses an artist. The simplified artists nested in tracks and albums have no popularity (None).
+        """
+
+        return cls(
+            id=data.get("id"),
+            name=data.get("name"),
+            uri=data.get("uri"),
+            popularity=data.get("popularity"),
+        )
+
+
+class Album(Model):
+    __slots__ = ("id", "name", "uri", "artists")
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            id=data.get("id"),
+            name=data.get("name"),
+            uri=data.get("uri"),
+            artists=[Artist.from_json(artist) for artist in data.get("artists", [])],
+        )
+
+    def artist_names(self):
+        return [artist.name for artist in self.artists]
+
+
+class Track(Model):
+    __slots__ = ("id", "name", "uri", "duration_ms", "popularity", "artists", "album")
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        Parses a track. Episodes, which have no artists or album, are parsed too.
+        """
+
+        album = data.get("album")
+
+        return cls(
+            id=data.get("id"),
+            name=data.get("name"),
+            uri=data.get("uri"),
+            duration_ms=data.get("duration_ms"),
+            popularity=data.get("popularity", 0),
+            artists=[Artist.from_json(artist) for artist in data.get("artists", [])],
+            album=Album.from_json(album) if album else None,
+        )
+
+    def artist_names(self):
+        return [artist.name for artist in self.artists]
+
+
+class Playlist(Model):
+    __slots__ = ("id", "name", "uri", "snapshot_id", "owner_id", "tracks_total")
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            id=data.get("id"),
+            name=data.get("name"),
+            uri=data.get("uri"),
+            snapshot_id=data.get("snapshot_id"),
+            owner_id=(data.get("owner") or {}).get("id"),
+            tracks_total=(data.get("tracks") or {}).get("total"),
+        )
+
+
+class PlaybackState(Model):
+    __slots__ = (
+        "is_playing",
+        "progress_ms",
+        "timestamp",
+        "device_id",
+        "volume_percent",
+        "item",
+    )
+
+    @classmethod
+    def from_json(cls, data):
+        device = data.get("device") or {}
+        item = data.get("item")
+
+        return cls(
+            is_playing=data.get("is_playing", False),
+            progress_ms=data.get("progress_ms"),
+            timestamp=data.get("timestamp"),
+            device_id=device.get("id"),
+            volume_percent=device.get("volume_percent"),
+            item=Track.from_json(item) if item else None,
+        )
+
+
+class Queue(Model):
+    __slots__ = ("currently_playing", "items")
+
+    @classmethod
+    def from_json(cls, data):
+        currently_playing = data.get("currently_playing")
+
+        return cls(
+            currently_playing=(
+                Track.from_json(currently_playing) if currently_playing else None
+            ),
+            items=[Track.from_json(item) for item in data.get("queue", []) if item],
+        )
+
+
+# Model of each search type
+MODELS = {
+    "track": Track,
+    "album": Album,
+    "artist": Artist,
+    "playlist": Playlist,
+}
@@ -0,0 +1,112 @@
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def iter_pages(
+    http_client,
+    path,
+    params=None,
+    limit=50,
+    max_items=None,
+    concurrency=4,
+    container_key=None,
+    error="Failed to get page",
+):
+    """
+    Yield the items of a paged endpoint one by one, fetching pages only as they are needed.
+
+    After the first page, offset-based endpoints report their total, so the remaining pages are fetched concurrently (up to `concurrency` ahead of the consumer) and yielded in order. Cursor-based endpoints, such as followed artists, are followed sequentially through `next`.
+
+    Stopping the iteration early (break, or reaching max_items) cancels the pages that were not fetched yet.
+    """
+
+    params = dict(params or {})
+    params["limit"] = limit
+    start = params.get("offset", 0)
+
+    page = _get_page(http_client, path, params, container_key, error)
+    yielded = 0
+
+    for item in page["items"]:
+        if max_items is not None and yielded >= max_items:
+            return
+
+        yield item
+        yielded += 1
+
+    if not page.get("next"):
+        return
+
+    # Cursor-based pages can only be walked one after the other
+    if "cursors" in page or page.get("total") is None:
+        while page.get("next"):
+            page = _get_page(http_client, page["next"], None, container_key, error)
+
+            for item in page["items"]:
+                if max_items is not None and yielded >= max_items:
+                    return
+
+                yield item
+                yielded += 1
+
+        return
+
+    end = page["total"]
+
+    if max_items is not None:
+        end = min(end, start + max_items)
+
+    offsets = iter(range(start + limit, end, limit))
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    pending = deque()
+
+    def submit_next():
+        offset = next(offsets, None)
+
+        if offset is not None:
+            pending.append(
+                executor.submit(
+                    contextvars.copy_context().run,
+                    _get_page,
+                    http_client,
+                    path,
+                    {**params, "offset": offset},
+                    container_key,
+                    error,
+                )
+            )
+
+    try:
+        for _ in range(concurrency):
+            submit_next()
+
+        while pending:
+            page = pending.popleft().result()
+            submit_next()
+
+            for item in page["items"]:
+                if max_items is not None and yielded >= max_items:
+                    return
+
+                yield item
+                yielded += 1
+
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _get_page(http_client, path, params, container_key, error):
+    """
+    Fetch one page and return the paging object ({"items", "next", "total", ...}).
+    """
+
+    response = http_client.get(path, params=params)
+
+    if response.status_code != 200:
+        print(response.json())
+        raise Exception(error)
+
+    page = response.json()
+
+    return page[container_key] if container_key else page
@@ -0,0 +1,94 @@
+import threading
+import time
+
+
+class PlaybackCache:
+    """
+    Class to keep a short-lived snapshot of the playback state (/me/player).
+
+    Reads within the TTL reuse the snapshot, and the current position is estimated locally from progress_ms plus the time elapsed since it was fetched. The app's own writes (play, queue, volume) invalidate it.
+    """
+
+    def __init__(self, fetch, ttl=5):
+        # Function that fetches the PlaybackState, or returns None if nothing is playing
+        self.fetch = fetch
+        self.ttl = ttl
+
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.fetched_at = None
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, max_age=None):
+        """
+        Returns the playback state, fetching it again if the snapshot is older than max_age (the TTL by default) or the track has already ended.
+        """
+
+        max_age = self.ttl if max_age is None else max_age
+
+        with self.lock:
+            if self._is_fresh(max_age):
+                self.hits += 1
+                return self.snapshot
+
+            self.misses += 1
+            self.snapshot = self.fetch()
+            self.fetched_at = time.monotonic()
+
+            return self.snapshot
+
+    def _is_fresh(self, max_age):
+        if self.fetched_at is None:
+            return False
+
+        if time.monotonic() - self.fetched_at >= max_age:
+            return False
+
+        # The track that was playing has finished, so something else is playing now
+        if self.snapshot and self.snapshot.item:
+            if self._estimate_progress_ms() >= self.snapshot.item.duration_ms:
+                return False
+
+        return True
+
+    def invalidate(self):
+        """
+        Drops the snapshot, so the next read fetches the playback state again.
+        """
+
+        with self.lock:
+            self.snapshot = None
+            self.fetched_at = None
+
+    def estimated_progress_ms(self):
+        """
+        Returns the estimated position in the current track, or None if there is no snapshot.
+        """
+
+        with self.lock:
+            if not self.snapshot or self.snapshot.progress_ms is None:
+                return None
+
+            progress_ms = self._estimate_progress_ms()
+
+            if self.snapshot.item:
+                progress_ms = min(progress_ms, self.snapshot.item.duration_ms)
+
+            return progress_ms
+
+    def _estimate_progress_ms(self):
+        progress_ms = self.snapshot.progress_ms or 0
+
+        if not self.snapshot.is_playing:
+            return progress_ms
+
+        return progress_ms + int((time.monotonic() - self.fetched_at) * 1000)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+from atomic_file import write_json
+
+# async_client (and asyncio with it) is imported where it is used, so importing
+# this module keeps the app's startup cheap
+
+# Most tracks accepted per request when adding to or removing from a playlist
+MAX_TRACKS_PER_REQUEST = 100
+
+
+class PlaylistSync:
+    """
+    Class to keep the user's playlists in sync and copy some playlists into others (mirrors).
+
+    The playlists' snapshots and tracks live in the LibraryIndex, the one snapshot store of the app: a sync refreshes it, which only fetches the tracks of playlists whose snapshot_id changed and works out what was added and removed locally. Mirrors are then written back as chunked add/remove calls with only the differences. A mirror copies which tracks the source holds, not their order or repeats (see apply). This class's own file only holds the mirrors.
+    """
+
+    def __init__(self, http_client, library, path, concurrency=4):
+        self.http_client = http_client
+        self.library = library
+        self.path = os.path.abspath(path)
+        self.concurrency = concurrency
+        self.lock = threading.Lock()
+
+        # source playlist id -> target playlist id
+        self.mirrors = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                return json.load(file).get("mirrors", {})
+
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save(self):
+        with self.lock:
+            write_json(self.path, {"mirrors": self.mirrors}, prefix=".mirrors-")
+
+    def tracks(self, playlist_id):
+        """
+        Returns the URIs of a playlist as of the last sync.
+        """
+
+        from async_client import to_id
+
+        return list(self.library.playlists()[to_id(playlist_id)]["tracks"])
+
+    def add_mirror(self, source, target):
+        """
+        Makes every sync copy the set of tracks of the source playlist into the target one.
+        """
+
+        from async_client import to_id
+
+        self.mirrors[to_id(source)] = to_id(target)
+        self.save()
+
+    def remove_mirror(self, source):
+        from async_client import to_id
+
+        self.mirrors.pop(to_id(source), None)
+        self.save()
+
+    def refresh(self):
+        """
+        Updates the snapshot store, fetching only the playlists whose snapshot changed, and returns what changed in each one.
+        """
+
+        return self.library.sync_playlists(self.http_client, self.concurrency)
+
+    def apply(self, playlist_id, tracks):
+        """
+        Makes a playlist hold the same set of tracks as the given URIs, sending only the differences with its last synced tracks in chunks of 100. Returns how many were added and removed.
+
+        Missing tracks are appended at the end and tracks that aren't in `tracks` are removed; the order of the playlist and repeats of a track it already holds are left as they are, since matching them would mean rewriting the whole playlist.
+        """
+
+        from async_client import chunked
+
+        entry = self.library.playlists()[playlist_id]
+        current = set(entry["tracks"])
+        wanted = set(tracks)
+        added = [uri for uri in dict.fromkeys(tracks) if uri not in current]
+        removed = [uri for uri in dict.fromkeys(entry["tracks"]) if uri not in wanted]
+        snapshot_id = entry["snapshot_id"]
+
+        for chunk in chunked(removed, MAX_TRACKS_PER_REQUEST):
+            response = self.http_client.delete(
+                f"/playlists/{playlist_id}/tracks",
+                json={
+                    "tracks": [{"uri": uri} for uri in chunk],
+                    "snapshot_id": snapshot_id,
+                },
+            )
+            snapshot_id = self._snapshot(response, "Failed to remove tracks")
+
+        for chunk in chunked(added, MAX_TRACKS_PER_REQUEST):
+            response = self.http_client.post(
+                f"/playlists/{playlist_id}/tracks", json={"uris": chunk}
+            )
+            snapshot_id = self._snapshot(response, "Failed to add tracks")
+
+        # The new snapshot is ours, so the next refresh doesn't fetch the playlist again
+        removed = set(removed)
+        self.library.set_playlist_tracks(
+            playlist_id,
+            snapshot_id,
+            [uri for uri in entry["tracks"] if uri not in removed] + added,
+        )
+
+        return {"added": len(added), "removed": len(removed)}
+
+    @staticmethod
+    def _snapshot(response, error):
+        if response.status_code not in (200, 201):
+            print(response.json())
+            raise Exception(error)
+
+        return response.json()["snapshot_id"]
+
+    def sync(self):
+        """
+        Refreshes the playlists and copies every mirrored source into its target. The copies are compared locally, so only targets that differ from their source are written.
+        """
+
+        result = self.refresh()
+        playlists = self.library.playlists()
+        result["mirrored"] = []
+
+        for source, target in self.mirrors.items():
+            if source not in playlists or target not in playlists:
+                continue
+
+            counts = self.apply(target, playlists[source]["tracks"])
+
+            if counts["added"] or counts["removed"]:
+                result["mirrored"].append(
+                    {"source": source, "target": target, **counts}
+                )
+
+        if result["mirrored"]:
+            self.library.save()
+
+        return result
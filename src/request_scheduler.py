@@ -0,0 +1,224 @@
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+# Requests per second and burst size for each class of endpoint
+DEFAULT_LIMITS = {
+    "auth": (1, 3),
+    "search": (5, 10),
+    "player": (5, 10),
+    "library": (5, 20),
+    "default": (10, 20),
+}
+
+# Statuses worth retrying. 5xx are only retried for idempotent methods, so a
+# failed POST /me/player/queue never adds the same song twice
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE")
+
+
+def endpoint_class(url):
+    """
+    Return the class of endpoint a URL belongs to, which selects its token bucket.
+    """
+
+    path = urlparse(url).path
+
+    if path.endswith("/api/token"):
+        return "auth"
+
+    if path.endswith("/search"):
+        return "search"
+
+    if "/me/player" in path:
+        return "player"
+
+    if (
+        "/me/tracks" in path
+        or "/me/following" in path
+        or "/me/playlists" in path
+        or "/playlists/" in path
+    ):
+        return "library"
+
+    return "default"
+
+
+class TokenBucket:
+    """
+    Class to pace requests: tokens refill at `rate` per second up to `capacity`, and each request takes one.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+        # Time until which every request waits, set from Retry-After
+        self.paused_until = 0
+
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.requests = 0
+        self.waited = 0
+        self.wait_total = 0
+        self.wait_max = 0
+        self.retries = 0
+        self.throttled = 0
+
+    def reserve(self, now):
+        """
+        Takes a token and returns how long to wait for it. Tokens may go negative, which queues later callers behind earlier ones.
+        """
+
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+        self.tokens -= 1
+
+        return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class RequestScheduler:
+    """
+    Class to pace every request of the process and retry the ones the server rejects.
+
+    Each endpoint class has its own token bucket. A 429 pauses the whole class for the Retry-After time, and 429/5xx responses are retried with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        limits=None,
+        max_retries=4,
+        backoff_base=0.5,
+        backoff_max=30,
+    ):
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.lock = threading.Lock()
+        self.buckets = {
+            name: TokenBucket(rate, capacity)
+            for name, (rate, capacity) in self.limits.items()
+        }
+
+    def send(self, method, url, send):
+        """
+        Calls send() when the endpoint's bucket allows it, retrying on 429/5xx, and returns the last response.
+        """
+
+        bucket = self.buckets[endpoint_class(url)]
+
+        for attempt in range(self.max_retries + 1):
+            self._acquire(bucket)
+            response = send()
+
+            if response.status_code not in RETRY_STATUSES:
+                return response
+
+            if response.status_code != 429 and method not in IDEMPOTENT_METHODS:
+                return response
+
+            if attempt == self.max_retries:
+                return response
+
+            delay = self._backoff(attempt)
+
+            if response.status_code == 429:
+                delay = self._retry_after(response, delay)
+
+                with self.lock:
+                    bucket.throttled += 1
+                    bucket.paused_until = max(
+                        bucket.paused_until, time.monotonic() + delay
+                    )
+
+            with self.lock:
+                bucket.retries += 1
+
+            # Gives the connection back to the pool before waiting
+            response.close()
+            time.sleep(delay)
+
+        return response
+
+    def _acquire(self, bucket):
+        """
+        Blocks until the bucket has a token for this request and no Retry-After pause is active.
+        """
+
+        with self.lock:
+            bucket.queue_depth += 1
+            bucket.max_queue_depth = max(bucket.max_queue_depth, bucket.queue_depth)
+
+        start = time.monotonic()
+
+        try:
+            while True:
+                with self.lock:
+                    now = time.monotonic()
+                    pause = bucket.paused_until - now
+
+                    if pause <= 0:
+                        wait = bucket.reserve(now)
+                        break
+
+                time.sleep(pause)
+
+            if wait > 0:
+                time.sleep(wait)
+
+        finally:
+            waited = time.monotonic() - start
+
+            with self.lock:
+                bucket.queue_depth -= 1
+                bucket.requests += 1
+                bucket.wait_total += waited
+                bucket.wait_max = max(bucket.wait_max, waited)
+
+                if waited > 0.001:
+                    bucket.waited += 1
+
+    def _backoff(self, attempt):
+        """
+        Returns a random delay up to base * 2^attempt ("full jitter"), capped at backoff_max.
+        """
+
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def _retry_after(self, response, default):
+        try:
+            return float(response.headers["Retry-After"])
+
+        except (KeyError, ValueError):
+            return default
+
+    def stats(self):
+        """
+        Returns the queue depth, wait times and retries of each endpoint class.
+        """
+
+        with self.lock:
+            return {
+                name: {
+                    "queue_depth": bucket.queue_depth,
+                    "max_queue_depth": bucket.max_queue_depth,
+                    "requests": bucket.requests,
+                    "waited": bucket.waited,
+                    "wait_s_total": round(bucket.wait_total, 3),
+                    "wait_s_max": round(bucket.wait_max, 3),
+                    "retries": bucket.retries,
+                    "throttled": bucket.throttled,
+                }
+                for name, bucket in self.buckets.items()
+            }
+
+
+# Scheduler shared by every HttpClient of the process
+default_scheduler = RequestScheduler()
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class SearchCache:
+    """
+    Class to keep recent search results in memory.
+
+    Entries expire after a fixed time to live, and the least recently used one is dropped when the cache is full.
+    """
+
+    def __init__(self, maxsize=256, ttl=600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(item_type, query, market=None):
+        """
+        Builds the cache key for a search, ignoring case and extra whitespace in the query.
+        """
+
+        return (
+            item_type.lower(),
+            " ".join(query.lower().split()),
+            (market or "").upper(),
+        )
+
+    def get(self, key):
+        """
+        Returns the cached value for the key, or None if it is missing or expired.
+        """
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+
+            if time.monotonic() >= expires_at:
+                del self.entries[key]
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+            return value
+
+    def set(self, key, value):
+        """
+        Stores a value, evicting the least recently used entry if the cache is full.
+        """
+
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """
+        Returns the hit and miss counters and the current size.
+        """
+
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self.entries),
+            }
@@ -0,0 +1,123 @@
+import threading
+import time
+
+
+class TokenManager:
+    """
+    Class to keep the access token of an AuthCodeFlow valid.
+
+    It refreshes the token on a background timer shortly before it expires, and makes concurrent callers wait on a single in-flight refresh instead of each one calling the token endpoint.
+    """
+
+    def __init__(self, authenticator, refresh_margin=60, retry_delay=30):
+        self.authenticator = authenticator
+
+        # Seconds before the expiry at which the token is renewed
+        self.refresh_margin = refresh_margin
+
+        # Seconds to wait before trying again after a failed refresh
+        self.retry_delay = retry_delay
+
+        self.lock = threading.Lock()
+        self.refresh_done = threading.Condition(self.lock)
+        self.refreshing = False
+        self.timer = None
+
+    def needs_refresh(self):
+        """
+        Checks if the access token has expired or is about to.
+        """
+
+        return time.time() >= self.authenticator.expires_at() - self.refresh_margin
+
+    def get_token(self):
+        """
+        Returns a valid access token, refreshing it first if needed.
+        """
+
+        if self.needs_refresh():
+            return self.refresh()
+
+        return self.authenticator.access_token
+
+    def handle_unauthorized(self, token):
+        """
+        Called when the API rejected a token. Refreshes it unless someone already did, and returns the new one.
+        """
+
+        return self.refresh(stale_token=token)
+
+    def refresh(self, stale_token=None):
+        """
+        Refreshes the access token. Only one refresh runs at a time; other callers wait for it and get its result.
+        """
+
+        with self.lock:
+            if self.refreshing:
+                while self.refreshing:
+                    self.refresh_done.wait()
+
+                return self.authenticator.access_token
+
+            # Another caller already replaced the token while this one was waiting for the lock
+            if (
+                stale_token is not None
+                and stale_token != self.authenticator.access_token
+            ):
+                return self.authenticator.access_token
+
+            if stale_token is None and not self.needs_refresh():
+                return self.authenticator.access_token
+
+            self.refreshing = True
+
+        try:
+            new_token = self.authenticator.refresh_token()
+
+        finally:
+            with self.lock:
+                self.refreshing = False
+                self.refresh_done.notify_all()
+
+        self.schedule(None if new_token else self.retry_delay)
+
+        return self.authenticator.access_token
+
+    def schedule(self, delay=None):
+        """
+        Schedules the next background refresh ahead of the token's expiry, or after the given delay.
+        """
+
+        if delay is None:
+            delay = max(
+                self.authenticator.expires_at() - self.refresh_margin - time.time(), 0
+            )
+
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+
+            self.timer = threading.Timer(delay, self.refresh)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def start(self):
+        """
+        Refreshes the token now if it has expired and starts the background timer.
+        """
+
+        if self.needs_refresh():
+            self.refresh()
+
+        else:
+            self.schedule()
+
+    def stop(self):
+        """
+        Cancels the background timer.
+        """
+
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
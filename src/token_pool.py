@@ -0,0 +1,333 @@
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from auth_code_flow import AUTHORIZATION_TIMEOUT, TOKEN_URL, AuthCodeFlow
+from http_client import current_user
+from token_manager import TokenManager
+from token_store import MemoryUserTokenStores
+
+# Stale entries the refresh heap may hold beyond twice the scheduled users
+MIN_HEAP_SIZE = 64
+
+
+class PooledTokenManager(TokenManager):
+    """
+    TokenManager of one user in a TokenPool. Its background refreshes are scheduled by the pool instead of a timer of its own.
+    """
+
+    def __init__(self, pool, user_id, authenticator):
+        super().__init__(authenticator, pool.refresh_margin, pool.retry_delay)
+
+        self.pool = pool
+        self.user_id = user_id
+
+    def schedule(self, delay=None):
+        if delay is None:
+            due = self.authenticator.expires_at() - self.refresh_margin
+
+        else:
+            due = time.time() + delay
+
+        self.pool.schedule(self.user_id, due)
+
+
+class TokenPool:
+    """
+    Class to keep the access tokens of many users valid from one process.
+
+    Users are loaded from the store on first use and kept in a bounded LRU; the least recently used one is dropped from memory (not from the store) when it is full. A single background thread refreshes the loaded users' tokens shortly before they expire.
+
+    The pool is a token provider for HttpClient: requests use the token of the user selected with `with pool.user(user_id):`, so one set of clients serves every user. Requests with no user selected use the fallback provider (e.g. the app's own TokenManager) when one is given.
+    """
+
+    def __init__(
+        self,
+        client_id,
+        client_secret,
+        redirect_uri,
+        http_client,
+        stores=None,
+        max_users=1000,
+        refresh_margin=60,
+        retry_delay=30,
+        refresh_workers=4,
+        token_url=TOKEN_URL,
+        fallback=None,
+    ):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redirect_uri = redirect_uri
+        self.http_client = http_client
+        self.token_url = token_url
+
+        # Token provider for the requests sent with no user selected
+        self.fallback = fallback
+
+        # Where each user's tokens are saved (a UserTokenStores)
+        self.stores = stores or MemoryUserTokenStores()
+
+        self.max_users = max_users
+        self.refresh_margin = refresh_margin
+        self.retry_delay = retry_delay
+
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.managers = OrderedDict()
+
+        # (due time, user ID) of the next refresh of each loaded user; stale
+        # heap entries are skipped when their time doesn't match `due`
+        self.heap = []
+        self.due = {}
+
+        self.refresh_workers = refresh_workers
+        self.executor = None
+        self.thread = None
+        self.running = False
+
+        self.loads = 0
+        self.evictions = 0
+        self.background_refreshes = 0
+
+    def _authenticator(self, user_id, tokens=None):
+        tokens = tokens or {}
+
+        return AuthCodeFlow(
+            self.client_id,
+            self.client_secret,
+            self.redirect_uri,
+            tokens.get("access_token"),
+            tokens.get("refresh_token"),
+            tokens.get("last_refresh"),
+            http_client=self.http_client,
+            token_store=self.stores.for_user(user_id),
+            expires_in=tokens.get("expires_in"),
+            token_url=self.token_url,
+        )
+
+    def manager(self, user_id):
+        """
+        Returns the TokenManager of a user, loading the user's tokens from the store if needed.
+        """
+
+        with self.lock:
+            manager = self.managers.get(user_id)
+
+            if manager is not None:
+                self.managers.move_to_end(user_id)
+                return manager
+
+        tokens = self.stores.for_user(user_id).load()
+
+        if not tokens.get("refresh_token"):
+            raise Exception(f"No tokens for user {user_id}")
+
+        return self._add(user_id, self._authenticator(user_id, tokens))
+
+    def _add(self, user_id, authenticator):
+        manager = PooledTokenManager(self, user_id, authenticator)
+
+        with self.lock:
+            # Another thread loaded the same user meanwhile
+            if user_id in self.managers:
+                self.managers.move_to_end(user_id)
+                return self.managers[user_id]
+
+            self.managers[user_id] = manager
+            self.loads += 1
+
+            while len(self.managers) > self.max_users:
+                evicted, _ = self.managers.popitem(last=False)
+                self.due.pop(evicted, None)
+                self.evictions += 1
+
+        manager.schedule()
+
+        return manager
+
+    def add_user(self, user_id, access_token, refresh_token, expires_in=None):
+        """
+        Registers a user whose tokens were obtained elsewhere, saving them to the store.
+        """
+
+        authenticator = self._authenticator(
+            user_id,
+            {
+                "access_token": access_token,
+                "refresh_token": refresh_token,
+                "last_refresh": time.time(),
+                "expires_in": expires_in,
+            },
+        )
+        authenticator.save_tokens()
+
+        self.remove_user(user_id, forget=False)
+
+        return self._add(user_id, authenticator)
+
+    def start_authorization(self, user_id):
+        """
+        Starts the authorization of a user. Returns the URL the user must open, and the request to pass to finish_authorization.
+
+        Many users can be authorizing at once; each callback is matched to its request by state.
+        """
+
+        authenticator = self._authenticator(user_id)
+        auth_url, pending = authenticator.start_authorization()
+
+        return auth_url, (authenticator, pending)
+
+    def finish_authorization(self, user_id, request, timeout=AUTHORIZATION_TIMEOUT):
+        """
+        Waits for the user to authorize, trades the code for tokens and adds the user to the pool.
+        """
+
+        authenticator, pending = request
+        authenticator.finish_authorization(pending, timeout)
+
+        if authenticator.get_access_token() is None:
+            raise Exception("Failed to get access token")
+
+        self.remove_user(user_id, forget=False)
+
+        return self._add(user_id, authenticator)
+
+    def remove_user(self, user_id, forget=True):
+        """
+        Drops a user from memory and, with forget, deletes the saved tokens.
+        """
+
+        with self.lock:
+            self.managers.pop(user_id, None)
+            self.due.pop(user_id, None)
+
+        if forget:
+            self.stores.delete(user_id)
+
+    @contextmanager
+    def user(self, user_id):
+        """
+        Makes the requests sent inside the block use the token of the given user.
+        """
+
+        reset_token = current_user.set(user_id)
+
+        try:
+            yield self.manager(user_id)
+
+        finally:
+            current_user.reset(reset_token)
+
+    def _current_manager(self):
+        user_id = current_user.get()
+
+        if user_id is None:
+            if self.fallback is not None:
+                return self.fallback
+
+            raise Exception("No user selected for this request")
+
+        return self.manager(user_id)
+
+    def get_token(self):
+        return self._current_manager().get_token()
+
+    def handle_unauthorized(self, token):
+        return self._current_manager().handle_unauthorized(token)
+
+    def schedule(self, user_id, due):
+        """
+        Sets when the background thread refreshes a user's token.
+        """
+
+        with self.lock:
+            if user_id not in self.managers:
+                return
+
+            self.due[user_id] = due
+            heapq.heappush(self.heap, (due, user_id))
+
+            # Rescheduled and evicted users leave stale entries behind; the
+            # heap is rebuilt from `due` before they outnumber the live ones
+            if len(self.heap) > 2 * len(self.due) + MIN_HEAP_SIZE:
+                self.heap = [(when, user) for user, when in self.due.items()]
+                heapq.heapify(self.heap)
+
+            self.wakeup.notify()
+
+    def start(self):
+        """
+        Starts the background refresh thread.
+        """
+
+        with self.lock:
+            if self.running:
+                return
+
+            self.running = True
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.refresh_workers, thread_name_prefix="token-refresh"
+        )
+        self.thread = threading.Thread(target=self._run, name="token-pool", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+            self.wakeup.notify()
+
+        if self.thread is not None:
+            self.thread.join()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self):
+        while True:
+            with self.lock:
+                while self.running:
+                    if self.heap and self.heap[0][0] <= time.time():
+                        break
+
+                    timeout = self.heap[0][0] - time.time() if self.heap else None
+                    self.wakeup.wait(timeout)
+
+                if not self.running:
+                    return
+
+                due, user_id = heapq.heappop(self.heap)
+
+                # Rescheduled, or dropped from memory, since this entry was pushed
+                if self.due.get(user_id) != due:
+                    continue
+
+                del self.due[user_id]
+                manager = self.managers[user_id]
+                self.background_refreshes += 1
+
+            self.executor.submit(self._refresh, manager)
+
+    @staticmethod
+    def _refresh(manager):
+        try:
+            if manager.needs_refresh():
+                manager.refresh()
+
+            else:
+                manager.schedule()
+
+        except Exception:
+            # e.g. the token endpoint was unreachable; try again later
+            manager.schedule(manager.retry_delay)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "users_loaded": len(self.managers),
+                "max_users": self.max_users,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "scheduled_refreshes": len(self.due),
+                "background_refreshes": self.background_refreshes,
+            }
@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+from urllib.parse import quote
+from atomic_file import write_json
+
+
+class TokenStore:
+    """
+    Base class for the places where tokens are persisted.
+
+    A store saves every token field in a single call, so the access token, the refresh token and the refresh time never get out of sync.
+    """
+
+    def load(self):
+        """
+        Returns the saved token fields as a dict, or an empty dict if there are none.
+        """
+
+        raise NotImplementedError
+
+    def save(self, tokens):
+        """
+        Saves all the token fields at once.
+        """
+
+        raise NotImplementedError
+
+
+class MemoryTokenStore(TokenStore):
+    """
+    Class to keep tokens in memory only. Useful for tests and short-lived processes.
+    """
+
+    def __init__(self, tokens=None):
+        self.tokens = dict(tokens or {})
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            return dict(self.tokens)
+
+    def save(self, tokens):
+        with self.lock:
+            self.tokens = dict(tokens)
+
+
+class FileTokenStore(TokenStore):
+    """
+    Class to persist tokens in a JSON file.
+
+    Writes go to a temporary file in the same directory that then replaces the old one, so a crash mid-write leaves either the old tokens or the new ones, never a mix.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                tokens = json.load(file)
+
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+        return tokens if isinstance(tokens, dict) else {}
+
+    def save(self, tokens):
+        with self.lock:
+            write_json(self.path, tokens, prefix=".tokens-")
+
+
+class UserTokenStores:
+    """
+    Base class for the places where the tokens of many users are persisted, one TokenStore per user.
+    """
+
+    def for_user(self, user_id):
+        """
+        Returns the TokenStore of a user.
+        """
+
+        raise NotImplementedError
+
+    def delete(self, user_id):
+        """
+        Forgets the saved tokens of a user.
+        """
+
+        raise NotImplementedError
+
+
+class MemoryUserTokenStores(UserTokenStores):
+    """
+    Class to keep the tokens of many users in memory only.
+    """
+
+    def __init__(self):
+        self.stores = {}
+        self.lock = threading.Lock()
+
+    def for_user(self, user_id):
+        with self.lock:
+            return self.stores.setdefault(user_id, MemoryTokenStore())
+
+    def delete(self, user_id):
+        with self.lock:
+            self.stores.pop(user_id, None)
+
+
+class DirectoryUserTokenStores(UserTokenStores):
+    """
+    Class to persist the tokens of each user in its own JSON file inside a directory.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, user_id):
+        # User IDs are escaped so they can't point outside the directory
+        return os.path.join(self.path, quote(str(user_id), safe="") + ".json")
+
+    def for_user(self, user_id):
+        return FileTokenStore(self._file(user_id))
+
+    def delete(self, user_id):
+        try:
+            os.unlink(self._file(user_id))
+
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,120 @@
+import os
+import sys
+import threading
+import pytest
+
+# The app's modules are imported flat, as they are when run from src
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from benchmark import UNPACED_LIMITS
+from http_client import HttpClient
+from mock_server import MockSpotifyServer
+from request_scheduler import RequestScheduler
+
+
+@pytest.fixture
+def mock():
+    server = MockSpotifyServer(seed=0).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_client(mock):
+    """
+    Returns a function that builds an HttpClient for the mock server, without pacing unless a scheduler is given and with a fixed token unless a token provider is given.
+    """
+
+    clients = []
+
+    def make_client(**kwargs):
+        if "token_provider" not in kwargs:
+            kwargs.setdefault("headers", {"Authorization": "Bearer mock-access"})
+
+        kwargs.setdefault("scheduler", RequestScheduler(UNPACED_LIMITS))
+        client = HttpClient(mock.url, **kwargs)
+        clients.append(client)
+
+        return client
+
+    yield make_client
+
+    for client in clients:
+        client.close()
+
+
+@pytest.fixture
+def app(mock, tmp_path, monkeypatch):
+    """
+    Returns the app module, freshly loaded and configured to use the mock server and files in a temporary directory.
+    """
+
+    import importlib
+    import time
+    import app
+
+    monkeypatch.chdir(tmp_path)
+    environment = {
+        "BASE_URL": mock.url,
+        "SPOTIFY_CLIENT_ID": "client-id",
+        "SPOTIFY_CLIENT_SECRET": "client-secret",
+        "REDIRECT_URI": "http://127.0.0.1/callback",
+        "SPOTIFY_ACCESS_TOKEN": "mock-access",
+        "SPOTIFY_REFRESH_TOKEN": "mock-refresh",
+        "SPOTIFY_LAST_REFRESH": str(time.time()),
+        "SPOTIFY_TOKEN_FILE": str(tmp_path / "tokens.json"),
+        "SPOTIFY_CACHE_FILE": str(tmp_path / "cache.sqlite3"),
+        "SPOTIFY_LIBRARY_FILE": str(tmp_path / "library.json"),
+        "SPOTIFY_MIRRORS_FILE": str(tmp_path / "mirrors.json"),
+        "SPOTIFY_USERS_DIR": str(tmp_path / "users"),
+    }
+
+    for name, value in environment.items():
+        monkeypatch.setenv(name, value)
+
+    app = importlib.reload(app)
+    app.init()
+    app.authenticator.token_url = mock.token_url
+
+    yield app
+
+    if app.token_pool is not None:
+        app.token_pool.stop()
+
+    app.token_manager.stop()
+    app.http_client.close()
+
+
+@pytest.fixture
+def start_together():
+    """
+    Returns a function that starts `count` threads running a function at the same time, and returns a function that joins them and returns their results or exceptions.
+    """
+
+    def start_together(function, count):
+        barrier = threading.Barrier(count)
+        results = [None] * count
+
+        def run(index):
+            barrier.wait()
+
+            try:
+                results[index] = function()
+
+            except Exception as e:
+                results[index] = e
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+
+        for thread in threads:
+            thread.start()
+
+        def join():
+            for thread in threads:
+                thread.join()
+
+            return results
+
+        return join
+
+    return start_together
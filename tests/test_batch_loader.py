@@ -0,0 +1,69 @@
+import pytest
+from batch_loader import BatchLoader
+from http_client import current_user
+
+
+def test_lookups_in_a_window_share_one_request(mock, make_client):
+    loader = BatchLoader(make_client(), window=0.05)
+
+    tracks = loader.get_many("track", [f"track{i}" for i in range(30)])
+
+    assert [track.id for track in tracks] == [f"track{i}" for i in range(30)]
+    assert mock.requests["GET /tracks"] == 1
+
+
+def test_batches_are_split_at_the_endpoint_maximum(mock, make_client):
+    loader = BatchLoader(make_client(), window=0.05)
+
+    albums = loader.get_many("album", [f"album{i}" for i in range(45)])
+
+    assert len(albums) == 45
+    assert mock.requests["GET /albums"] == 3
+
+
+def test_repeated_ids_are_requested_once(mock, make_client):
+    loader = BatchLoader(make_client(), window=0.05)
+
+    artists = loader.get_many(
+        "artist", ["artist1", "spotify:artist:artist1", "artist2", "artist1"]
+    )
+
+    assert [artist.id for artist in artists] == [
+        "artist1",
+        "artist1",
+        "artist2",
+        "artist1",
+    ]
+    assert artists[0] is artists[1]
+    assert loader.stats()["deduplicated"] == 2
+    assert mock.requests["GET /artists"] == 1
+
+
+def test_unknown_ids_are_none(mock, make_client):
+    loader = BatchLoader(make_client(), window=0.01)
+
+    assert loader.get_many("track", ["track3", "missing", "track4"])[1] is None
+
+
+def test_errors_reach_every_lookup_of_the_batch(mock, make_client):
+    loader = BatchLoader(make_client(headers={}), window=0.01)
+    futures = [loader.load("track", f"track{i}") for i in range(3)]
+
+    for future in futures:
+        with pytest.raises(Exception, match="Failed to get tracks"):
+            future.result(5)
+
+    assert mock.requests["GET /tracks"] == 1
+
+
+def test_batches_are_kept_apart_per_user(mock, make_client):
+    loader = BatchLoader(make_client(), window=0.05)
+    futures = []
+
+    for user in ("alice", "bob"):
+        token = current_user.set(user)
+        futures.append(loader.load("track", "track1"))
+        current_user.reset(token)
+
+    assert [future.result(5).id for future in futures] == ["track1", "track1"]
+    assert mock.requests["GET /tracks"] == 2
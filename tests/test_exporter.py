@@ -0,0 +1,112 @@
+import json
+import os
+import pytest
+from exporter import TrackExporter
+
+
+class FailingOnce:
+    """
+    Wraps an HttpClient so the first request for a page at or past `offset` raises.
+    """
+
+    def __init__(self, http_client, offset):
+        self.http_client = http_client
+        self.offset = offset
+        self.failed = False
+
+    def get(self, path, **kwargs):
+        params = kwargs.get("params") or {}
+
+        if not self.failed and params.get("offset", 0) >= self.offset:
+            self.failed = True
+            raise ConnectionError("connection lost")
+
+        return self.http_client.get(path, **kwargs)
+
+
+def read(path):
+    with open(path, encoding="utf-8") as file:
+        return file.read()
+
+
+@pytest.mark.parametrize("format", ["ndjson", "csv"])
+def test_interrupted_export_resumes_from_the_checkpoint(
+    mock, make_client, tmp_path, format
+):
+    http_client = make_client()
+    output = str(tmp_path / f"tracks.{format}")
+    expected = str(tmp_path / f"expected.{format}")
+
+    with pytest.raises(ConnectionError):
+        TrackExporter(
+            FailingOnce(http_client, 200), "/me/tracks", output, format, limit=50
+        ).run()
+
+    checkpoint = json.loads(read(f"{output}.checkpoint"))
+    assert checkpoint["offset"] == 200
+    assert checkpoint["bytes"] == os.path.getsize(output)
+
+    requests_before = mock.requests["GET /me/tracks"]
+    result = TrackExporter(http_client, "/me/tracks", output, format, limit=50).run()
+
+    assert result["resumed_from"] == 200
+    assert result["exported"] == mock.saved_tracks_total - 200
+    assert mock.requests["GET /me/tracks"] - requests_before == 6
+    assert not os.path.exists(f"{output}.checkpoint")
+
+    TrackExporter(http_client, "/me/tracks", expected, format, limit=50).run()
+    assert read(output) == read(expected)
+
+
+def test_rows_written_after_the_checkpoint_are_dropped(mock, make_client, tmp_path):
+    http_client = make_client()
+    output = str(tmp_path / "tracks.ndjson")
+    expected = str(tmp_path / "expected.ndjson")
+
+    with pytest.raises(ConnectionError):
+        TrackExporter(
+            FailingOnce(http_client, 100), "/me/tracks", output, limit=50
+        ).run()
+
+    # A crash between a write and the next checkpoint leaves a partial row
+    with open(output, "a", encoding="utf-8") as file:
+        file.write('{"position": 100, "na')
+
+    TrackExporter(http_client, "/me/tracks", output, limit=50).run()
+    TrackExporter(http_client, "/me/tracks", expected, limit=50).run()
+
+    assert read(output) == read(expected)
+
+
+def test_checkpoint_of_another_export_is_ignored(mock, make_client, tmp_path):
+    http_client = make_client()
+    output = str(tmp_path / "tracks.ndjson")
+
+    with pytest.raises(ConnectionError):
+        TrackExporter(
+            FailingOnce(http_client, 100), "/me/tracks", output, limit=50
+        ).run()
+
+    result = TrackExporter(
+        http_client, "/playlists/playlist0/tracks", output, limit=50
+    ).run()
+
+    assert result["resumed_from"] == 0
+    assert result["exported"] == mock.playlist_tracks_total
+
+
+def test_export_without_resume_starts_over(mock, make_client, tmp_path):
+    http_client = make_client()
+    output = str(tmp_path / "tracks.ndjson")
+
+    with pytest.raises(ConnectionError):
+        TrackExporter(
+            FailingOnce(http_client, 100), "/me/tracks", output, limit=50
+        ).run()
+
+    result = TrackExporter(http_client, "/me/tracks", output, limit=50).run(
+        resume=False
+    )
+
+    assert result["resumed_from"] == 0
+    assert len(read(output).splitlines()) == mock.saved_tracks_total
@@ -0,0 +1,87 @@
+import time
+import requests
+from http_client import current_user
+
+
+def test_identical_gets_in_flight_are_sent_once(mock, make_client, start_together):
+    mock.latency = 0.2
+    http_client = make_client()
+
+    responses = start_together(lambda: http_client.get("/me/player"), 6)()
+
+    assert mock.requests["GET /me/player"] == 1
+    assert all(response is responses[0] for response in responses)
+    assert http_client.stats()["single_flight_shared"] == 5
+
+
+def test_gets_with_different_params_are_not_shared(mock, make_client, start_together):
+    mock.latency = 0.2
+    http_client = make_client()
+    calls = iter([{"a": 1}, {"a": 2}, {"a": 1, "b": 2}])
+
+    start_together(lambda: http_client.get("/me", params=next(calls)), 3)()
+
+    assert mock.requests["GET /me"] == 3
+    assert http_client.stats()["single_flight_shared"] == 0
+
+
+def test_error_reaches_every_caller(mock, make_client, start_together):
+    mock.latency = 0.3
+    http_client = make_client(timeout=0.1)
+
+    results = start_together(lambda: http_client.get("/me/player"), 4)()
+
+    assert mock.requests["GET /me/player"] == 1
+    assert all(isinstance(result, requests.ReadTimeout) for result in results)
+
+    # The failed flight is gone, so the next GET is sent again
+    mock.latency = 0
+    assert http_client.get("/me/player").status_code == 200
+    assert mock.requests["GET /me/player"] == 2
+
+
+def test_get_after_write_does_not_join_earlier_flight(
+    mock, make_client, start_together
+):
+    mock.latency = 0.3
+    http_client = make_client()
+    join_before = start_together(lambda: http_client.get("/me/player"), 1)
+    time.sleep(0.1)
+
+    # The write finishes while the first GET is still in flight
+    mock.latency = 0
+    http_client.put("/me/player/volume", params={"volume_percent": 50})
+    http_client.get("/me/player")
+    join_before()
+
+    assert mock.requests["GET /me/player"] == 2
+    assert http_client.stats()["single_flight_shared"] == 0
+
+
+def test_streamed_gets_are_never_shared(mock, make_client, start_together):
+    mock.latency = 0.1
+    http_client = make_client()
+
+    start_together(lambda: http_client.get("/me/player", stream=True), 3)()
+
+    assert mock.requests["GET /me/player"] == 3
+
+
+def test_flights_are_kept_apart_per_user(mock, make_client, start_together):
+    mock.latency = 0.2
+    http_client = make_client()
+    users = iter(["alice", "alice", "bob"])
+
+    def get_as_next_user():
+        token = current_user.set(next(users))
+
+        try:
+            return http_client.get("/me")
+
+        finally:
+            current_user.reset(token)
+
+    start_together(get_as_next_user, 3)()
+
+    assert mock.requests["GET /me"] == 2
+    assert http_client.stats()["single_flight_shared"] == 1
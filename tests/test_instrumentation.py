@@ -0,0 +1,28 @@
+import json
+from instrumentation import Instrumentation
+
+
+def without_content_length(response, **kwargs):
+    response.headers.pop("Content-Length", None)
+
+
+def test_streamed_responses_are_left_unread(mock, make_client):
+    instrumentation = Instrumentation()
+    http_client = make_client(instrumentation=instrumentation)
+    http_client.session.hooks["response"].append(without_content_length)
+
+    response = http_client.get("/me", stream=True)
+
+    # Nothing was read before the caller reads the raw stream
+    assert json.loads(response.raw.read(decode_content=True))["id"] == "mock-user"
+    assert instrumentation.to_dict()[0]["bytes_received"] == 0
+
+
+def test_bodies_without_content_length_are_counted(mock, make_client):
+    instrumentation = Instrumentation()
+    http_client = make_client(instrumentation=instrumentation)
+    http_client.session.hooks["response"].append(without_content_length)
+
+    response = http_client.get("/me")
+
+    assert instrumentation.to_dict()[0]["bytes_received"] == len(response.content)
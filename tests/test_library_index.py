@@ -0,0 +1,104 @@
+import pytest
+from library_index import LibraryIndex, diff_tracks
+
+
+@pytest.fixture
+def small_library(mock):
+    mock.playlists_total = 4
+    mock.playlist_tracks_total = 20
+    mock.saved_tracks_total = 60
+    mock.followed_artists_total = 10
+
+
+def test_diff_tracks_keeps_the_order_and_repeats_of_additions():
+    added, removed = diff_tracks(["a", "b", "b", "c"], ["c", "d", "b", "d", "a"])
+
+    assert added == ["d", "d"]
+    assert removed == []
+
+
+def test_diff_tracks_removes_each_missing_uri_once():
+    added, removed = diff_tracks(["a", "b", "a", "c"], ["c", "e"])
+
+    assert added == ["e"]
+    assert removed == ["a", "b"]
+
+
+def test_diff_tracks_of_the_same_tracks_is_empty():
+    assert diff_tracks(["a", "b"], ["a", "b"]) == ([], [])
+
+
+def test_search_finds_synced_items(small_library, make_client, tmp_path):
+    library = LibraryIndex(str(tmp_path / "library.json"))
+    result = library.sync(make_client())
+
+    assert result["playlists_fetched"] == 4
+    assert "spotify:track:track12" in library
+
+    best = library.search("track", "track 12")[0]
+    assert best["uri"] == "spotify:track:track12"
+    assert best["artists"] == ["Artist 12", "Artist 19"]
+    assert best["score"] == 1
+
+    assert library.search("artist", "artist 3")[0]["uri"] == "spotify:artist:artist3"
+    assert library.search("playlist", "playlist 2")[0]["name"] == "Playlist 2"
+
+
+def test_search_matches_prefixes_typos_and_artists(
+    small_library, make_client, tmp_path
+):
+    library = LibraryIndex(str(tmp_path / "library.json"))
+    library.sync(make_client())
+
+    assert library.search("track", "trac 12")[0]["uri"] == "spotify:track:track12"
+    assert library.search("track", "trakc 12")[0]["uri"] == "spotify:track:track12"
+    assert (
+        library.search("track", "track 12 artist 19")[0]["uri"]
+        == "spotify:track:track12"
+    )
+
+    assert library.search("track", "nothing like it") == []
+    assert library.search("track", "  ") == []
+    assert all(
+        result["kind"] == "album" for result in library.search("album", "album 1")
+    )
+
+
+def test_index_is_searchable_after_reloading_its_file(
+    small_library, make_client, tmp_path
+):
+    path = str(tmp_path / "library.json")
+    LibraryIndex(path).sync(make_client())
+
+    assert LibraryIndex(path).search("track", "track 30")[0]["name"] == "Track 30"
+
+
+def test_sync_only_fetches_changed_playlists(
+    mock, small_library, make_client, tmp_path
+):
+    http_client = make_client()
+    library = LibraryIndex(str(tmp_path / "library.json"))
+    library.sync(http_client)
+
+    result = library.sync_playlists(http_client)
+
+    assert (result["fetched"], result["skipped"]) == (0, 4)
+    assert result["changes"] == []
+
+    # Each edit of the mock shifts the playlist's tracks by one
+    mock.touch_playlist(2)
+    requests_before = mock.requests.get("GET /playlists/playlist2/tracks", 0)
+    result = library.sync_playlists(http_client)
+
+    assert (result["fetched"], result["skipped"]) == (1, 3)
+    assert result["changes"] == [
+        {
+            "id": "playlist2",
+            "name": "Playlist 2",
+            "added": ["spotify:track:track22"],
+            "removed": ["spotify:track:track2"],
+        }
+    ]
+    assert mock.requests["GET /playlists/playlist2/tracks"] == requests_before + 1
+    assert library.playlists()["playlist2"]["tracks"][-1] == "spotify:track:track22"
+    assert library.playlists()["playlist2"]["snapshot_id"] == "snapshot2-1"
@@ -0,0 +1,98 @@
+import json
+import pytest
+from library_index import LibraryIndex
+from playlist_sync import PlaylistSync
+
+
+@pytest.fixture
+def playlist_sync(mock, make_client, tmp_path):
+    mock.playlists_total = 4
+    mock.playlist_tracks_total = 20
+    mock.saved_tracks_total = 10
+    mock.followed_artists_total = 0
+
+    http_client = make_client()
+    library = LibraryIndex(str(tmp_path / "library.json"))
+    library.sync(http_client)
+
+    return PlaylistSync(http_client, library, str(tmp_path / "mirrors.json"))
+
+
+def uris(numbers):
+    return [f"spotify:track:track{number}" for number in numbers]
+
+
+def test_apply_only_sends_the_differences(mock, playlist_sync):
+    # playlist1 holds tracks 1..20
+    counts = playlist_sync.apply("playlist1", uris(range(5, 25)))
+
+    assert counts == {"added": 4, "removed": 4}
+    assert mock.playlist_edits == [
+        (
+            "DELETE",
+            "playlist1",
+            {
+                "tracks": [{"uri": uri} for uri in uris(range(1, 5))],
+                "snapshot_id": "snapshot1-0",
+            },
+        ),
+        ("POST", "playlist1", {"uris": uris(range(21, 25))}),
+    ]
+
+    entry = playlist_sync.library.playlists()["playlist1"]
+    assert entry["tracks"] == uris(range(5, 25))
+    assert entry["snapshot_id"] == "snapshot1-2"
+
+
+def test_apply_sends_chunks_of_100(mock, playlist_sync):
+    counts = playlist_sync.apply("playlist0", uris(range(0, 250)))
+
+    assert counts == {"added": 230, "removed": 0}
+    assert [len(body["uris"]) for _, _, body in mock.playlist_edits] == [100, 100, 30]
+
+
+def test_apply_copies_the_set_of_tracks(mock, playlist_sync):
+    current = playlist_sync.tracks("playlist1")
+
+    # Reordered and repeated: the same set, so nothing is written
+    counts = playlist_sync.apply("playlist1", current[::-1] + current[:3])
+
+    assert counts == {"added": 0, "removed": 0}
+    assert mock.playlist_edits == []
+
+
+def test_written_playlists_are_not_fetched_again(mock, playlist_sync):
+    playlist_sync.apply("playlist1", uris(range(5, 25)))
+
+    result = playlist_sync.refresh()
+
+    assert (result["fetched"], result["skipped"]) == (0, 4)
+
+
+def test_failed_write_raises(mock, playlist_sync):
+    mock.fail_next(403)
+
+    with pytest.raises(Exception, match="Failed to remove tracks"):
+        playlist_sync.apply("playlist1", uris(range(5, 25)))
+
+
+def test_sync_mirrors_sources_into_targets(mock, playlist_sync, tmp_path):
+    playlist_sync.add_mirror("spotify:playlist:playlist2", "playlist3")
+
+    with open(tmp_path / "mirrors.json", encoding="utf-8") as file:
+        assert json.load(file) == {"mirrors": {"playlist2": "playlist3"}}
+
+    result = playlist_sync.sync()
+
+    assert result["mirrored"] == [
+        {"source": "playlist2", "target": "playlist3", "added": 1, "removed": 1}
+    ]
+    assert set(playlist_sync.tracks("playlist3")) == set(uris(range(2, 22)))
+
+    # Nothing changed since: no writes and no playlist fetched
+    edits = len(mock.playlist_edits)
+    result = playlist_sync.sync()
+
+    assert result["mirrored"] == []
+    assert result["fetched"] == 0
+    assert len(mock.playlist_edits) == edits
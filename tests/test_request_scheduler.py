@@ -0,0 +1,130 @@
+import time
+import pytest
+from request_scheduler import RequestScheduler, endpoint_class
+
+
+@pytest.fixture
+def scheduler():
+    return RequestScheduler(
+        {name: (1000, 1000) for name in ("auth", "search", "player", "library")},
+        max_retries=3,
+        backoff_base=0.01,
+    )
+
+
+@pytest.mark.parametrize(
+    "path, name",
+    [
+        ("/api/token", "auth"),
+        ("/search", "search"),
+        ("/me/player/queue", "player"),
+        ("/me/tracks", "library"),
+        ("/playlists/playlist0/tracks", "library"),
+        ("/tracks", "default"),
+    ],
+)
+def test_endpoint_classes(path, name):
+    assert endpoint_class(f"https://api.spotify.com/v1{path}") == name
+
+
+def test_429_waits_for_retry_after_and_retries(mock, make_client, scheduler):
+    mock.retry_after = 0.3
+    mock.fail_next(429)
+    http_client = make_client(scheduler=scheduler)
+
+    start = time.monotonic()
+    response = http_client.get("/me/player")
+
+    assert response.status_code == 200
+    assert time.monotonic() - start >= 0.3
+    assert mock.requests["GET /me/player"] == 2
+    assert scheduler.stats()["player"]["throttled"] == 1
+    assert scheduler.stats()["player"]["retries"] == 1
+
+
+def test_429_pauses_the_whole_endpoint_class(
+    mock, make_client, scheduler, start_together
+):
+    mock.retry_after = 0.3
+    mock.fail_next(429)
+    http_client = make_client(scheduler=scheduler, single_flight=False)
+    join = start_together(lambda: http_client.get("/me/player/queue"), 1)
+    time.sleep(0.05)
+
+    # Sent during the pause: the same class waits for it, other classes don't
+    start = time.monotonic()
+    assert http_client.get("/me").status_code == 200
+    assert time.monotonic() - start < 0.2
+
+    assert http_client.get("/me/player").status_code == 200
+    assert time.monotonic() - start >= 0.2
+    assert join()[0].status_code == 200
+    assert scheduler.stats()["player"]["throttled"] == 1
+
+
+def test_5xx_is_retried_for_idempotent_methods(mock, make_client, scheduler):
+    mock.fail_next(503, times=2)
+    http_client = make_client(scheduler=scheduler)
+
+    assert http_client.get("/me/player").status_code == 200
+    assert mock.requests["GET /me/player"] == 3
+
+    mock.fail_next(502)
+    response = http_client.put("/me/player/volume", params={"volume_percent": 5})
+
+    assert response.status_code == 204
+    assert mock.requests["PUT /me/player/volume"] == 2
+
+
+def test_5xx_is_not_retried_for_post(mock, make_client, scheduler):
+    mock.fail_next(503)
+    http_client = make_client(scheduler=scheduler)
+
+    response = http_client.post(
+        "/me/player/queue", params={"uri": "spotify:track:track1"}
+    )
+
+    # Retrying could queue the song twice
+    assert response.status_code == 503
+    assert mock.requests["POST /me/player/queue"] == 1
+    assert scheduler.stats()["player"]["retries"] == 0
+
+
+def test_429_is_retried_for_post(mock, make_client, scheduler):
+    mock.retry_after = 0.05
+    mock.fail_next(429)
+    http_client = make_client(scheduler=scheduler)
+
+    response = http_client.post(
+        "/me/player/queue", params={"uri": "spotify:track:track1"}
+    )
+
+    assert response.status_code == 204
+    assert mock.requests["POST /me/player/queue"] == 2
+
+
+def test_last_response_is_returned_after_max_retries(mock, make_client, scheduler):
+    mock.fail_next(500, times=10)
+    http_client = make_client(scheduler=scheduler)
+
+    assert http_client.get("/me/player").status_code == 500
+    assert mock.requests["GET /me/player"] == 4
+    assert scheduler.stats()["player"]["retries"] == 3
+
+
+def test_requests_are_paced_by_their_buckets(mock, make_client, start_together):
+    scheduler = RequestScheduler({"player": (20, 1)})
+    http_client = make_client(scheduler=scheduler, single_flight=False)
+
+    start = time.monotonic()
+    start_together(lambda: http_client.get("/me/player"), 5)()
+
+    # One request right away, then one every 50 ms
+    assert time.monotonic() - start >= 0.19
+
+    stats = scheduler.stats()["player"]
+    assert stats["requests"] == 5
+    assert stats["waited"] == 4
+    assert stats["max_queue_depth"] >= 2
+    assert stats["wait_s_max"] >= 0.19
+    assert stats["queue_depth"] == 0
@@ -0,0 +1,28 @@
+from models import Artist
+
+
+def test_artists_keep_their_popularity():
+    assert Artist.from_json({"id": "a", "popularity": 42}).popularity == 42
+    assert Artist.from_json({"id": "a"}).popularity is None
+
+
+def test_artist_candidates_are_ranked_with_their_popularity(app):
+    candidates = app.search_candidates("artist", "someone")["candidates"]
+
+    for candidate in candidates:
+        number = int(candidate["id"][len("artist") :])
+        assert candidate["popularity"] == (number * 37) % 100
+
+
+def test_candidate_pages_have_their_own_cache(mock, app):
+    app.search_item("track", "some song")
+
+    assert app.search_cache.stats() == {"hits": 0, "misses": 1, "size": 1}
+    assert app.candidates_cache.stats() == {"hits": 0, "misses": 1, "size": 1}
+
+    app.search_item("track", "Some  Song")
+    app.search_candidates("track", "some song")
+
+    assert app.search_cache.stats()["hits"] == 1
+    assert app.candidates_cache.stats()["hits"] == 1
+    assert mock.requests["GET /search"] == 1
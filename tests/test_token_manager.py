@@ -0,0 +1,117 @@
+import time
+from auth_code_flow import AuthCodeFlow
+from token_manager import TokenManager
+
+
+def make_manager(
+    mock,
+    http_client,
+    access_token="stale-token",
+    last_refresh=None,
+    expires_in=None,
+    refresh_margin=60,
+):
+    flow = AuthCodeFlow(
+        "client-id",
+        "client-secret",
+        "http://127.0.0.1/callback",
+        access_token=access_token,
+        refresh_token="mock-refresh",
+        last_refresh=last_refresh,
+        http_client=http_client,
+        expires_in=expires_in,
+        token_url=mock.token_url,
+    )
+
+    return TokenManager(flow, refresh_margin)
+
+
+def test_expired_token_is_refreshed_once_for_concurrent_callers(
+    mock, make_client, start_together
+):
+    mock.latency = 0.05
+    manager = make_manager(mock, make_client())
+
+    tokens = start_together(manager.get_token, 10)()
+
+    assert mock.requests["POST /api/token"] == 1
+    assert len(set(tokens)) == 1
+    assert tokens[0].startswith("mock-access-")
+    manager.stop()
+
+
+def test_token_is_refreshed_in_the_background_before_it_expires(mock, make_client):
+    # Expires in 1.3 s, so it is due for renewal in 0.3 s
+    manager = make_manager(
+        mock,
+        make_client(),
+        last_refresh=time.time(),
+        expires_in=1.3,
+        refresh_margin=1,
+    )
+    manager.start()
+
+    deadline = time.monotonic() + 5
+
+    while manager.authenticator.access_token == "stale-token":
+        assert time.monotonic() < deadline, "the token was never refreshed"
+        time.sleep(0.01)
+
+    assert mock.requests["POST /api/token"] == 1
+
+    # The new token lasts an hour: the next refresh is scheduled ahead of it
+    assert manager.timer.is_alive()
+    assert not manager.needs_refresh()
+    manager.stop()
+
+
+def test_valid_token_is_not_refreshed(mock, make_client):
+    manager = make_manager(mock, make_client(), last_refresh=time.time())
+
+    assert manager.get_token() == "stale-token"
+    assert "POST /api/token" not in mock.requests
+
+
+def test_401_refreshes_and_retries_once(mock, make_client):
+    manager = make_manager(mock, make_client(), last_refresh=time.time())
+    http_client = make_client(token_provider=manager)
+    mock.revoke("stale-token")
+
+    response = http_client.get("/me")
+
+    assert response.status_code == 200
+    assert mock.requests["POST /api/token"] == 1
+    assert mock.requests["GET /me"] == 2
+    assert manager.get_token() != "stale-token"
+    manager.stop()
+
+
+def test_concurrent_401s_share_one_refresh(mock, make_client, start_together):
+    manager = make_manager(mock, make_client(), last_refresh=time.time())
+    http_client = make_client(token_provider=manager, single_flight=False)
+    mock.revoke("stale-token")
+    mock.latency = 0.02
+
+    responses = start_together(lambda: http_client.get("/me"), 8)()
+
+    assert [response.status_code for response in responses] == [200] * 8
+    assert mock.requests["POST /api/token"] == 1
+    manager.stop()
+
+
+def test_failed_retry_returns_the_401(mock, make_client):
+    manager = make_manager(mock, make_client(), last_refresh=time.time())
+    http_client = make_client(token_provider=manager)
+    mock.revoke("stale-token")
+
+    # The refreshed token is rejected too: no second refresh or retry
+    original = mock.token_response
+    mock.token_response = lambda body: {**original(body), "access_token": "bad"}
+    mock.revoke("bad")
+
+    response = http_client.get("/me")
+
+    assert response.status_code == 401
+    assert mock.requests["POST /api/token"] == 1
+    assert mock.requests["GET /me"] == 2
+    manager.stop()
@@ -0,0 +1,171 @@
+import time
+import pytest
+from token_pool import MIN_HEAP_SIZE, TokenPool
+from token_store import MemoryUserTokenStores
+
+
+@pytest.fixture
+def make_pool(mock, make_client):
+    pools = []
+
+    def make_pool(**kwargs):
+        pool = TokenPool(
+            "client-id",
+            "client-secret",
+            "http://127.0.0.1/callback",
+            make_client(),
+            token_url=mock.token_url,
+            **kwargs,
+        )
+        pools.append(pool)
+
+        return pool
+
+    yield make_pool
+
+    for pool in pools:
+        pool.stop()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+
+        time.sleep(0.01)
+
+
+def test_requests_use_the_selected_users_token(mock, make_client, make_pool):
+    pool = make_pool()
+    pool.add_user("alice", "token-alice", "refresh-alice", 3600)
+    pool.add_user("bob", "token-bob", "refresh-bob", 3600)
+    http_client = make_client(token_provider=pool)
+
+    with pool.user("alice"):
+        assert pool.get_token() == "token-alice"
+
+        with pool.user("bob"):
+            assert pool.get_token() == "token-bob"
+
+        assert pool.get_token() == "token-alice"
+
+    # A 401 only refreshes the token of the user that sent the request
+    mock.revoke("token-bob")
+
+    with pool.user("bob"):
+        assert http_client.get("/me").status_code == 200
+        assert pool.get_token() != "token-bob"
+
+    with pool.user("alice"):
+        assert pool.get_token() == "token-alice"
+
+    assert mock.requests["POST /api/token"] == 1
+
+
+def test_requests_without_a_user_use_the_fallback(make_pool):
+    pool = make_pool()
+
+    with pytest.raises(Exception, match="No user selected"):
+        pool.get_token()
+
+    class Fallback:
+        def get_token(self):
+            return "own-token"
+
+    assert make_pool(fallback=Fallback()).get_token() == "own-token"
+
+
+def test_least_recently_used_user_is_evicted_and_reloaded(make_pool):
+    stores = MemoryUserTokenStores()
+    pool = make_pool(stores=stores, max_users=2)
+
+    pool.add_user("alice", "token-alice", "refresh-alice", 3600)
+    pool.add_user("bob", "token-bob", "refresh-bob", 3600)
+
+    # alice was used last, so bob is the one evicted
+    with pool.user("alice"):
+        pool.get_token()
+
+    pool.add_user("carol", "token-carol", "refresh-carol", 3600)
+
+    stats = pool.stats()
+    assert stats["users_loaded"] == 2
+    assert stats["evictions"] == 1
+    assert stats["scheduled_refreshes"] == 2
+    assert list(pool.managers) == ["alice", "carol"]
+
+    # Dropped from memory only: the tokens are loaded again from the store
+    with pool.user("bob"):
+        assert pool.get_token() == "token-bob"
+
+    assert pool.stats()["loads"] == 4
+    assert list(pool.managers) == ["carol", "bob"]
+
+
+def test_unknown_user_raises(make_pool):
+    with pytest.raises(Exception, match="No tokens for user nobody"):
+        with make_pool().user("nobody"):
+            pass
+
+
+def test_tokens_are_refreshed_in_the_background_before_they_expire(mock, make_pool):
+    pool = make_pool(refresh_margin=60)
+
+    # Due in 0.2 s (expiry minus the margin), the other one in an hour
+    pool.add_user("alice", "token-alice", "refresh-alice", 60.2)
+    pool.add_user("bob", "token-bob", "refresh-bob", 3600)
+    pool.start()
+
+    wait_for(lambda: pool.manager("alice").authenticator.access_token != "token-alice")
+
+    assert mock.requests["POST /api/token"] == 1
+    assert pool.manager("bob").authenticator.access_token == "token-bob"
+    assert pool.stats()["background_refreshes"] == 1
+
+    # The refreshed token expires in an hour, so it is scheduled again
+    assert pool.due["alice"] > time.time() + 3000
+
+
+def test_evicted_users_are_not_refreshed(mock, make_pool):
+    pool = make_pool(refresh_margin=60, max_users=1)
+    pool.add_user("alice", "token-alice", "refresh-alice", 60.1)
+    pool.add_user("bob", "token-bob", "refresh-bob", 3600)
+    pool.start()
+    time.sleep(0.3)
+
+    assert "POST /api/token" not in mock.requests
+    assert pool.stats()["background_refreshes"] == 0
+
+
+def test_stale_heap_entries_are_compacted(make_pool):
+    pool = make_pool()
+    pool.add_user("alice", "token-alice", "refresh-alice", 3600)
+    pool.add_user("bob", "token-bob", "refresh-bob", 3600)
+    due = time.time() + 3600
+
+    for step in range(10 * MIN_HEAP_SIZE):
+        pool.schedule("alice" if step % 2 else "bob", due + step)
+
+    assert len(pool.heap) <= 2 * len(pool.due) + MIN_HEAP_SIZE
+    assert {(when, user) for user, when in pool.due.items()} <= set(pool.heap)
+
+
+def test_app_keeps_its_caches_per_user(mock, app):
+    pool = app.get_token_pool()
+    pool.add_user("alice", "token-alice", "refresh-alice", 3600)
+
+    own = app.get_current_playback()
+    own_library = app.get_library_index()
+
+    with pool.user("alice"):
+        assert app.get_current_playback() is not own
+        assert app.get_library_index() is not own_library
+        assert app.get_library_index().path.endswith("library.alice.json")
+        assert app.search_item("track", "one query")
+
+    # Served from the app user's own cache, not alice's
+    assert app.get_current_playback() is own
+    assert app.search_cache.get(app.search_key("track", "one query")) is None
+    assert mock.requests["GET /me/player"] == 2
@@ -0,0 +1,20 @@
+import pytest
+from urllib.parse import parse_qs, urlparse
+
+
+@pytest.mark.parametrize(
+    "level, sent", [(-5, "0"), (40, "40"), ("40", "40"), (150, "100")]
+)
+def test_both_clients_clamp_the_volume_the_same_way(app, level, sent):
+    levels = []
+
+    def record(response, **kwargs):
+        if urlparse(response.url).path.endswith("/me/player/volume"):
+            levels.append(parse_qs(urlparse(response.url).query)["volume_percent"][0])
+
+    app.http_client.session.hooks["response"].append(record)
+
+    app.set_volume_level(level)
+    app.spotify.set_volume(level)
+
+    assert levels == [sent, sent]